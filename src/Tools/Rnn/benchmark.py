@@ -0,0 +1,197 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import platform
+import time
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+import pandas as pd
+from tokenizers import Tokenizer
+
+# --- Configuration ---
+ONNX_MODEL_PATH = "name_classifier.onnx"
+TOKENIZER_PATH = "custom-bpe-tokenizer.json"
+TEXT_FILES = ["data/dataset.csv", "data/validate.csv"]
+RESULTS_PATH = "benchmark_results.json"
+MAX_LEN = 128
+BATCH_SIZES = [1, 8, 32, 128, 512]
+SEQ_LENGTHS = ["natural", 8, 32, 128]  # "natural" pads real texts to their batch maximum
+THREAD_COUNTS = [1, 2, 4]
+OPT_LEVELS = ["basic", "all"]
+WARMUP_CALLS = 20
+MIN_CALLS = 50
+TIME_BUDGET = 1.0       # Seconds of measured calls per configuration (after MIN_CALLS)
+SEED = 0
+
+GRAPH_OPT_LEVELS = {
+    "disabled": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+def describe_model(path):
+    """
+    Identifies the model version under test: file hash and size plus the shapes that change
+    between retrains (EMBEDDING_DIM, HIDDEN_DIM, vocabulary).
+    """
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    model = onnx.load(path)
+    shapes = {t.name: list(t.dims) for t in model.graph.initializer}
+    embedding = shapes.get("embedding.weight", [0, 0])
+    return {
+        "path": os.path.abspath(path),
+        "sha256": digest,
+        "size_bytes": os.path.getsize(path),
+        "parameters": int(sum(np.prod(dims) for dims in shapes.values())),
+        "vocab_size": embedding[0],
+        "embedding_dim": embedding[1],
+        "hidden_dim": shapes.get("fc.weight", [0, 0])[1],
+    }
+
+def load_token_pool(tokenizer, files):
+    """
+    Tokenizes every text in the given CSVs once; batches are later sampled from this pool so the
+    measured length mix follows the real data.
+    """
+    texts = []
+    for path in files:
+        if os.path.exists(path):
+            texts.extend(pd.read_csv(path, keep_default_na=False, dtype={'text': str})['text'].tolist())
+    return [np.asarray(e.ids[:MAX_LEN] or [tokenizer.token_to_id("[PAD]")], dtype=np.int64) for e in tokenizer.encode_batch(texts)]
+
+def make_batches(pool, batch_size, seq_len, pad_token_id, count, rng):
+    """
+    Draws `count` input batches. Fixed lengths repeat each sampled sequence until it fills the row,
+    so longer lengths still contain real token statistics.
+    """
+    batches = []
+    for _ in range(count):
+        rows = [pool[i] for i in rng.integers(0, len(pool), batch_size)]
+        width = max(len(r) for r in rows) if seq_len == "natural" else seq_len
+        batch = np.full((batch_size, width), pad_token_id, dtype=np.int64)
+        for i, row in enumerate(rows):
+            if seq_len == "natural":
+                batch[i, :len(row)] = row
+            else:
+                batch[i] = np.resize(row, width)
+        batches.append(batch)
+    return batches
+
+def run_config(model_path, batches, threads, opt_level, provider, time_budget=TIME_BUDGET):
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.graph_optimization_level = GRAPH_OPT_LEVELS[opt_level]
+    session = ort.InferenceSession(model_path, options, providers=[provider])
+    input_name = session.get_inputs()[0].name
+
+    for i in range(WARMUP_CALLS):
+        session.run(None, {input_name: batches[i % len(batches)]})
+    timings = []
+    t_start = time.perf_counter()
+    while len(timings) < MIN_CALLS or time.perf_counter() - t_start < time_budget:
+        batch = batches[len(timings) % len(batches)]
+        t0 = time.perf_counter()
+        session.run(None, {input_name: batch})
+        timings.append(time.perf_counter() - t0)
+    timings = np.asarray(timings)
+    rows = len(batches[0])
+    return {
+        "calls": len(timings),
+        "latency_us": {
+            "mean": float(timings.mean() * 1e6),
+            "p50": float(np.percentile(timings, 50) * 1e6),
+            "p95": float(np.percentile(timings, 95) * 1e6),
+            "p99": float(np.percentile(timings, 99) * 1e6),
+        },
+        "throughput_rows_s": float(rows * len(timings) / timings.sum()),
+    }
+
+def config_key(result):
+    return (result["provider"], result["opt_level"], result["threads"], str(result["seq_len"]), result["batch_size"])
+
+def compare(previous_path, results):
+    """
+    Prints p50 latency and throughput changes against an earlier results file, per configuration.
+    """
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {config_key(r): r for r in json.load(f)["results"]}
+    print(f"\n--- Comparison against {previous_path} ---")
+    print(f"{'provider/opt/threads/seq/batch':<48} {'p50 old':>10} {'p50 new':>10} {'delta':>8} {'rows/s delta':>13}")
+    for r in results:
+        old = previous.get(config_key(r))
+        if old is None:
+            continue
+        p50_delta = r["latency_us"]["p50"] / old["latency_us"]["p50"] - 1
+        tput_delta = r["throughput_rows_s"] / old["throughput_rows_s"] - 1
+        name = "/".join(str(k) for k in config_key(r))
+        print(f"{name:<48} {old['latency_us']['p50']:>10.1f} {r['latency_us']['p50']:>10.1f} {p50_delta:>+8.1%} {tput_delta:>+13.1%}")
+
+def parse_list(value, cast=int):
+    return [v if v == "natural" else cast(v) for v in value.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmark for name_classifier.onnx")
+    parser.add_argument("--model", default=ONNX_MODEL_PATH)
+    parser.add_argument("--out", default=RESULTS_PATH, help="JSON results file")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to diff against")
+    parser.add_argument("--batch-sizes", default=",".join(map(str, BATCH_SIZES)))
+    parser.add_argument("--seq-lengths", default=",".join(map(str, SEQ_LENGTHS)), help="Comma list of lengths and/or 'natural'")
+    parser.add_argument("--threads", default=",".join(map(str, THREAD_COUNTS)), help="intra_op_num_threads values")
+    parser.add_argument("--opt-levels", default=",".join(OPT_LEVELS), help=f"Graph optimization levels: {','.join(GRAPH_OPT_LEVELS)}")
+    parser.add_argument("--providers", default="CPUExecutionProvider", help="Execution providers to test (comma list)")
+    parser.add_argument("--time-budget", type=float, default=TIME_BUDGET, help="Measured seconds per configuration")
+    args = parser.parse_args()
+
+    available = ort.get_available_providers()
+    providers = [p for p in args.providers.split(",") if p in available]
+    skipped = [p for p in args.providers.split(",") if p not in available]
+    if skipped:
+        print(f"Skipping unavailable providers: {', '.join(skipped)}")
+
+    print("--- Starting Inference Benchmark ---")
+    tokenizer = Tokenizer.from_file(TOKENIZER_PATH)
+    pad_token_id = tokenizer.token_to_id("[PAD]")
+    pool = load_token_pool(tokenizer, TEXT_FILES)
+    lengths = np.asarray([len(p) for p in pool])
+    print(f"Token pool: {len(pool)} texts | mean length {lengths.mean():.1f} | max {lengths.max()}")
+
+    results = []
+    grid = itertools.product(providers, parse_list(args.opt_levels, str), parse_list(args.threads),
+                             parse_list(args.seq_lengths), parse_list(args.batch_sizes))
+    for provider, opt_level, threads, seq_len, batch_size in grid:
+        # Same inputs for a given shape regardless of which other configurations are in the grid
+        rng = np.random.default_rng([SEED, batch_size, 0 if seq_len == "natural" else seq_len])
+        batches = make_batches(pool, batch_size, seq_len, pad_token_id, 16, rng)
+        result = {"provider": provider, "opt_level": opt_level, "threads": threads, "seq_len": seq_len, "batch_size": batch_size}
+        result.update(run_config(args.model, batches, threads, opt_level, provider, args.time_budget))
+        results.append(result)
+        lat = result["latency_us"]
+        print(f"{provider:<22} {opt_level:<8} threads={threads:<2} seq={str(seq_len):<8} batch={batch_size:<4} | "
+              f"p50 {lat['p50']:>9.1f}us p95 {lat['p95']:>9.1f}us p99 {lat['p99']:>9.1f}us | {result['throughput_rows_s']:>10.0f} rows/s")
+
+    report = {
+        "model": describe_model(args.model),
+        "environment": {
+            "onnxruntime": ort.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "token_pool": {"texts": len(pool), "mean_length": float(lengths.mean()), "max_length": int(lengths.max())},
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"\nResults saved to {args.out}")
+    if args.compare:
+        compare(args.compare, results)
+    print("--- Benchmark Finished ---")
+
+if __name__ == "__main__":
+    main()
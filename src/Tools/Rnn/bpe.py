@@ -1,29 +1,58 @@
-import pandas as pd
 from tokenizers import Tokenizer
 from tokenizers.models import BPE
 from tokenizers.trainers import BpeTrainer
 from tokenizers.pre_tokenizers import Whitespace
-import os
+import argparse
+import csv
+import time
+from build_dataset import dataset_files, text_hash
+from instrumentation import peak_rss_mb
 
 # --- Configuration ---
-DATA_FILE = "data/dataset.csv"
-CORPUS_FILE = "data/corpus.txt"
+DATA_FILE = "data/dataset.csv"  # Used when build_dataset.py has not written data/shards
 TOKENIZER_SAVE_PATH = "custom-bpe-tokenizer.json"
 VOCAB_SIZE = 1000 # Keep this small for a tiny model
+ITERATOR_BATCH_SIZE = 1000 # Texts per batch handed to the trainer
+SAMPLE_FRACTION = 1.0 # Deterministic hash subsample of the corpus (1.0 = everything)
 
-def train_tokenizer():
+def iter_text_batches(files, sample_fraction=SAMPLE_FRACTION, batch_size=ITERATOR_BATCH_SIZE, stats=None):
     """
-    Trains a BPE tokenizer from the text column of our dataset.
+    Streams the 'text' column of the given CSV files in batches. With sample_fraction < 1 a text
+    is kept when its hash falls below the fraction, so the same texts are picked on every run.
+    """
+    threshold = sample_fraction * 2**64
+    batch = []
+    for path in files:
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                text = row["text"]
+                if stats is not None:
+                    stats["read"] += 1
+                if sample_fraction < 1.0 and text_hash(text, salt=b"bpe") >= threshold:
+                    continue
+                batch.append(text)
+                if len(batch) == batch_size:
+                    if stats is not None:
+                        stats["used"] += len(batch)
+                    yield batch
+                    batch = []
+    if batch:
+        if stats is not None:
+            stats["used"] += len(batch)
+        yield batch
+
+def train_tokenizer(sample_fraction=SAMPLE_FRACTION, vocab_size=VOCAB_SIZE, save_path=TOKENIZER_SAVE_PATH):
+    """
+    Trains a BPE tokenizer from the text column of the training data, fed straight from the CSV
+    shards (or data/dataset.csv) without a temporary corpus file.
     """
     print("--- Starting Tokenizer Training ---")
+    t_start = time.perf_counter()
 
-    # 1. Generate a corpus file from the dataset
-    print(f"Reading data from {DATA_FILE} to generate corpus...")
-    df = pd.read_csv(DATA_FILE)
-    with open(CORPUS_FILE, "w", encoding="utf-8") as f:
-        for text in df["text"]:
-            f.write(text + "\n")
-    print(f"Corpus saved to {CORPUS_FILE}")
+    # 1. Stream the corpus from the dataset files
+    files, _ = dataset_files(fallback=DATA_FILE)
+    print(f"Streaming texts from {len(files)} file(s) | sample fraction {sample_fraction}")
+    stats = {"read": 0, "used": 0}
 
     # 2. Initialize a tokenizer
     tokenizer = Tokenizer(BPE(unk_token="[UNK]"))
@@ -31,23 +60,31 @@ def train_tokenizer():
 
     # 3. Initialize a trainer
     trainer = BpeTrainer(
-        vocab_size=VOCAB_SIZE,
+        vocab_size=vocab_size,
         special_tokens=["[UNK]", "[PAD]"] # [UNK] for unknown, [PAD] for padding
     )
 
     # 4. Train the tokenizer
-    print(f"Training tokenizer with vocab size {VOCAB_SIZE}...")
-    tokenizer.train([CORPUS_FILE], trainer)
+    print(f"Training tokenizer with vocab size {vocab_size}...")
+    tokenizer.train_from_iterator(iter_text_batches(files, sample_fraction, stats=stats), trainer)
+    elapsed = time.perf_counter() - t_start
     print("Training complete.")
 
     # 5. Save the tokenizer
-    tokenizer.save(TOKENIZER_SAVE_PATH)
-    print(f"Tokenizer saved to {TOKENIZER_SAVE_PATH}")
-
-    # 6. Clean up the temporary corpus file
-    os.remove(CORPUS_FILE)
-    print(f"Cleaned up {CORPUS_FILE}.")
+    tokenizer.save(save_path)
+    print(f"Tokenizer saved to {save_path}")
+    rss = peak_rss_mb()
+    print(f"Texts read: {stats['read']} | used: {stats['used']} | vocab: {tokenizer.get_vocab_size()} | "
+          f"time: {elapsed:.1f}s | peak RSS: {f'{rss:.0f} MB' if rss is not None else 'n/a'}")
     print("--- Tokenizer Training Finished ---")
 
+def main():
+    parser = argparse.ArgumentParser(description="Trains custom-bpe-tokenizer.json from the training data")
+    parser.add_argument("--sample-fraction", type=float, default=SAMPLE_FRACTION, help="Deterministic subsample of texts to train on (0-1]")
+    parser.add_argument("--vocab-size", type=int, default=VOCAB_SIZE)
+    parser.add_argument("--out", default=TOKENIZER_SAVE_PATH)
+    args = parser.parse_args()
+    train_tokenizer(args.sample_fraction, args.vocab_size, args.out)
+
 if __name__ == "__main__":
-    train_tokenizer()
\ No newline at end of file
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import math
+import os
+import random
+import shutil
+import time
+import unicodedata
+
+import numpy as np
+
+# --- Configuration ---
+# (path, label, CSV column or None for one-text-per-line files, transform)
+# Labels follow classifier.CLASS_NAMES: 0 = Name, 1 = Nickname, 2 = Company
+SOURCES = [
+    ("data/classes/names.txt", 0, None, None),
+    ("data/classes/nicknames.txt", 1, None, None),
+    ("data/classes/companies.txt", 2, None, None),
+    ("data/classes/sources/names/names_with_nickname.csv", 0, "name1", "title"),
+    ("data/classes/sources/names/names_with_nickname.csv", 0, "name2", "title"),  # Diminutives are still given names
+    ("data/classes/nicknames/scrapers/sft/sft_raw.txt", 1, None, None),
+    ("data/classes/sources/companies/res/names.txt", 0, None, None),
+    ("data/classes/sources/companies/res/companies.txt", 2, None, None),
+]
+NUM_CLASSES = 3
+OUTPUT_DIR = "data/shards"
+MANIFEST_NAME = "manifest.json"
+NUM_SHARDS = 8            # Train shards; validation gets max(1, NUM_SHARDS // 8)
+VALIDATION_FRACTION = 0.1
+MAX_PER_CLASS = 2000000   # Reservoir size per class
+DEDUP_BUCKETS = 256       # Hash buckets on disk; one bucket is held in memory at a time
+MIN_CHARS = 2
+MAX_CHARS = 256
+SEED = 0
+
+def normalize(text, transform=None):
+    """
+    NFC, no control characters, whitespace collapsed to single spaces. Returns "" for texts that
+    should be dropped.
+    """
+    text = unicodedata.normalize("NFC", text)
+    if not text.isprintable() and any(unicodedata.category(ch) == "Cc" for ch in text):
+        text = "".join(" " if unicodedata.category(ch) == "Cc" else ch for ch in text)
+    text = " ".join(text.split())
+    if transform == "title":
+        text = text.title()
+    if not MIN_CHARS <= len(text) <= MAX_CHARS:
+        return ""
+    return text
+
+def iter_source(path, column):
+    """
+    Streams raw texts from a one-per-line file or one column of a CSV.
+    """
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        if column is None:
+            for line in f:
+                yield line.rstrip("\r\n")
+        else:
+            for row in csv.DictReader(f):
+                yield row.get(column) or ""
+
+def text_hash(text, salt=b""):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8, salt=salt).digest(), "big")
+
+def is_validation(text, fraction, seed):
+    """
+    Deterministic split: a text always lands on the same side for a given seed, whatever else is
+    in the dataset or how it was sampled.
+    """
+    # Own salt prefix: blake2b pads the salt with zeros, so seed 0 alone would equal the unsalted
+    # bucket/shard hash and tie the split to it
+    return text_hash(text, salt=b"split" + seed.to_bytes(8, "little")) < fraction * 2**64
+
+class Reservoir:
+    """
+    Uniform sample of at most k stream positions (Algorithm L). Only integer positions are kept,
+    so a class of tens of millions of texts costs 8 bytes per kept slot.
+    """
+    def __init__(self, k, rng):
+        self.k = k
+        self.rng = rng
+        self.positions = np.empty(k, dtype=np.int64)
+        self.seen = 0
+        self.w = 1.0
+        self.next_pick = 0
+
+    def _advance(self):
+        # Next replaced position: skip a geometric number of items (Li, 1994)
+        self.w *= math.exp(math.log(self.rng.random()) / self.k)
+        self.next_pick += math.floor(math.log(self.rng.random()) / math.log1p(-self.w)) + 1
+
+    def offer(self):
+        position = self.seen
+        self.seen += 1
+        if position < self.k:
+            self.positions[position] = position
+            if position == self.k - 1:
+                self.next_pick = position
+                self._advance()
+        elif position == self.next_pick:
+            self.positions[self.rng.randrange(self.k)] = position
+            self._advance()
+
+    def sample(self):
+        return np.sort(self.positions[:min(self.k, self.seen)])
+
+def bucket_sources(sources, tmpdir, num_buckets, stats):
+    """
+    Pass 1: normalizes every source line and appends "label<TAB>text" to the hash bucket of the
+    text, so equal texts from any source end up in the same bucket file.
+    """
+    buckets = [open(os.path.join(tmpdir, f"bucket_{i:04d}.tmp"), "w", encoding="utf-8", newline="\n") for i in range(num_buckets)]
+    try:
+        for path, label, column, transform in sources:
+            name = f"{path}" + (f"[{column}]" if column else "")
+            if not os.path.exists(path):
+                print(f"  {name}: missing, skipped")
+                continue
+            read = kept = 0
+            for raw in iter_source(path, column):
+                read += 1
+                text = normalize(raw, transform)
+                if not text:
+                    continue
+                kept += 1
+                buckets[text_hash(text) % num_buckets].write(f"{label}\t{text}\n")
+            stats["sources"][name] = {"label": label, "read": read, "kept": kept}
+            print(f"  {name}: {read} lines, {kept} after normalization")
+    finally:
+        for f in buckets:
+            f.close()
+
+def dedup_buckets(tmpdir, num_buckets, reservoirs, stats):
+    """
+    Pass 2: one bucket at a time, drops repeated texts and texts that appear under more than one
+    class, writes the survivors to one file per class and offers their positions to the reservoirs.
+    """
+    class_files = [open(os.path.join(tmpdir, f"class_{c}.tmp"), "w", encoding="utf-8", newline="\n") for c in range(NUM_CLASSES)]
+    duplicates = conflicts = 0
+    try:
+        for i in range(num_buckets):
+            path = os.path.join(tmpdir, f"bucket_{i:04d}.tmp")
+            labels = {}
+            with open(path, encoding="utf-8", newline="\n") as f:
+                for line in f:
+                    label, text = line.rstrip("\n").split("\t", 1)
+                    label = int(label)
+                    previous = labels.get(text)
+                    if previous is None:
+                        labels[text] = label
+                    elif previous == label:
+                        duplicates += 1
+                    elif previous != -1:
+                        labels[text] = -1  # Ambiguous across classes
+                        conflicts += 1
+            os.remove(path)
+            for text, label in labels.items():
+                if label < 0:
+                    continue
+                class_files[label].write(text + "\n")
+                reservoirs[label].offer()
+    finally:
+        for f in class_files:
+            f.close()
+    stats["duplicates_dropped"] = duplicates
+    stats["cross_class_conflicts_dropped"] = conflicts
+
+def write_shards(tmpdir, out_dir, samples, num_train_shards, num_val_shards, fraction, seed, stats):
+    """
+    Pass 3: streams each class file once, keeps the sampled positions and routes every kept text
+    to a train or validation shard by hash.
+    """
+    train_paths = [os.path.join(out_dir, f"train-{i:05d}.csv") for i in range(num_train_shards)]
+    val_paths = [os.path.join(out_dir, f"validation-{i:05d}.csv") for i in range(num_val_shards)]
+    files = [open(p, "w", encoding="utf-8", newline="") for p in train_paths + val_paths]
+    writers = [csv.writer(f, lineterminator="\n") for f in files]
+    for w in writers:
+        w.writerow(["text", "label"])
+    counts = {"train": [0] * NUM_CLASSES, "validation": [0] * NUM_CLASSES}
+    try:
+        for label in range(NUM_CLASSES):
+            selected = samples[label].tolist()
+            nxt = 0
+            with open(os.path.join(tmpdir, f"class_{label}.tmp"), encoding="utf-8", newline="\n") as f:
+                for position, line in enumerate(f):
+                    if nxt >= len(selected):
+                        break
+                    if position != selected[nxt]:
+                        continue
+                    nxt += 1
+                    text = line.rstrip("\n")
+                    h = text_hash(text)
+                    if is_validation(text, fraction, seed):
+                        writers[num_train_shards + h % num_val_shards].writerow([text, label])
+                        counts["validation"][label] += 1
+                    else:
+                        writers[h % num_train_shards].writerow([text, label])
+                        counts["train"][label] += 1
+    finally:
+        for f in files:
+            f.close()
+    stats["split"] = counts
+    return train_paths, val_paths
+
+def dataset_files(out_dir=OUTPUT_DIR, fallback="data/dataset.csv"):
+    """
+    Train and validation CSV files for train.py/bpe.py: the shards listed in the manifest when a
+    built dataset exists, otherwise ([fallback], []).
+    """
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return [fallback], []
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    return ([os.path.join(out_dir, p) for p in manifest["train"]],
+            [os.path.join(out_dir, p) for p in manifest["validation"]])
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds sharded train/validation CSVs from the class sources")
+    parser.add_argument("--out", default=OUTPUT_DIR, help="Output directory for shards and manifest.json")
+    parser.add_argument("--shards", type=int, default=NUM_SHARDS, help="Number of train shards")
+    parser.add_argument("--validation-fraction", type=float, default=VALIDATION_FRACTION)
+    parser.add_argument("--max-per-class", type=int, default=MAX_PER_CLASS, help="Reservoir size per class")
+    parser.add_argument("--balance", action="store_true", help="Cap every class at the size of the smallest non-empty class")
+    parser.add_argument("--buckets", type=int, default=DEDUP_BUCKETS, help="Dedup hash buckets (more buckets, less memory)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    print("--- Building Dataset ---")
+    t_start = time.perf_counter()
+    stats = {"sources": {}}
+    out_dir = args.out
+    os.makedirs(out_dir, exist_ok=True)
+    # The manifest goes with the old shards and is written last, so an interrupted build never
+    # leaves one that lists missing shards (dataset_files() then falls back to data/dataset.csv)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    for old in glob.glob(os.path.join(out_dir, "*.csv")) + [manifest_path]:
+        if os.path.exists(old):
+            os.remove(old)
+    tmpdir = os.path.join(out_dir, "tmp")
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    os.makedirs(tmpdir)
+    try:
+        print("[1/3] Normalizing sources into hash buckets...")
+        bucket_sources(SOURCES, tmpdir, args.buckets, stats)
+
+        print("[2/3] Deduplicating and sampling...")
+        rng = random.Random(args.seed)
+        reservoirs = [Reservoir(args.max_per_class, rng) for _ in range(NUM_CLASSES)]
+        dedup_buckets(tmpdir, args.buckets, reservoirs, stats)
+        samples = [r.sample() for r in reservoirs]
+        stats["unique_per_class"] = [r.seen for r in reservoirs]
+        if args.balance:
+            # A uniform subset of a uniform sample is still uniform
+            target = min((len(s) for s in samples if len(s)), default=0)
+            sub_rng = np.random.default_rng(args.seed)
+            samples = [np.sort(sub_rng.choice(s, target, replace=False)) if len(s) > target else s for s in samples]
+        stats["sampled_per_class"] = [len(s) for s in samples]
+        print(f"  unique per class: {stats['unique_per_class']} | sampled: {stats['sampled_per_class']} | "
+              f"duplicates: {stats['duplicates_dropped']} | cross-class conflicts: {stats['cross_class_conflicts_dropped']}")
+
+        print("[3/3] Writing shards...")
+        num_val_shards = max(1, args.shards // 8)
+        train_paths, val_paths = write_shards(tmpdir, out_dir, samples, args.shards, num_val_shards,
+                                              args.validation_fraction, args.seed, stats)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    manifest = {
+        "train": [os.path.basename(p) for p in train_paths],
+        "validation": [os.path.basename(p) for p in val_paths],
+        "config": {
+            "validation_fraction": args.validation_fraction,
+            "max_per_class": args.max_per_class,
+            "balance": args.balance,
+            "seed": args.seed,
+            "min_chars": MIN_CHARS,
+            "max_chars": MAX_CHARS,
+        },
+        "stats": stats,
+    }
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    print(f"  train per class: {stats['split']['train']} | validation per class: {stats['split']['validation']}")
+    print(f"Shards written to {out_dir} in {time.perf_counter() - t_start:.1f}s")
+    print("--- Dataset Build Finished ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from tokenizers import Tokenizer
+# onnxruntime is imported by NameClassifier, so CLASS_NAMES and pad_batch load without it
+
+# --- Configuration ---
+ONNX_MODEL_PATH = "name_classifier.onnx"
+TOKENIZER_PATH = "custom-bpe-tokenizer.json"
+MAX_LEN = 128           # Must match the training configuration
+MAX_BATCH_SIZE = 1024   # Rows per session.run call
+CACHE_SIZE = 65536      # Recent string -> class results kept by NameClassifier
+CLASS_NAMES = ["Name", "Nickname", "Company"]
+PAD_AWARE_METADATA = "pad_aware"  # ONNX metadata key train.py sets to "1" on pad-aware exports
+
+def pad_batch(encodings, pad_token_id, max_len=MAX_LEN, fixed_width=False):
+    """
+    Pads a list of tokenizer encodings to the longest one in the batch (capped at max_len), or
+    to max_len itself with fixed_width.
+    """
+    lengths = np.fromiter((min(len(e.ids), max_len) for e in encodings), dtype=np.int64, count=len(encodings))
+    width = max_len if fixed_width else max(1, int(lengths.max())) if len(lengths) else 1
+    input_ids = np.full((len(encodings), width), pad_token_id, dtype=np.int64)
+    for row, (encoding, length) in enumerate(zip(encodings, lengths)):
+        input_ids[row, :length] = encoding.ids[:length]
+    return input_ids
+
+def is_pad_aware(model):
+    """
+    True for graphs train.py marked as reading the GRU output at each row's last real token, so
+    padding does not change a row's logits. Anything unmarked, such as the committed
+    name_classifier.onnx, runs the GRU over the padding and was trained on rows padded to MAX_LEN.
+    model is a path, a loaded onnx.ModelProto or an onnxruntime.InferenceSession.
+    """
+    if hasattr(model, "get_modelmeta"):
+        metadata = model.get_modelmeta().custom_metadata_map
+    else:
+        if isinstance(model, str):
+            import onnx
+            model = onnx.load(model)
+        metadata = {prop.key: prop.value for prop in model.metadata_props}
+    return metadata.get(PAD_AWARE_METADATA) == "1"
+
+class NameClassifier:
+    """
+    Wraps custom-bpe-tokenizer.json and name_classifier.onnx for in-process inference.
+
+    classify_batch() first answers texts found in the optional exact-match lexicon (see lexicon.py),
+    then repeated strings from a bounded LRU cache, skipping both tokenization and the ONNX call,
+    and runs everything else through one dynamically padded session.run per MAX_BATCH_SIZE unique
+    texts. Models that are not pad-aware (see is_pad_aware) get every row padded to max_len
+    instead, so a text's logits never depend on the rest of its batch. Instances are safe to share
+    between threads.
+    """
+    def __init__(self, model_path=ONNX_MODEL_PATH, tokenizer_path=TOKENIZER_PATH, max_len=MAX_LEN,
+                 intra_op_num_threads=1, inter_op_num_threads=1, cache_size=CACHE_SIZE,
+                 max_batch_size=MAX_BATCH_SIZE, providers=None, lexicon=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_num_threads
+        options.inter_op_num_threads = inter_op_num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=providers or ["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.pad_aware = is_pad_aware(self.session)
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.pad_token_id = self.tokenizer.token_to_id("[PAD]")
+        self.max_len = max_len
+        self.max_batch_size = max_batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.lexicon = lexicon
+        self.hits = 0
+        self.misses = 0
+        self.lexicon_hits = 0
+
+    def predict_logits(self, texts):
+        """
+        Returns the raw [len(texts), classes] logits matrix, bypassing the cache.
+        """
+        outputs = []
+        for start in range(0, len(texts), self.max_batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.max_batch_size])
+            input_ids = pad_batch(encodings, self.pad_token_id, self.max_len, fixed_width=not self.pad_aware)
+            outputs.append(self.session.run(None, {self.input_name: input_ids})[0])
+        if not outputs:
+            return np.zeros((0, len(CLASS_NAMES)), dtype=np.float32)
+        return np.concatenate(outputs)
+
+    def classify_batch(self, texts):
+        """
+        Returns the predicted class index for every text, in order.
+        """
+        results = [0] * len(texts)
+        pending = {}
+        # Read-only memory-mapped lookups, so they run outside the lock
+        found = self.lexicon.lookup_batch(texts) if self.lexicon is not None else None
+        lexicon_hits = 0
+        with self._lock:
+            for i, text in enumerate(texts):
+                if found is not None and found[i] is not None:
+                    results[i] = found[i]
+                    lexicon_hits += 1
+                    continue
+                label = self._cache.get(text)
+                if label is None:
+                    pending.setdefault(text, []).append(i)
+                    continue
+                self._cache.move_to_end(text)
+                results[i] = label
+            missed = sum(len(positions) for positions in pending.values())
+            self.lexicon_hits += lexicon_hits
+            self.hits += len(texts) - lexicon_hits - missed
+            self.misses += missed
+        if not pending:
+            return results
+
+        unique_texts = list(pending)
+        predictions = self.predict_logits(unique_texts).argmax(axis=1).tolist()
+        with self._lock:
+            for text, label in zip(unique_texts, predictions):
+                for i in pending[text]:
+                    results[i] = label
+                if self.cache_size > 0:
+                    self._cache[text] = label
+                    self._cache.move_to_end(text)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+    def classify(self, text):
+        return self.classify_batch([text])[0]
+
+    def cache_info(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._cache),
+                "max_size": self.cache_size,
+            }
+
+    def lexicon_info(self):
+        """
+        Share of all classified texts answered by the lexicon instead of the cache or the model.
+        """
+        with self._lock:
+            total = self.lexicon_hits + self.hits + self.misses
+            return {
+                "entries": len(self.lexicon) if self.lexicon is not None else 0,
+                "hits": self.lexicon_hits,
+                "lookups": total if self.lexicon is not None else 0,
+                "hit_rate": self.lexicon_hits / total if total else 0.0,
+            }
@@ -1,10 +1,19 @@
 import argparse
+import asyncio
+import collections
 import concurrent.futures
+import mmap
+import os
+import socket
+import queue
 import re
+import ssl
+import struct
 import threading
 import time
 from pathlib import Path
-from typing import Iterable, Optional, Tuple
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
 
 try:
     # Python 3
@@ -19,6 +28,22 @@ except ImportError:  # pragma: no cover
 TITLE_REGEX = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
 MISSING_TITLE_PHRASE = "stránka, na kterou se odkazujete, byla pravděpodobně přesunuta"
 INACTIVE_TITLE = "neaktivní uživatel"
+DEFAULT_BASE_URL = "https://www.itnetwork.cz/portfolio/"
+REQUEST_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Connection": "keep-alive",
+}
+TITLE_END = b"</title>"
+READ_CHUNK = 8192               # Bytes per read while looking for </title>
+MAX_TITLE_PREFIX = 512 * 1024   # Give up looking for </title> after this many bytes
+DRAIN_LIMIT = 1024 * 1024       # asyncio engine: finish reading at most this much of the rest to keep the connection;
+                                # above any normal page, so only oversized pages cost a new connection
+RETRY_STATUSES = {429, 500, 502, 503, 504}  # Throttling/overload pages: never take their title, retry instead
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 10              # asyncio engine: same hop limit as urllib's redirect handler
+ERROR_WINDOW = 200              # Adaptive mode: recent attempts the error rate is measured over
+ERROR_RATE_LIMIT = 0.1          # Adaptive mode: error rate (timeouts, 429, 5xx) in that window that cuts the limit
 
 
 def parse_title(html: str) -> Optional[str]:
@@ -39,22 +64,185 @@ def is_inactive_user_title(title: str) -> bool:
     return title.strip().lower() == INACTIVE_TITLE
 
 
-def fetch_title_for_id(item_id: int, timeout: float, retries: int, backoff_base: float, user_agent: str) -> Tuple[int, Optional[str], Optional[str]]:
+def _title_end_found(buf: bytearray, scan_from: int) -> bool:
+    return bytes(buf[scan_from:]).lower().find(TITLE_END) != -1
+
+
+def read_title_prefix(read: Callable[[int], bytes]) -> bytes:
+    """
+    Reads a response body chunk by chunk and stops as soon as </title> has been seen, so only the
+    document prefix is downloaded and decoded. Returns everything read so far.
+    """
+    buf = bytearray()
+    while len(buf) < MAX_TITLE_PREFIX:
+        chunk = read(READ_CHUNK)
+        if not chunk:
+            break
+        scan_from = max(0, len(buf) - len(TITLE_END) + 1)
+        buf += chunk
+        if _title_end_found(buf, scan_from):
+            break
+    return bytes(buf)
+
+
+async def read_title_prefix_async(read: Callable[[int], Awaitable[bytes]]) -> Tuple[bytes, bool]:
+    """
+    asyncio counterpart of read_title_prefix. Also returns whether the body was read to its end.
+    """
+    buf = bytearray()
+    while len(buf) < MAX_TITLE_PREFIX:
+        chunk = await read(READ_CHUNK)
+        if not chunk:
+            return bytes(buf), True
+        scan_from = max(0, len(buf) - len(TITLE_END) + 1)
+        buf += chunk
+        if _title_end_found(buf, scan_from):
+            break
+    return bytes(buf), False
+
+
+def title_result(item_id: int, title: str) -> Tuple[int, Optional[str], Optional[str]]:
+    if is_missing_page_title(title):
+        return item_id, None, "missing"
+    if is_inactive_user_title(title):
+        return item_id, None, "inactive"
+    return item_id, title, None
+
+
+def attempt_outcome(status: Optional[int] = None, timed_out: bool = False) -> str:
+    """
+    Maps one request attempt to the signal AdaptiveLimiter reacts to.
+    """
+    if timed_out:
+        return "timeout"
+    if status == 429:
+        return "throttled"
+    if status is not None and status >= 500:
+        return "server-error"
+    return "ok" if status is not None else "error"
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit shared by all workers of one run. Every request attempt holds a slot.
+
+    - A fast success (latency within `tolerance` x the no-load baseline) grows the limit by about
+      one slot per round trip (limit += 1 / limit).
+    - Timeouts, 429 and 5xx cut the limit multiplicatively once they make up more than
+      `error_rate_limit` of the last `error_window` attempts, so isolated errors from a healthy
+      server do not count as overload. Slow successes (the latency gradient) cut it gently.
+    - After a cut, at least `limit` further attempts (one round trip of the new window) complete
+      before the next one, so one burst of failures counts once.
+
+    The baseline is the minimum observed latency, drifting slowly upwards so it can follow a
+    server that became permanently slower.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, tolerance: float = 2.0,
+                 backoff: float = 0.7, slow_backoff: float = 0.9, error_window: int = ERROR_WINDOW,
+                 error_rate_limit: float = ERROR_RATE_LIMIT):
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.slow_backoff = slow_backoff
+        self.inflight = 0
+        self.baseline: Optional[float] = None
+        self.error_rate_limit = error_rate_limit
+        self.recent_errors: "collections.deque[bool]" = collections.deque(maxlen=error_window)
+        self.recent_error_count = 0
+        self.since_cut = 0
+        self.latencies: "collections.deque[float]" = collections.deque(maxlen=1024)
+        self.counts: "collections.Counter[str]" = collections.Counter()
+        self.cond = threading.Condition()
+        self.async_slot_freed: Optional[asyncio.Event] = None
+
+    def _try_acquire(self) -> bool:
+        if self.inflight < int(self.limit):
+            self.inflight += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        with self.cond:
+            while not self._try_acquire():
+                self.cond.wait()
+
+    async def acquire_async(self) -> None:
+        # The asyncio engine calls acquire/release from one event loop thread only
+        if self.async_slot_freed is None:
+            self.async_slot_freed = asyncio.Event()
+        while True:
+            with self.cond:
+                if self._try_acquire():
+                    return
+                self.async_slot_freed.clear()
+            await self.async_slot_freed.wait()
+
+    def release(self, outcome: str, latency: float) -> None:
+        with self.cond:
+            self.inflight -= 1
+            self.counts[outcome] += 1
+            failed = outcome in ("timeout", "throttled", "server-error")
+            if len(self.recent_errors) == self.recent_errors.maxlen:
+                self.recent_error_count -= self.recent_errors[0]
+            self.recent_errors.append(failed)
+            self.recent_error_count += failed
+            self.since_cut += 1
+            can_cut = self.since_cut >= self.limit
+            if outcome == "ok":
+                self.latencies.append(latency)
+                if self.baseline is None or latency < self.baseline:
+                    self.baseline = latency
+                else:
+                    self.baseline += (latency - self.baseline) * 0.001
+                if latency <= self.baseline * self.tolerance:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                elif can_cut:
+                    self.limit = max(self.min_limit, self.limit * self.slow_backoff)
+                    self.since_cut = 0
+            elif failed and can_cut and self.recent_error_count > self.error_rate_limit * len(self.recent_errors):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.since_cut = 0
+            self.cond.notify_all()
+        if self.async_slot_freed is not None:
+            self.async_slot_freed.set()
+
+    def report(self) -> str:
+        """
+        One-line live metrics for the progress logger; outcome counts cover the time since the last report.
+        """
+        with self.cond:
+            latencies = sorted(self.latencies)
+            counts = dict(self.counts)
+            self.counts.clear()
+            limit, inflight, baseline = self.limit, self.inflight, self.baseline
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+        return (f"limit={limit:.1f} inflight={inflight} | latency p50={p50:.0f}ms p95={p95:.0f}ms base={(baseline or 0) * 1000:.0f}ms | "
+                f"ok={counts.get('ok', 0)} 429={counts.get('throttled', 0)} 5xx={counts.get('server-error', 0)} "
+                f"timeouts={counts.get('timeout', 0)} errors={counts.get('error', 0)}")
+
+
+def fetch_title_for_id(item_id: int, timeout: float, retries: int, backoff_base: float, user_agent: str, base_url: str = DEFAULT_BASE_URL,
+                       limiter: Optional[AdaptiveLimiter] = None) -> Tuple[int, Optional[str], Optional[str]]:
     """
     Returns (id, title, error). If error is not None, title may be None.
     """
-    url = f"https://www.itnetwork.cz/portfolio/{item_id}"
+    url = f"{base_url}{item_id}"
     last_error: Optional[str] = None
     for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        outcome = "error"
+        t0 = time.monotonic()
         try:
-            req = Request(url, headers={
-                "User-Agent": user_agent,
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-                "Accept-Language": "en-US,en;q=0.9",
-                "Connection": "keep-alive",
-            })
+            req = Request(url, headers={"User-Agent": user_agent, **REQUEST_HEADERS})
+            # Closing the response after the <title> prefix drops the rest of the page unread
             with urlopen(req, timeout=timeout) as resp:
-                raw = resp.read()
+                raw = read_title_prefix(resp.read)
+            outcome = attempt_outcome(resp.status)
             # Try utf-8 first, fallback to latin-1
             try:
                 html = raw.decode("utf-8", errors="replace")
@@ -63,29 +251,31 @@ def fetch_title_for_id(item_id: int, timeout: float, retries: int, backoff_base:
             title = parse_title(html)
             if title is None:
                 return item_id, None, "no-title"
-            if is_missing_page_title(title):
-                return item_id, None, "missing"
-            if is_inactive_user_title(title):
-                return item_id, None, "inactive"
-            return item_id, title, None
+            return title_result(item_id, title)
         except HTTPError as e:
+            outcome = attempt_outcome(e.code)
             try:
-                body = e.read().decode("utf-8", errors="replace")
+                body = read_title_prefix(e.read).decode("utf-8", errors="replace") if e.code not in RETRY_STATUSES else ""
             except Exception:
                 body = ""
+            finally:
+                e.close()
             title = parse_title(body) if body else None
             # Even on HTTP errors, capturing the title (e.g., error page) is useful
             if title:
-                if is_missing_page_title(title):
-                    return item_id, None, "missing"
-                if is_inactive_user_title(title):
-                    return item_id, None, "inactive"
-                return item_id, title, None
+                return title_result(item_id, title)
             last_error = f"HTTPError {e.code}"
         except URLError as e:
+            outcome = attempt_outcome(timed_out=isinstance(e.reason, (socket.timeout, TimeoutError)))
             last_error = f"URLError {getattr(e, 'reason', e)}"
+        except (socket.timeout, TimeoutError) as e:
+            outcome = attempt_outcome(timed_out=True)
+            last_error = f"Exception {e.__class__.__name__}: {e}"
         except Exception as e:  # noqa: BLE001
             last_error = f"Exception {e.__class__.__name__}: {e}"
+        finally:
+            if limiter is not None:
+                limiter.release(outcome, time.monotonic() - t0)
 
         # Backoff before retrying
         if attempt < retries:
@@ -95,22 +285,468 @@ def fetch_title_for_id(item_id: int, timeout: float, retries: int, backoff_base:
     return item_id, None, last_error or "unknown-error"
 
 
+class ResponseBody:
+    """
+    Incremental reader for one HTTP/1.1 response body (Content-Length, chunked, or until close).
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, headers: Dict[str, str]):
+        self.reader = reader
+        self.chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        self.remaining: Optional[int] = None if self.chunked or "content-length" not in headers else int(headers["content-length"])
+        # Without a length or chunking the body ends with the connection, which cannot be reused
+        self.framed = self.chunked or self.remaining is not None
+        self.chunk_left = 0
+        self.done = False
+        self.bytes_read = 0
+
+    async def read(self, n: int) -> bytes:
+        if self.done:
+            return b""
+        if self.chunked:
+            if self.chunk_left == 0:
+                size = int((await self.reader.readline()).split(b";", 1)[0].strip() or b"0", 16)
+                if size == 0:
+                    # Skip optional trailers
+                    while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    self.done = True
+                    return b""
+                self.chunk_left = size
+            data = await self.reader.read(min(n, self.chunk_left))
+            if not data:
+                raise asyncio.IncompleteReadError(b"", self.chunk_left)
+            self.chunk_left -= len(data)
+            if self.chunk_left == 0:
+                await self.reader.readexactly(2)
+        elif self.remaining is not None:
+            if self.remaining == 0:
+                self.done = True
+                return b""
+            data = await self.reader.read(min(n, self.remaining))
+            if not data:
+                raise asyncio.IncompleteReadError(b"", self.remaining)
+            self.remaining -= len(data)
+        else:
+            data = await self.reader.read(n)
+            if not data:
+                self.done = True
+        self.bytes_read += len(data)
+        return data
+
+
+class HttpConnectionPool:
+    """
+    Keeps persistent HTTP/1.1 connections to a single host for the asyncio engine. At most `size`
+    requests are in flight; idle connections are reused until the server closes them.
+    """
+
+    def __init__(self, base_url: str, size: int, drain_limit: int = DRAIN_LIMIT):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.is_https = parts.scheme == "https"
+        self.port = parts.port or (443 if self.is_https else 80)
+        self.path_prefix = parts.path or "/"
+        self.ssl_context = ssl.create_default_context() if self.is_https else None
+        self.slots = asyncio.Semaphore(size)
+        self.idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.drain_limit = drain_limit
+        self.opened = 0
+        self.reused = 0
+        self.closed_early = 0
+        self.redirects = 0
+        self.bytes_read = 0
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        self.opened += 1
+        return await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl_context, server_hostname=self.host if self.is_https else None
+        )
+
+    @staticmethod
+    def _discard(conn: Tuple[asyncio.StreamReader, asyncio.StreamWriter]) -> None:
+        conn[1].close()
+
+    async def _exchange(self, conn, path: str, headers: Dict[str, str]) -> Tuple[int, bytes, bool, Optional[str]]:
+        reader, writer = conn
+        request_lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}"]
+        request_lines += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(request_lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        version, status = status_line.split(b" ", 2)[:2]
+        response_headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == b"HTTP/1.1" and response_headers.get("connection", "").lower() != "close"
+        body = ResponseBody(reader, response_headers)
+        keep_alive = keep_alive and body.framed
+        prefix, complete = await read_title_prefix_async(body.read)
+        if not complete and keep_alive and (body.remaining is None or body.remaining <= self.drain_limit):
+            # HTTP/1.1 cannot abandon a response mid-body: either finish a short remainder to keep
+            # the connection, or drop the connection instead of downloading a large page
+            drained = 0
+            while drained <= self.drain_limit:
+                chunk = await body.read(READ_CHUNK)
+                if not chunk:
+                    complete = True
+                    break
+                drained += len(chunk)
+        if not complete:
+            self.closed_early += 1
+            keep_alive = False
+        self.bytes_read += body.bytes_read
+        return int(status), prefix, keep_alive, response_headers.get("location")
+
+    def _redirect_path(self, path: str, location: str) -> Optional[str]:
+        """
+        Request path for a Location header, or None when it points at another host (the pool
+        only holds connections to its own host).
+        """
+        scheme = "https" if self.is_https else "http"
+        target = urlsplit(urljoin(f"{scheme}://{self.host}:{self.port}{path}", location))
+        if target.scheme != scheme or target.hostname != self.host or (target.port or (443 if self.is_https else 80)) != self.port:
+            return None
+        return (target.path or "/") + (f"?{target.query}" if target.query else "")
+
+    async def get(self, path: str, headers: Dict[str, str]) -> Tuple[int, bytes]:
+        """
+        Returns the status and the body prefix up to </title>. Same-host redirects are followed
+        like urlopen does in the thread engine, up to MAX_REDIRECTS hops; the last 3xx response is
+        returned when the limit is hit or the redirect leaves the host.
+        """
+        async with self.slots:
+            for _ in range(MAX_REDIRECTS + 1):
+                status, body, location = await self._request(path, headers)
+                next_path = self._redirect_path(path, location) if status in REDIRECT_STATUSES and location else None
+                if next_path is None:
+                    break
+                self.redirects += 1
+                path = next_path
+            return status, body
+
+    async def _request(self, path: str, headers: Dict[str, str]) -> Tuple[int, bytes, Optional[str]]:
+        """
+        One request on an idle or new connection; returns the status, body prefix and Location.
+        """
+        conn = self.idle.pop() if self.idle else None
+        was_idle = conn is not None
+        if was_idle:
+            self.reused += 1
+        else:
+            conn = await self._open()
+        try:
+            try:
+                status, body, keep_alive, location = await self._exchange(conn, path, headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not was_idle:
+                    raise
+                # The server may drop an idle keep-alive connection; retry once on a fresh one
+                self._discard(conn)
+                conn = await self._open()
+                status, body, keep_alive, location = await self._exchange(conn, path, headers)
+        except BaseException:
+            # Includes timeouts/cancellation mid-response: the stream state is unknown
+            self._discard(conn)
+            raise
+        if keep_alive:
+            self.idle.append(conn)
+        else:
+            self._discard(conn)
+        return status, body, location
+
+    async def close(self) -> None:
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:  # noqa: BLE001
+                pass
+
+
+async def fetch_title_async(pool: HttpConnectionPool, item_id: int, timeout: float, retries: int, backoff_base: float, user_agent: str,
+                            limiter: Optional[AdaptiveLimiter] = None) -> Tuple[int, Optional[str], Optional[str]]:
+    """
+    asyncio counterpart of fetch_title_for_id over a shared HttpConnectionPool.
+    Returns (id, title, error) with the same meaning.
+    """
+    headers = {"User-Agent": user_agent, **REQUEST_HEADERS}
+    last_error: Optional[str] = None
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            await limiter.acquire_async()
+        outcome = "error"
+        t0 = time.monotonic()
+        try:
+            status, raw = await asyncio.wait_for(pool.get(f"{pool.path_prefix}{item_id}", headers), timeout)
+            outcome = attempt_outcome(status)
+            title = parse_title(raw.decode("utf-8", errors="replace")) if raw and status not in RETRY_STATUSES else None
+            if status < 300:
+                if title is None:
+                    return item_id, None, "no-title"
+                return title_result(item_id, title)
+            # Even on HTTP errors, capturing the title (e.g., error page) is useful
+            if title:
+                return title_result(item_id, title)
+            last_error = f"HTTPError {status}"
+        except asyncio.TimeoutError:
+            outcome = attempt_outcome(timed_out=True)
+            last_error = "URLError timed out"
+        except (OSError, asyncio.IncompleteReadError, ssl.SSLError) as e:
+            last_error = f"URLError {e}"
+        except Exception as e:  # noqa: BLE001
+            last_error = f"Exception {e.__class__.__name__}: {e}"
+        finally:
+            if limiter is not None:
+                limiter.release(outcome, time.monotonic() - t0)
+
+        # Backoff before retrying
+        if attempt < retries:
+            await asyncio.sleep(backoff_base * (2 ** attempt))
+
+    return item_id, None, last_error or "unknown-error"
+
+
+async def run_async_engine(ids: Iterable[int], args, user_agent: str, handle_result, limiter: Optional[AdaptiveLimiter] = None) -> HttpConnectionPool:
+    """
+    Runs `--workers` coroutines (`--max-workers` with an adaptive limiter) that pull IDs from one
+    shared iterator and fetch them through a pool of `--connections` keep-alive connections.
+    `--rate-delay` spaces out request starts globally.
+    """
+    workers = limiter.max_limit if limiter is not None else args.workers
+    pool = HttpConnectionPool(args.base_url, args.connections or workers, args.drain_limit)
+    id_iter = iter(ids)
+    loop = asyncio.get_running_loop()
+    next_start = loop.time()
+
+    async def worker():
+        nonlocal next_start
+        for item_id in id_iter:
+            if args.rate_delay > 0:
+                slot = max(next_start, loop.time())
+                next_start = slot + args.rate_delay
+                await asyncio.sleep(slot - loop.time())
+            handle_result(await fetch_title_async(pool, item_id, args.timeout, args.retries, 0.2, user_agent, limiter))
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        await pool.close()
+    return pool
+
+
+class ResumeBitmap:
+    """
+    Resume state for --resume: one bit per ID in start..end, memory-mapped and updated in place.
+    The file is a small header (magic, start, end) followed by the bit array, so a 10M ID range
+    takes about 1.2 MB and loads without parsing.
+    """
+
+    MAGIC = b"SFTDONE1"
+    HEADER = struct.Struct("<8sqq")
+    SCAN_BLOCK = 64 * 1024
+
+    def __init__(self, path: Path, start: int, end: int):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.size = (end - start + 1 + 7) // 8
+        existing = self._read_header()
+        if existing != (start, end):
+            self._create(existing)
+        self.file = path.open("r+b")
+        self.mm = mmap.mmap(self.file.fileno(), self.HEADER.size + self.size)
+
+    def _read_header(self) -> Optional[Tuple[int, int]]:
+        if not self.path.exists():
+            return None
+        with self.path.open("rb") as f:
+            raw = f.read(self.HEADER.size)
+        if len(raw) < self.HEADER.size:
+            return None
+        magic, start, end = self.HEADER.unpack(raw)
+        if magic != self.MAGIC or self.path.stat().st_size < self.HEADER.size + (end - start + 1 + 7) // 8:
+            return None
+        return start, end
+
+    def _create(self, existing: Optional[Tuple[int, int]]) -> None:
+        # A different range: start a new bitmap and carry over the bits the two ranges share
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.start, self.end))
+            f.truncate(self.HEADER.size + self.size)
+        if existing is not None:
+            old = ResumeBitmap(self.path, *existing)
+            new = ResumeBitmap(tmp_path, self.start, self.end)
+            for item_id in old.iter_set(max(self.start, old.start), min(self.end, old.end)):
+                new.set(item_id)
+            old.close()
+            new.close()
+        os.replace(tmp_path, self.path)
+
+    def is_set(self, item_id: int) -> bool:
+        offset = item_id - self.start
+        return bool(self.mm[self.HEADER.size + (offset >> 3)] & (1 << (offset & 7)))
+
+    def set(self, item_id: int) -> None:
+        offset = item_id - self.start
+        pos = self.HEADER.size + (offset >> 3)
+        self.mm[pos] = self.mm[pos] | (1 << (offset & 7))
+
+    def count(self) -> int:
+        total = 0
+        for pos in range(self.HEADER.size, self.HEADER.size + self.size, self.SCAN_BLOCK):
+            block = self.mm[pos:min(pos + self.SCAN_BLOCK, self.HEADER.size + self.size)]
+            total += int.from_bytes(block, "little").bit_count()
+        return total
+
+    def _iter_bits(self, first: int, last: int, want_set: bool) -> Iterable[int]:
+        skip_byte = 0x00 if want_set else 0xFF
+        first_off, last_off = first - self.start, last - self.start
+        for block_start in range(first_off >> 3, (last_off >> 3) + 1, self.SCAN_BLOCK):
+            block_end = min(block_start + self.SCAN_BLOCK, (last_off >> 3) + 1)
+            block = self.mm[self.HEADER.size + block_start:self.HEADER.size + block_end]
+            # Whole blocks with nothing to yield cost one comparison
+            if block.count(skip_byte) == len(block):
+                continue
+            for i, byte in enumerate(block):
+                if byte == skip_byte:
+                    continue
+                base = (block_start + i) << 3
+                for bit in range(8):
+                    offset = base + bit
+                    if first_off <= offset <= last_off and bool(byte & (1 << bit)) == want_set:
+                        yield self.start + offset
+
+    def iter_set(self, first: int, last: int) -> Iterable[int]:
+        return self._iter_bits(first, last, True)
+
+    def iter_pending(self) -> Iterable[int]:
+        """
+        Lazily yields IDs whose bit is still clear, in ascending order.
+        """
+        return self._iter_bits(self.start, self.end, False)
+
+    def flush(self) -> None:
+        self.mm.flush()
+
+    def close(self) -> None:
+        self.mm.flush()
+        self.mm.close()
+        self.file.close()
+
+
+class ResultWriter:
+    """
+    Single owner of the output file and the resume bitmap. Workers hand results over through a
+    queue; the writer thread appends them in batches to the output file it keeps open, flushes
+    every `flush_interval` seconds (or `flush_lines` results) and fsyncs every `fsync_interval`
+    seconds. Output lines are always flushed before the done bits of the same batch are set.
+    """
+
+    def __init__(self, output_path: Path, bitmap: Optional[ResumeBitmap], total_to_do: int, t_start: float,
+                 flush_lines: int = 512, flush_interval: float = 1.0, fsync_interval: float = 10.0):
+        self.output_path = output_path
+        self.bitmap = bitmap
+        self.total_to_do = total_to_do
+        self.t_start = t_start
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.queue: "queue.Queue[Optional[Tuple[int, Optional[str], Optional[str]]]]" = queue.Queue()
+        # Only the writer thread updates these; other threads just read them
+        self.processed = 0
+        self.saved = 0
+        self.thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+
+    def start(self) -> "ResultWriter":
+        self.thread.start()
+        return self
+
+    def submit(self, result: Tuple[int, Optional[str], Optional[str]]) -> None:
+        self.queue.put(result)
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self) -> None:
+        out_f = self.output_path.open("a", encoding="utf-8")
+        lines: List[str] = []
+        done_ids: List[int] = []
+        last_flush = last_fsync = time.time()
+        closing = False
+        try:
+            while not closing:
+                try:
+                    result = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    result = ()
+                if result is None:
+                    closing = True
+                elif result:
+                    item_id, title, error = result
+                    done_ids.append(item_id)
+                    # Skip writing for known missing pages or any error; write only the name (trimmed)
+                    if not (error in {"missing", "inactive"} or title is None):
+                        lines.append(f"{title.strip()}\n")
+                        self.saved += 1
+                    self.processed += 1
+                    if self.processed % 1000 == 0:
+                        elapsed = time.time() - self.t_start
+                        rate = self.processed / max(1.0, elapsed)
+                        remaining = self.total_to_do - self.processed
+                        eta = remaining / max(1e-6, rate)
+                        print(f"Processed {self.processed}/{self.total_to_do} | {rate:.1f} req/s | ETA ~{eta/60:.1f} min")
+
+                now = time.time()
+                if closing or len(done_ids) >= self.flush_lines or now - last_flush >= self.flush_interval:
+                    if lines:
+                        out_f.write("".join(lines))
+                        out_f.flush()
+                    if self.bitmap is not None:
+                        for item_id in done_ids:
+                            self.bitmap.set(item_id)
+                    lines.clear()
+                    done_ids.clear()
+                    last_flush = now
+                    if closing or now - last_fsync >= self.fsync_interval:
+                        os.fsync(out_f.fileno())
+                        if self.bitmap is not None:
+                            self.bitmap.flush()
+                        last_fsync = now
+        finally:
+            out_f.close()
+
+
 def iter_ranges(start: int, end: int) -> Iterable[int]:
     return range(start, end + 1)
 
 
-def read_done_ids(done_path: Path, legacy_output_with_ids: Path) -> set:
-    done: set = set()
+def read_done_ids(done_path: Path, legacy_output_with_ids: Path) -> Iterable[int]:
+    """
+    Yields IDs recorded by older versions: the text .done_ids file, or the legacy output format.
+    Only used to seed a new ResumeBitmap.
+    """
     # Preferred: dedicated done-ids file
     if done_path.exists():
         try:
             with done_path.open("r", encoding="utf-8", errors="ignore") as f:
                 for line in f:
                     try:
-                        done.add(int(line.strip()))
+                        yield int(line.strip())
                     except Exception:
                         continue
-            return done
+            return
         except Exception:
             pass
     # Fallback: legacy mode where output started with id<TAB>...
@@ -122,118 +758,125 @@ def read_done_ids(done_path: Path, legacy_output_with_ids: Path) -> set:
                         continue
                     parts = line.split("\t", 1)
                     try:
-                        done.add(int(parts[0]))
+                        yield int(parts[0])
                     except Exception:
                         # names-only lines won't parse; ignore
                         continue
         except Exception:
-            return set()
-    return done
+            return
+
+
+def open_resume_bitmap(bitmap_path: Path, done_ids_path: Path, output_path: Path, start: int, end: int) -> ResumeBitmap:
+    is_new = not bitmap_path.exists()
+    bitmap = ResumeBitmap(bitmap_path, start, end)
+    if is_new:
+        migrated = 0
+        for item_id in read_done_ids(done_ids_path, output_path):
+            if start <= item_id <= end:
+                bitmap.set(item_id)
+                migrated += 1
+        if migrated:
+            print(f"Migrated {migrated} done IDs from {done_ids_path.name} into {bitmap_path.name}")
+        bitmap.flush()
+    return bitmap
 
 
 def main():
     parser = argparse.ArgumentParser(description="Scrape itnetwork portfolio titles into sft_raw.txt")
     parser.add_argument("--start", type=int, default=1, help="Start ID (inclusive)")
     parser.add_argument("--end", type=int, default=145000, help="End ID (inclusive)")
-    parser.add_argument("--workers", type=int, default=64, help="Number of threads")
+    parser.add_argument("--workers", type=int, default=64, help="Number of threads (or coroutines with --engine asyncio)")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads", help="Thread pool with urlopen, or asyncio with pooled keep-alive connections")
+    parser.add_argument("--connections", type=int, default=0, help="asyncio engine: max persistent connections (default: --workers)")
+    parser.add_argument("--drain-limit", type=int, default=DRAIN_LIMIT, help="asyncio engine: max bytes left after </title> that are still read to keep a connection alive")
+    parser.add_argument("--base-url", type=str, default=DEFAULT_BASE_URL, help="Portfolio URL prefix; point at a local stand-in server for testing")
     parser.add_argument("--timeout", type=float, default=10.0, help="Per-request timeout in seconds")
     parser.add_argument("--retries", type=int, default=2, help="Retries per request on failure")
     parser.add_argument("--rate-delay", type=float, default=0.0, help="Optional sleep between task submissions (seconds)")
+    parser.add_argument("--adaptive", action="store_true", help="Adapt concurrency (AIMD) to latency, timeouts and 429/5xx; --workers is the starting point")
+    parser.add_argument("--min-workers", type=int, default=1, help="Adaptive mode: lower bound on concurrent requests")
+    parser.add_argument("--max-workers", type=int, default=256, help="Adaptive mode: upper bound on concurrent requests")
+    parser.add_argument("--latency-tolerance", type=float, default=2.0, help="Adaptive mode: latency above this multiple of the baseline stops growth")
+    parser.add_argument("--window", type=int, default=0, help="threads engine: max IDs submitted but not finished (default: 4x --workers)")
     parser.add_argument("--out", type=str, default="sft_raw.txt", help="Output filename (written next to this script)")
-    parser.add_argument("--resume", action="store_true", help="Resume by skipping IDs already in output file")
+    parser.add_argument("--resume", action="store_true", help="Resume by skipping IDs already marked done in <out>.done_bitmap")
     parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress logs")
     args = parser.parse_args()
 
     base_dir = Path(__file__).parent
     output_path = base_dir / args.out
     done_ids_path = base_dir / f"{args.out}.done_ids"
+    bitmap_path = base_dir / f"{args.out}.done_bitmap"
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
     user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
 
-    already_done = read_done_ids(done_ids_path, output_path) if args.resume else set()
-    ids_to_process = [i for i in iter_ranges(args.start, args.end) if i not in already_done]
-    total_to_do = len(ids_to_process)
+    # Pending IDs are produced lazily, either from the range or by scanning the bitmap for clear bits
+    bitmap = open_resume_bitmap(bitmap_path, done_ids_path, output_path, args.start, args.end) if args.resume else None
+    ids_to_process = bitmap.iter_pending() if bitmap is not None else iter_ranges(args.start, args.end)
+    total_to_do = (args.end - args.start + 1) - (bitmap.count() if bitmap is not None else 0)
 
-    print(f"Scraping IDs {args.start}..{args.end} | workers={args.workers} | resume={args.resume} | to_do={total_to_do}")
+    print(f"Scraping IDs {args.start}..{args.end} | engine={args.engine} | workers={args.workers} | resume={args.resume} | to_do={total_to_do}")
 
-    write_lock = threading.Lock()
-    processed_counter = 0
-    saved_counter = 0
-    processed_lock = threading.Lock()
-    saved_lock = threading.Lock()
     t_start = time.time()
+    writer = ResultWriter(output_path, bitmap, total_to_do, t_start).start()
+
+    limiter = AdaptiveLimiter(args.workers, args.min_workers, args.max_workers, args.latency_tolerance) if args.adaptive else None
+    thread_count = args.max_workers if limiter is not None else args.workers
 
     stop_event = threading.Event()
 
     def progress_logger():
         while not stop_event.wait(args.progress_interval):
-            with processed_lock:
-                processed = processed_counter
-            with saved_lock:
-                saved = saved_counter
+            processed = writer.processed
+            saved = writer.saved
             elapsed = time.time() - t_start
             rate = processed / max(1.0, elapsed)
             remaining = max(0, total_to_do - processed)
             eta = remaining / max(1e-6, rate)
             print(f"Progress: {processed}/{total_to_do} processed, {saved} saved | {rate:.1f} req/s | ETA ~{eta/60:.1f} min")
-
-    def handle_result(result: Tuple[int, Optional[str], Optional[str]]):
-        nonlocal processed_counter, saved_counter
-        item_id, title, error = result
-        # Append to done-ids file if resume is enabled
-        if args.resume:
-            with write_lock:
-                with done_ids_path.open("a", encoding="utf-8") as df:
-                    df.write(f"{item_id}\n")
-
-        # Skip writing for known missing pages or any error
-        if error in {"missing", "inactive"} or title is None:
-            with processed_lock:
-                processed_counter += 1
-            return
-
-        # Write only the name (trimmed)
-        line = f"{title.strip()}\n"
-        with write_lock:
-            with output_path.open("a", encoding="utf-8") as f:
-                f.write(line)
-        with saved_lock:
-            saved_counter += 1
-        with processed_lock:
-            processed_counter += 1
-        with processed_lock:
-            processed_counter += 1
-            if processed_counter % 1000 == 0:
-                elapsed = time.time() - t_start
-                rate = processed_counter / max(1.0, elapsed)
-                remaining = total_to_do - processed_counter
-                eta = remaining / max(1e-6, rate)
-                print(f"Processed {processed_counter}/{total_to_do} | {rate:.1f} req/s | ETA ~{eta/60:.1f} min")
+            if limiter is not None:
+                print(f"  Concurrency: {limiter.report()}")
 
     # Start periodic progress logger
     logger_thread = threading.Thread(target=progress_logger, daemon=True)
     logger_thread.start()
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
-        futures = []
-        for item_id in ids_to_process:
-            future = executor.submit(
-                fetch_title_for_id,
-                item_id,
-                args.timeout,
-                args.retries,
-                0.2,  # backoff base seconds
-                user_agent,
-            )
-            future.add_done_callback(lambda fut: handle_result(fut.result()))
-            futures.append(future)
-            if args.rate_delay > 0:
-                time.sleep(args.rate_delay)
-
-        # Wait for all to complete
-        for fut in concurrent.futures.as_completed(futures):
-            pass
+    try:
+        if args.engine == "asyncio":
+            pool = asyncio.run(run_async_engine(ids_to_process, args, user_agent, writer.submit, limiter))
+            print(f"Connections opened: {pool.opened} ({pool.opened / max(1, writer.processed):.2f} per ID), reused: {pool.reused}, closed after </title>: {pool.closed_early}, redirects followed: {pool.redirects} | body bytes read: {pool.bytes_read}")
+        else:
+            # Bounded in-flight window: submission blocks until a slot frees up, so memory does not
+            # grow with the size of the ID range
+            window = threading.BoundedSemaphore(args.window or thread_count * 4)
+
+            def on_done(fut: "concurrent.futures.Future") -> None:
+                try:
+                    writer.submit(fut.result())
+                finally:
+                    window.release()
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=thread_count) as executor:
+                for item_id in ids_to_process:
+                    window.acquire()
+                    future = executor.submit(
+                        fetch_title_for_id,
+                        item_id,
+                        args.timeout,
+                        args.retries,
+                        0.2,  # backoff base seconds
+                        user_agent,
+                        args.base_url,
+                        limiter,
+                    )
+                    future.add_done_callback(on_done)
+                    if args.rate_delay > 0:
+                        time.sleep(args.rate_delay)
+    finally:
+        writer.close()
+        if bitmap is not None:
+            bitmap.close()
 
     # Stop progress logger and print final stats
     stop_event.set()
@@ -241,7 +884,7 @@ def main():
         logger_thread.join(timeout=1.0)
 
     elapsed = time.time() - t_start
-    print(f"Done. Wrote names to {output_path}. Took {elapsed/60:.1f} minutes. Saved {saved_counter} names.")
+    print(f"Done. Wrote names to {output_path}. Took {elapsed/60:.1f} minutes. Saved {writer.saved} names.")
 
 
 if __name__ == "__main__":
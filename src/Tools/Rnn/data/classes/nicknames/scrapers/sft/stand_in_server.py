@@ -0,0 +1,100 @@
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the itnetwork portfolio pages, for testing scrape_sft.py")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--page-bytes", type=int, default=60000, help="Filler bytes after </title>, to mimic full portfolio pages")
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds to wait before answering")
+    parser.add_argument("--missing-every", type=int, default=7, help="Every Nth ID serves the 'page moved' title (0 disables)")
+    parser.add_argument("--redirect-every", type=int, default=0, help="Every Nth ID answers 301 to the same path with a trailing slash (0 disables)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--max-rps", type=float, default=0.0, help="Answer 429 above this request rate (0 disables)")
+    args = parser.parse_args()
+
+    lock = threading.Lock()
+    stats = {"requests": 0, "connections": 0, "throttled": 0, "errors": 0}
+    window = {"start": time.time(), "count": 0}
+    filler = ("<p>" + "x" * 96 + "</p>\n") * max(1, args.page_bytes // 104)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, Nagle + delayed ACK add ~40 ms
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with lock:
+                stats["connections"] += 1
+
+        def log_message(self, format, *args_):  # noqa: A002
+            pass
+
+        def send_page(self, status, title, body_extra=""):
+            body = f"<html><head><meta charset=\"utf-8\"><title>\n  {title}\n</title></head><body>{body_extra}</body></html>".encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/__stats":
+                with lock:
+                    self.send_page(200, " ".join(f"{k}={v}" for k, v in stats.items()))
+                return
+            time.sleep(args.latency)
+            with lock:
+                stats["requests"] += 1
+                now = time.time()
+                if now - window["start"] >= 1.0:
+                    window["start"], window["count"] = now, 0
+                window["count"] += 1
+                throttled = args.max_rps > 0 and window["count"] > args.max_rps
+                failed = not throttled and random.random() < args.error_rate
+                stats["throttled"] += throttled
+                stats["errors"] += failed
+            if throttled:
+                self.send_page(429, "Too Many Requests")
+                return
+            if failed:
+                body = b"Service Unavailable"
+                self.send_response(503)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            try:
+                item_id = int(self.path.rstrip("/").rsplit("/", 1)[-1])
+            except ValueError:
+                self.send_page(404, "Not Found")
+                return
+            if args.redirect_every and item_id % args.redirect_every == 0 and not self.path.endswith("/"):
+                self.send_response(301)
+                self.send_header("Location", f"{self.path}/")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if args.missing_every and item_id % args.missing_every == 0:
+                self.send_page(404, "Stránka, na kterou se odkazujete, byla pravděpodobně přesunuta")
+                return
+            self.send_page(200, f"User {item_id}", filler)
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"Stand-in portfolio server on http://{args.host}:{args.port}/portfolio/ (stats at /__stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Stats: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,108 +1,474 @@
+import argparse
+import array
+import bisect
 import csv
+import hashlib
+import io
+import multiprocessing
 import os
+import shutil
+import struct
 import sys
-import hashlib
 import tempfile
 
 
-def main() -> int:
-	# Source CSV and output files live in this directory
-	base_dir = os.path.dirname(os.path.abspath(__file__))
-	csv_path = os.path.join(base_dir, "res_data.csv")
-	companies_out_path = os.path.join(base_dir, "companies.txt")
-	names_out_path = os.path.join(base_dir, "names.txt")
+# Codes marking physical persons (FO)
+# We will consider FO if EITHER ROSFORMA OR FORMA matches a known FO code.
+# User-provided set extended with ROSFORMA=100 (generic FO in registr osob).
+FO_CODES = {"100", "101", "105", "107", "424", "425"}
+
+NUM_BUCKETS = 128  # total bucket files per output
+SCAN_BLOCK = 1 << 20  # bytes read at a time when counting quotes / looking for a record boundary
+BUCKET_KINDS = ("names", "companies")
+INDEX_MAGIC = b"RESIDX02"
+INDEX_HEADER = struct.Struct("<8sQQQQ16s16s")  # magic, ICO count, key count, names.txt size, companies.txt size, their digests
 
-	# Codes marking physical persons (FO)
-	# We will consider FO if EITHER ROSFORMA OR FORMA matches a known FO code.
-	# User-provided set extended with ROSFORMA=100 (generic FO in registr osob).
-	fo_codes = {"100", "101", "105", "107", "424", "425"}
 
+def count_quotes(task) -> int:
+	csv_path, start, end = task
+	count = 0
+	with open(csv_path, "rb") as f:
+		f.seek(start)
+		remaining = end - start
+		while remaining > 0:
+			block = f.read(min(SCAN_BLOCK, remaining))
+			if not block:
+				break
+			count += block.count(b'"')
+			remaining -= len(block)
+	return count
+
+
+def record_boundary(f, offset: int, quotes_before: int, file_size: int) -> int:
+	"""
+	First record start after `offset`: one past the first newline at or after `offset` that is
+	outside a quoted field. A newline is outside quotes when the number of quote characters before
+	it is even, which holds for RFC 4180 quoting ("" escapes keep the parity).
+	"""
+	if offset <= 0:
+		return 0
+	if offset >= file_size:
+		return file_size
+	f.seek(offset)
+	base = offset
+	quotes = quotes_before
+	while True:
+		block = f.read(SCAN_BLOCK)
+		if not block:
+			return file_size
+		pos = 0
+		while True:
+			idx = block.find(b"\n", pos)
+			if idx == -1:
+				quotes += block.count(b'"', pos)
+				break
+			quotes += block.count(b'"', pos, idx)
+			if quotes % 2 == 0:
+				return base + idx + 1
+			pos = idx + 1
+		base += len(block)
+
+
+def iter_text_lines(f, start: int, end: int):
+	"""
+	Yields the lines of bytes [start, end) decoded the way open(..., errors="replace", newline="")
+	would produce them, so csv.reader sees exactly what it sees on the whole file. Blocks are cut
+	after a newline, which never splits a UTF-8 sequence or a \r\n pair.
+	"""
+	f.seek(start)
+	remaining = end - start
+	carry = b""
+	while remaining > 0 or carry:
+		block = f.read(min(SCAN_BLOCK, remaining)) if remaining > 0 else b""
+		remaining -= len(block)
+		block = carry + block
+		cut = block.rfind(b"\n") + 1 if remaining > 0 else len(block)
+		if cut == 0:
+			carry = block
+			continue
+		carry = block[cut:]
+		yield from io.StringIO(block[:cut].decode("utf-8", errors="replace"), newline="")
+
+
+def read_header(csv_path: str) -> list:
+	with open(csv_path, "r", encoding="utf-8", errors="replace", newline="") as f_in:
+		return next(csv.reader(f_in), [])
+
+
+def split_span(task):
+	"""
+	Parses one byte span of the CSV (aligned to record boundaries) and writes FIRMA values into
+	this worker's own name/company bucket files. Returns the number of rows read.
+	"""
+	csv_path, tmpdir, worker, span, quotes, file_size, columns = task
+	rosforma_idx, forma_idx, firma_idx = columns
+	fo_codes = FO_CODES
+	num_buckets = NUM_BUCKETS
 	row_count = 0
-	companies_unique = 0
-	names_unique = 0
-
-	# Use hashing buckets to deduplicate without loading everything into memory
-	num_buckets = 128  # total bucket files per output
-	with tempfile.TemporaryDirectory(dir=base_dir, prefix="split_tmp_") as tmpdir:
-		name_bucket_paths = [os.path.join(tmpdir, f"names_{i:03d}.tmp") for i in range(num_buckets)]
-		company_bucket_paths = [os.path.join(tmpdir, f"companies_{i:03d}.tmp") for i in range(num_buckets)]
-
-		# Open all bucket files once to avoid frequent open/close
-		name_bucket_files = [open(p, "w", encoding="utf-8", newline="\n") for p in name_bucket_paths]
-		company_bucket_files = [open(p, "w", encoding="utf-8", newline="\n") for p in company_bucket_paths]
-
-	# Stream read the large CSV and write outputs line-by-line
-	# Use utf-8 with robust error handling; CSV appears to be comma-delimited with quoted fields
-		with open(csv_path, "r", encoding="utf-8", errors="replace", newline="") as f_in:
-			reader = csv.DictReader(f_in)
-
-			# Validate required columns exist
-			required_columns = {"ROSFORMA", "FIRMA"}
-			missing = [c for c in required_columns if c not in reader.fieldnames]
-			if missing:
-				print(f"ERROR: Missing required columns in CSV: {missing}", file=sys.stderr)
-				return 2
 
+	name_bucket_files = [open(bucket_path(tmpdir, "names", worker, i), "w", encoding="utf-8", newline="\n") for i in range(num_buckets)]
+	company_bucket_files = [open(bucket_path(tmpdir, "companies", worker, i), "w", encoding="utf-8", newline="\n") for i in range(num_buckets)]
+	try:
+		with open(csv_path, "rb") as f_in:
+			start = record_boundary(f_in, span[0], quotes[0], file_size)
+			end = record_boundary(f_in, span[1], quotes[1], file_size)
+			if start >= end:
+				return 0
+			reader = csv.reader(iter_text_lines(f_in, start, end))
+			if start == 0:
+				next(reader, None)  # header
 			for row in reader:
+				if not row:
+					continue  # DictReader skips blank rows
 				row_count += 1
+				n = len(row)
 
-				rosforma = (row.get("ROSFORMA") or "").strip()
-				forma = (row.get("FORMA") or "").strip()
-				firma = (row.get("FIRMA") or "").strip()
-
+				firma = row[firma_idx].strip() if firma_idx < n else ""
 				if not firma:
 					continue
+				rosforma = row[rosforma_idx].strip() if rosforma_idx < n else ""
+				forma = row[forma_idx].strip() if forma_idx is not None and forma_idx < n else ""
 
 				# Classify: FO if either ROSFORMA or FORMA matches a known FO code
 				is_fo = (rosforma in fo_codes) or (forma in fo_codes)
 
-				# Hash-bucketize for later per-bucket dedup
-				# Use stable hash (blake2b) on the normalized line content
-				line = firma
-				digest = hashlib.blake2b(line.encode("utf-8"), digest_size=2).hexdigest()
-				bucket_idx = int(digest, 16) % num_buckets
+				# Stable hash (blake2b) of the line, same bucket as int(hexdigest, 16) % num_buckets
+				digest = hashlib.blake2b(firma.encode("utf-8"), digest_size=2).digest()
+				bucket_idx = int.from_bytes(digest, "big") % num_buckets
 				if is_fo:
-					name_bucket_files[bucket_idx].write(line + "\n")
+					name_bucket_files[bucket_idx].write(firma + "\n")
 				else:
-					company_bucket_files[bucket_idx].write(line + "\n")
-
-		# Close all bucket files before dedup pass
-		for fh in name_bucket_files:
-			fh.close()
-		for fh in company_bucket_files:
+					company_bucket_files[bucket_idx].write(firma + "\n")
+	finally:
+		for fh in name_bucket_files + company_bucket_files:
 			fh.close()
+	return row_count
+
+
+def bucket_path(tmpdir: str, kind: str, worker: int, bucket: int) -> str:
+	return os.path.join(tmpdir, f"{kind}_{bucket:03d}_{worker:03d}.tmp")
+
+
+def dedup_path(tmpdir: str, kind: str, bucket: int) -> str:
+	return os.path.join(tmpdir, f"{kind}_{bucket:03d}.dedup")
+
+
+def dedup_bucket(task) -> int:
+	"""
+	Reads one bucket from every worker in span order, keeps the first occurrence of each value and
+	writes the result to the bucket's .dedup file. Returns the number of unique values.
+	"""
+	tmpdir, kind, bucket, workers = task
+	unique = 0
+	seen = set()
+	with open(dedup_path(tmpdir, kind, bucket), "w", encoding="utf-8", newline="\n") as f_out:
+		for worker in range(workers):
+			with open(bucket_path(tmpdir, kind, worker, bucket), "r", encoding="utf-8", errors="replace") as fb:
+				for line in fb:
+					val = line.rstrip("\n")
+					if not val:
+						continue
+					if val in seen:
+						continue
+					seen.add(val)
+					f_out.write(val + "\n")
+					unique += 1
+	return unique
+
+
+# --- Incremental mode ---
+# res_index.bin keeps, for every ICO seen in the last snapshot, the 63-bit hash of its FIRMA and its
+# class (1 = FO/names, 0 = PO/companies), sorted by ICO. A second sorted table keeps how many ICOs
+# share each (FIRMA hash, class) key, so a value leaves names.txt/companies.txt only when its last
+# ICO disappears. Both tables are flat arrays: 17 bytes per ICO plus 13 per distinct value. The
+# header also keeps the size and a digest of each output file as the index left it.
+
+def ico_key(ico: str) -> int:
+	if ico.isdigit():
+		return int(ico)
+	# Non-numeric identifiers (not expected in RES) get a hashed key above the numeric range
+	return int.from_bytes(hashlib.blake2b(ico.encode("utf-8"), digest_size=8).digest(), "big") | (1 << 63)
+
+
+def file_digest(path: str, size: int) -> bytes:
+	"""
+	blake2b-128 of the first `size` bytes of a file.
+	"""
+	digest = hashlib.blake2b(digest_size=16)
+	with open(path, "rb") as f:
+		remaining = size
+		while remaining > 0:
+			block = f.read(min(SCAN_BLOCK, remaining))
+			if not block:
+				break
+			digest.update(block)
+			remaining -= len(block)
+	return digest.digest()
+
+
+def firma_key(firma: str, is_fo: bool) -> int:
+	digest = hashlib.blake2b(firma.encode("utf-8"), digest_size=8).digest()
+	return (int.from_bytes(digest, "big") >> 1 << 1) | is_fo
+
+
+class ResIndex:
+	def __init__(self):
+		self.icos = array.array("Q")
+		self.firma_keys = array.array("Q")
+		self.key_values = array.array("Q")
+		self.key_counts = array.array("I")
+		self.sizes = {"names": 0, "companies": 0}
+		self.digests = {"names": file_digest(os.devnull, 0), "companies": file_digest(os.devnull, 0)}
 
-		# Deduplicate per bucket and write final outputs
-		with open(names_out_path, "w", encoding="utf-8", newline="\n") as f_names, \
-			 open(companies_out_path, "w", encoding="utf-8", newline="\n") as f_companies:
-			# Names (FO)
-			for p in name_bucket_paths:
-				seen = set()
-				with open(p, "r", encoding="utf-8", errors="replace") as fb:
-					for line in fb:
-						val = line.rstrip("\n")
-						if not val:
-							continue
-						if val in seen:
-							continue
-						seen.add(val)
-						f_names.write(val + "\n")
-						names_unique += 1
-
-			# Companies (PO)
-			for p in company_bucket_paths:
-				seen = set()
-				with open(p, "r", encoding="utf-8", errors="replace") as fb:
-					for line in fb:
-						val = line.rstrip("\n")
-						if not val:
-							continue
-						if val in seen:
-							continue
-						seen.add(val)
-						f_companies.write(val + "\n")
-						companies_unique += 1
+	@classmethod
+	def load(cls, path: str) -> "ResIndex":
+		index = cls()
+		with open(path, "rb") as f:
+			header = f.read(INDEX_HEADER.size)
+			if len(header) < INDEX_HEADER.size or header[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+				raise ValueError(f"{path} is not a RES index of this version")
+			magic, n_icos, n_keys, names_size, companies_size, names_digest, companies_digest = INDEX_HEADER.unpack(header)
+			index.icos.fromfile(f, n_icos)
+			index.firma_keys.fromfile(f, n_icos)
+			index.key_values.fromfile(f, n_keys)
+			index.key_counts.fromfile(f, n_keys)
+		index.sizes = {"names": names_size, "companies": companies_size}
+		index.digests = {"names": names_digest, "companies": companies_digest}
+		return index
 
+	def save(self, path: str) -> None:
+		tmp_path = path + ".tmp"
+		with open(tmp_path, "wb") as f:
+			f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self.icos), len(self.key_values), self.sizes["names"], self.sizes["companies"],
+									  self.digests["names"], self.digests["companies"]))
+			for arr in (self.icos, self.firma_keys, self.key_values, self.key_counts):
+				arr.tofile(f)
+		os.replace(tmp_path, path)
+
+
+def splice(arr: array.array, removed: list, inserted: list) -> array.array:
+	"""
+	Copy of a sorted array without the positions in `removed` and with `inserted` (position, value)
+	pairs placed before those positions. Costs one slice copy per change, not a Python loop per item.
+	"""
+	# Insertions at the same position keep their given order
+	events = sorted([(pos, 1, 0, None) for pos in removed] + [(pos, 0, seq, value) for seq, (pos, value) in enumerate(inserted)])
+	out = array.array(arr.typecode)
+	prev = 0
+	for pos, is_removal, _, value in events:
+		out.extend(arr[prev:pos])
+		prev = pos
+		if is_removal:
+			prev = pos + 1
+		else:
+			out.append(value)
+	out.extend(arr[prev:])
+	return out
+
+
+def remove_lines(path: str, removed_keys: set, is_fo: bool) -> None:
+	tmp_path = path + ".tmp"
+	with open(path, "r", encoding="utf-8", errors="replace", newline="\n") as f_in, \
+		 open(tmp_path, "w", encoding="utf-8", newline="\n") as f_out:
+		for line in f_in:
+			if firma_key(line.rstrip("\n"), is_fo) not in removed_keys:
+				f_out.write(line)
+	os.replace(tmp_path, path)
+
+
+def run_incremental(csv_path: str, header: list, out_paths: dict, index_path: str, rebuild: bool) -> int:
+	"""
+	Applies one RES snapshot to the outputs of the previous one: the CSV is still parsed in full,
+	but only ICOs that are new, changed or gone touch the index and the output files. Values are
+	appended as they first appear; values whose last ICO is gone are removed in one rewrite.
+	"""
+	if "ICO" not in header:
+		print("ERROR: Missing required columns in CSV: ['ICO']", file=sys.stderr)
+		return 2
+	columns = {name: i for i, name in enumerate(header)}
+	ico_idx, rosforma_idx, forma_idx, firma_idx = columns["ICO"], columns["ROSFORMA"], columns.get("FORMA"), columns["FIRMA"]
+	fo_codes = FO_CODES
+
+	if os.path.exists(index_path) and not rebuild:
+		try:
+			index = ResIndex.load(index_path)
+		except ValueError as e:
+			print(f"ERROR: {e}; rerun with --rebuild", file=sys.stderr)
+			return 2
+		for kind, path in out_paths.items():
+			size = os.path.getsize(path) if os.path.exists(path) else -1
+			# The file must still start with exactly what the index recorded; anything else (such as
+			# a full-mode rewrite) cannot be repaired by truncation
+			if size < index.sizes[kind] or file_digest(path, index.sizes[kind]) != index.digests[kind]:
+				print(f"ERROR: {path} no longer matches {os.path.basename(index_path)}; rerun with --rebuild", file=sys.stderr)
+				return 2
+			if size > index.sizes[kind]:
+				# Left over from an interrupted append
+				with open(path, "r+b") as f:
+					f.truncate(index.sizes[kind])
+	else:
+		index = ResIndex()
+		for path in out_paths.values():
+			open(path, "w").close()
+	icos, firma_keys = index.icos, index.firma_keys
+	n = len(icos)
+
+	row_count = 0
+	seen = bytearray(n)
+	changes = {}  # ICO key -> (firma key, firma) for new or changed ICOs
+	file_size = os.path.getsize(csv_path)
+	with open(csv_path, "rb") as f_in:
+		reader = csv.reader(iter_text_lines(f_in, 0, file_size))
+		next(reader, None)  # header
+		for row in reader:
+			if not row:
+				continue
+			row_count += 1
+			width = len(row)
+			firma = row[firma_idx].strip() if firma_idx < width else ""
+			ico = row[ico_idx].strip() if ico_idx < width else ""
+			if not firma or not ico:
+				continue
+			# One output line per value, even if FIRMA contains a line break
+			firma = " ".join(firma.splitlines())
+			rosforma = row[rosforma_idx].strip() if rosforma_idx < width else ""
+			forma = row[forma_idx].strip() if forma_idx is not None and forma_idx < width else ""
+			key = firma_key(firma, (rosforma in fo_codes) or (forma in fo_codes))
+
+			k = ico_key(ico)
+			i = bisect.bisect_left(icos, k)
+			if i < n and icos[i] == k:
+				seen[i] = 1
+				if firma_keys[i] == key:
+					if changes:
+						changes.pop(k, None)
+					continue
+			changes[k] = (key, firma)
+
+	# Per-key reference count deltas
+	deltas = {}
+	values = {}
+	removed_icos = []
+	pos = seen.find(0)
+	while pos != -1:
+		removed_icos.append(pos)
+		deltas[firma_keys[pos]] = deltas.get(firma_keys[pos], 0) - 1
+		pos = seen.find(0, pos + 1)
+	inserted_icos = []
+	for k, (key, firma) in changes.items():
+		i = bisect.bisect_left(icos, k)
+		if i < n and icos[i] == k:
+			deltas[firma_keys[i]] = deltas.get(firma_keys[i], 0) - 1
+			firma_keys[i] = key
+		else:
+			inserted_icos.append((i, k, key))
+		deltas[key] = deltas.get(key, 0) + 1
+		values.setdefault(key, firma)
+
+	key_values, key_counts = index.key_values, index.key_counts
+	appended = {"names": [], "companies": []}
+	removed = {"names": set(), "companies": set()}
+	removed_keys, inserted_keys = [], []
+	for key, delta in deltas.items():
+		if delta == 0:
+			continue
+		kind = "names" if key & 1 else "companies"
+		i = bisect.bisect_left(key_values, key)
+		exists = i < len(key_values) and key_values[i] == key
+		old = key_counts[i] if exists else 0
+		new = old + delta
+		if exists and new > 0:
+			key_counts[i] = new
+		elif exists:
+			removed_keys.append(i)
+			removed[kind].add(key)
+		else:
+			inserted_keys.append((i, key, new))
+			appended[kind].append(values[key])
+
+	inserted_icos.sort()
+	index.icos = splice(icos, removed_icos, [(i, k) for i, k, _ in inserted_icos])
+	index.firma_keys = splice(firma_keys, removed_icos, [(i, key) for i, _, key in inserted_icos])
+	inserted_keys.sort()
+	index.key_values = splice(key_values, removed_keys, [(i, key) for i, key, _ in inserted_keys])
+	index.key_counts = splice(key_counts, removed_keys, [(i, count) for i, _, count in inserted_keys])
+
+	for kind, path in out_paths.items():
+		if removed[kind]:
+			remove_lines(path, removed[kind], kind == "names")
+		if appended[kind]:
+			with open(path, "a", encoding="utf-8", newline="\n") as f_out:
+				f_out.write("".join(value + "\n" for value in appended[kind]))
+		index.sizes[kind] = os.path.getsize(path)
+		index.digests[kind] = file_digest(path, index.sizes[kind])
+	index.save(index_path)
+
+	print(f"Done. Rows read: {row_count}. ICOs -> new: {len(inserted_icos)}, changed: {len(changes) - len(inserted_icos)}, "
+		  f"gone: {len(removed_icos)}, indexed: {len(index.icos)}", file=sys.stderr)
+	print(f"companies: +{len(appended['companies'])} -{len(removed['companies'])} | names: +{len(appended['names'])} -{len(removed['names'])}", file=sys.stderr)
+	for kind, path in out_paths.items():
+		print(f"{kind}.txt -> {os.path.relpath(path)}")
+	return 0
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description="Split res_data.csv into deduplicated names.txt (FO) and companies.txt (PO)")
+	parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Worker processes for parsing and dedup")
+	parser.add_argument("--incremental", action="store_true", help="Apply this snapshot to the previous outputs using res_index.bin (keyed by ICO)")
+	parser.add_argument("--rebuild", action="store_true", help="With --incremental: ignore the existing index and start from empty outputs")
+	args = parser.parse_args()
+
+	# Source CSV and output files live in this directory
+	base_dir = os.path.dirname(os.path.abspath(__file__))
+	csv_path = os.path.join(base_dir, "res_data.csv")
+	companies_out_path = os.path.join(base_dir, "companies.txt")
+	names_out_path = os.path.join(base_dir, "names.txt")
+	index_path = os.path.join(base_dir, "res_index.bin")
+
+	# Validate required columns exist; columns are then read by index (last one wins, like DictReader)
+	header = read_header(csv_path)
+	required_columns = {"ROSFORMA", "FIRMA"}
+	missing = [c for c in required_columns if c not in header]
+	if missing:
+		print(f"ERROR: Missing required columns in CSV: {missing}", file=sys.stderr)
+		return 2
+	if args.incremental:
+		return run_incremental(csv_path, header, {"names": names_out_path, "companies": companies_out_path}, index_path, args.rebuild)
+	index = {name: i for i, name in enumerate(header)}
+	columns = (index["ROSFORMA"], index.get("FORMA"), index["FIRMA"])
+
+	# Nominal byte spans, one per worker; each worker moves both ends to the next record boundary.
+	# Quote counts per span give the quote parity at every span start.
+	jobs = max(1, args.jobs)
+	file_size = os.path.getsize(csv_path)
+	offsets = [file_size * i // jobs for i in range(jobs + 1)]
+	spans = list(zip(offsets[:-1], offsets[1:]))
+
+	with tempfile.TemporaryDirectory(dir=base_dir, prefix="split_tmp_") as tmpdir, \
+		 multiprocessing.Pool(jobs) as pool:
+		span_quotes = pool.map(count_quotes, [(csv_path, start, end) for start, end in spans]) if jobs > 1 else [0]
+		quotes_before = [sum(span_quotes[:i]) for i in range(jobs + 1)]
+
+		# Stream the spans in parallel into per-worker hash buckets
+		tasks = [(csv_path, tmpdir, w, spans[w], (quotes_before[w], quotes_before[w + 1]), file_size, columns) for w in range(jobs)]
+		row_count = sum(pool.map(split_span, tasks))
+
+		# Deduplicate buckets in parallel, then concatenate them in bucket order
+		dedup_tasks = [(tmpdir, kind, b, jobs) for kind in BUCKET_KINDS for b in range(NUM_BUCKETS)]
+		counts = pool.map(dedup_bucket, dedup_tasks)
+		names_unique = sum(counts[:NUM_BUCKETS])
+		companies_unique = sum(counts[NUM_BUCKETS:])
+
+		for kind, out_path in (("names", names_out_path), ("companies", companies_out_path)):
+			with open(out_path, "wb") as f_out:
+				for b in range(NUM_BUCKETS):
+					with open(dedup_path(tmpdir, kind, b), "rb") as fb:
+						shutil.copyfileobj(fb, f_out)
+
+	if os.path.exists(index_path):
+		# It described the outputs that were just overwritten
+		os.remove(index_path)
+		print(f"Removed {os.path.basename(index_path)}; the next --incremental run starts from empty outputs", file=sys.stderr)
 	print(f"Done. Rows read: {row_count}. Unique -> companies: {companies_unique}, names: {names_unique}", file=sys.stderr)
 	print(f"companies.txt -> {os.path.relpath(companies_out_path)}")
 	print(f"names.txt -> {os.path.relpath(names_out_path)}")
@@ -111,5 +477,3 @@ def main() -> int:
 
 if __name__ == "__main__":
 	sys.exit(main())
-
-
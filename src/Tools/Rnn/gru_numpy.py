@@ -0,0 +1,308 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+from tokenizers import Tokenizer
+
+from classifier import CLASS_NAMES, is_pad_aware
+from instrumentation import peak_rss_mb
+
+# --- Configuration ---
+NPZ_MODEL_PATH = "name_classifier.npz"  # Generated from ONNX_MODEL_PATH (or by train.py), never committed
+ONNX_MODEL_PATH = "name_classifier.onnx"
+TOKENIZER_PATH = "custom-bpe-tokenizer.json"
+PARITY_DATA_FILE = "data/validate.csv"
+RESULTS_PATH = "gru_numpy_benchmark.json"
+MAX_LEN = 128           # Must match the training configuration
+MAX_BATCH_SIZE = 1024   # Rows per forward pass in predict_logits
+PARITY_ATOL = 1e-4      # Max |NumPy - ONNX| logit difference accepted by the check
+BENCH_BATCH_SIZES = [1, 32, 256]
+BENCH_CALLS = 200       # Timed calls per batch size in each benchmark process
+
+# Weights are stored in PyTorch nn.GRU layout: gate blocks ordered r, z, n, with b_hh applied
+# inside the reset gate (ONNX linear_before_reset=1)
+WEIGHT_NAMES = ["embedding", "w_ih", "w_hh", "b_ih", "b_hh", "fc_w", "fc_b"]
+
+def save_weights(path, weights, pad_token_id, pad_aware=True):
+    """
+    Writes the TinyClassifier weights (WEIGHT_NAMES, float32 arrays) and the pad id to an .npz.
+    pad_aware=False marks models exported before the GRU stopped at each row's last real token;
+    those read the hidden state after the full padded width.
+    """
+    arrays = {name: np.ascontiguousarray(weights[name], dtype=np.float32) for name in WEIGHT_NAMES}
+    np.savez_compressed(path, pad_token_id=np.int64(pad_token_id), pad_aware=np.bool_(pad_aware), **arrays)
+
+def state_dict_weights(state_dict):
+    """
+    WEIGHT_NAMES arrays from a TinyClassifier state_dict of tensors.
+    """
+    names = {"embedding": "embedding.weight", "w_ih": "gru.weight_ih_l0", "w_hh": "gru.weight_hh_l0",
+             "b_ih": "gru.bias_ih_l0", "b_hh": "gru.bias_hh_l0", "fc_w": "fc.weight", "fc_b": "fc.bias"}
+    return {name: state_dict[key].detach().cpu().numpy() for name, key in names.items()}
+
+def onnx_weights(onnx_path):
+    """
+    Reads the weights back out of an exported name_classifier.onnx. Exporters differ in whether
+    GRU weights are stored as initializers or computed by Slice/Concat nodes, so the GRU, Gather
+    and Gemm weight inputs are exposed as graph outputs and evaluated with onnxruntime.
+    ONNX orders GRU gate blocks z, r, h; they are reordered to r, z, n. Returns (weights,
+    pad_aware).
+    """
+    import onnx
+    import onnxruntime as ort
+
+    model = onnx.load(onnx_path)
+    gru = next(n for n in model.graph.node if n.op_type == "GRU")
+    gather = next(n for n in model.graph.node if n.op_type == "Gather" and n.input[1] == "input_ids")
+    gemm = next(n for n in model.graph.node if n.op_type == "Gemm")
+    linear_before_reset = next((a.i for a in gru.attribute if a.name == "linear_before_reset"), 0)
+    trans_b = next((a.i for a in gemm.attribute if a.name == "transB"), 0)
+    if linear_before_reset != 1 or trans_b != 1:
+        raise ValueError(f"{onnx_path}: expected a GRU with linear_before_reset=1 and a Gemm with transB=1")
+    wanted = {"embedding": gather.input[0], "w": gru.input[1], "r": gru.input[2], "b": gru.input[3],
+              "fc_w": gemm.input[1], "fc_b": gemm.input[2]}
+    del model.graph.output[:]
+    model.graph.output.extend(onnx.helper.make_tensor_value_info(name, onnx.TensorProto.FLOAT, None) for name in wanted.values())
+    session = ort.InferenceSession(model.SerializeToString(), providers=["CPUExecutionProvider"])
+    values = dict(zip(wanted, session.run(None, {"input_ids": np.ones((2, 4), dtype=np.int64)})))
+
+    pad_aware = is_pad_aware(model)
+    hidden = values["r"].shape[-1]
+    def zrh_to_rzn(matrix):
+        z, r, h = np.split(matrix, 3, axis=0)
+        return np.concatenate([r, z, h])
+    bias = values["b"].reshape(-1)
+    return {
+        "embedding": values["embedding"],
+        "w_ih": zrh_to_rzn(values["w"][0]),
+        "w_hh": zrh_to_rzn(values["r"][0]),
+        "b_ih": zrh_to_rzn(bias[:3 * hidden]),
+        "b_hh": zrh_to_rzn(bias[3 * hidden:]),
+        "fc_w": values["fc_w"],
+        "fc_b": values["fc_b"],
+    }, pad_aware
+
+class NumpyClassifier:
+    """
+    TinyClassifier inference in NumPy only, with the NameClassifier interface (predict_logits,
+    classify_batch, classify) minus the cache.
+
+    The embedding, GRU input projection and the r/z part of the recurrent bias are folded into
+    one [vocab, 3 * hidden] table at load time, gathered for all steps at once, so each step is
+    one [active, hidden] x [hidden, 3 * hidden] matmul plus elementwise gate math. Rows are sorted
+    by length and the batch shrinks as sequences end, which masks every row at its own length and
+    skips the padded steps entirely.
+    """
+    def __init__(self, npz_path=NPZ_MODEL_PATH, tokenizer_path=TOKENIZER_PATH, max_len=MAX_LEN, max_batch_size=MAX_BATCH_SIZE):
+        with np.load(npz_path) as weights:
+            embedding = weights["embedding"]
+            w_ih, b_ih = weights["w_ih"], weights["b_ih"]
+            self.w_hh_t = np.ascontiguousarray(weights["w_hh"].T)
+            b_hh = weights["b_hh"]
+            self.fc_w_t = np.ascontiguousarray(weights["fc_w"].T)
+            self.fc_b = weights["fc_b"]
+            self.pad_token_id = int(weights["pad_token_id"])
+            self.pad_aware = bool(weights["pad_aware"])
+        self.hidden_dim = H = self.w_hh_t.shape[0]
+        # b_hh of r and z adds straight onto the input side; b_hn is scaled by r, so it stays apart
+        self.input_table = (embedding @ w_ih.T + b_ih + np.concatenate([b_hh[:2 * H], np.zeros(H, b_hh.dtype)])).astype(np.float32)
+        self.b_hn = b_hh[2 * H:]
+        self.tokenizer = Tokenizer.from_file(tokenizer_path) if tokenizer_path else None
+        self.max_len = max_len
+        self.max_batch_size = max_batch_size
+
+    def forward(self, input_ids, lengths=None):
+        """
+        Logits for a right-padded [batch, seq] id matrix. Without lengths, a row's length is its
+        count of non-pad ids (at least 1), as in the exported ONNX graph; models that are not
+        pad_aware always run the full width.
+        """
+        input_ids = np.asarray(input_ids)
+        if not self.pad_aware:
+            lengths = np.full(len(input_ids), input_ids.shape[1], dtype=np.int64)
+        elif lengths is None:
+            lengths = np.maximum((input_ids != self.pad_token_id).sum(axis=1), 1)
+        H = self.hidden_dim
+        order = np.argsort(-lengths, kind="stable")
+        ids = input_ids[order]
+        # active[t]: rows still running at step t (a prefix, since rows are sorted longest first)
+        active = np.searchsorted(-lengths[order], -np.arange(int(lengths.max(initial=0))), side="left")
+        # [steps, batch, 3 * hidden]: step t of the active rows is the contiguous block gates[t, :n]
+        gates = self.input_table[ids[:, :len(active)].T]
+        h = np.zeros((len(ids), H), dtype=np.float32)
+        for t, n in enumerate(active):
+            h_prev = h[:n]
+            gi = gates[t, :n]
+            gh = h_prev @ self.w_hh_t
+            # r and z together; sigmoid(x) = 0.5 * (1 + tanh(x / 2)) never overflows
+            rz = gi[:, :2 * H] + gh[:, :2 * H]
+            rz *= 0.5
+            np.tanh(rz, out=rz)
+            rz += 1.0
+            rz *= 0.5
+            candidate = gh[:, 2 * H:] + self.b_hn
+            candidate *= rz[:, :H]
+            candidate += gi[:, 2 * H:]
+            np.tanh(candidate, out=candidate)
+            # h = (1 - z) * n + z * h_prev
+            h_prev -= candidate
+            h_prev *= rz[:, H:]
+            h_prev += candidate
+        logits = np.empty((len(ids), self.fc_b.shape[0]), dtype=np.float32)
+        logits[order] = h @ self.fc_w_t + self.fc_b
+        return logits
+
+    def predict_logits(self, texts):
+        """
+        Returns the raw [len(texts), classes] logits matrix. Models that are not pad_aware get every
+        row padded to max_len, as NameClassifier does, so a row never depends on its batch.
+        """
+        outputs = []
+        for start in range(0, len(texts), self.max_batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + self.max_batch_size])
+            lengths = np.fromiter((max(1, min(len(e.ids), self.max_len)) for e in encodings), dtype=np.int64, count=len(encodings))
+            width = int(lengths.max()) if self.pad_aware else self.max_len
+            input_ids = np.full((len(encodings), width), self.pad_token_id, dtype=np.int64)
+            for row, (encoding, length) in enumerate(zip(encodings, lengths)):
+                ids = encoding.ids[:length]  # Empty texts keep the single pad step
+                input_ids[row, :len(ids)] = ids
+            outputs.append(self.forward(input_ids, lengths))
+        if not outputs:
+            return np.zeros((0, len(CLASS_NAMES)), dtype=np.float32)
+        return np.concatenate(outputs)
+
+    def classify_batch(self, texts):
+        """
+        Returns the predicted class index for every text, in order.
+        """
+        return self.predict_logits(texts).argmax(axis=1).tolist()
+
+    def classify(self, text):
+        return self.classify_batch([text])[0]
+
+def read_texts(path):
+    import csv
+    with open(path, encoding="utf-8", newline="") as f:
+        return [row["text"] for row in csv.DictReader(f)]
+
+def ensure_npz(args):
+    """
+    Converts args.onnx when args.npz is missing or older, so the NumPy weights always come from
+    the ONNX model they are compared with.
+    """
+    if not os.path.exists(args.npz) or os.path.getmtime(args.npz) < os.path.getmtime(args.onnx):
+        convert(args)
+
+def convert(args):
+    print(f"--- Converting {args.onnx} to {args.npz} ---")
+    weights, pad_aware = onnx_weights(args.onnx)
+    pad_token_id = Tokenizer.from_file(TOKENIZER_PATH).token_to_id("[PAD]")
+    save_weights(args.npz, weights, pad_token_id, pad_aware)
+    print(f"Saved {args.npz} ({os.path.getsize(args.npz) / 1024:.1f} KB) | embedding {list(weights['embedding'].shape)} | "
+          f"hidden {weights['w_hh'].shape[1]}" + ("" if pad_aware else " | legacy graph: GRU runs over padding"))
+
+def check(args):
+    """
+    Parity against the ONNX model: real texts tokenized once, run through both engines with
+    dynamic padding, compared logit by logit.
+    """
+    from classifier import NameClassifier
+
+    ensure_npz(args)
+    print(f"--- Parity check: {args.npz} vs {args.onnx} on {args.data} ---")
+    texts = read_texts(args.data)
+    onnx_classifier = NameClassifier(args.onnx, TOKENIZER_PATH, MAX_LEN)
+    numpy_classifier = NumpyClassifier(args.npz, TOKENIZER_PATH, MAX_LEN)
+    onnx_logits = onnx_classifier.predict_logits(texts)
+    numpy_logits = numpy_classifier.predict_logits(texts)
+    # Fixed-width padding exercises the length masking on rows much shorter than the batch
+    padded = np.full((len(texts), MAX_LEN), numpy_classifier.pad_token_id, dtype=np.int64)
+    for row, e in enumerate(numpy_classifier.tokenizer.encode_batch(texts)):
+        padded[row, :min(len(e.ids), MAX_LEN)] = e.ids[:MAX_LEN]
+    padded_onnx = onnx_classifier.session.run(None, {onnx_classifier.input_name: padded})[0]
+    padded_diff = float(np.abs(padded_onnx - numpy_classifier.forward(padded)).max(initial=0.0))
+
+    max_diff = float(np.abs(onnx_logits - numpy_logits).max(initial=0.0))
+    agreement = float((onnx_logits.argmax(axis=1) == numpy_logits.argmax(axis=1)).mean()) if len(texts) else 1.0
+    print(f"Rows: {len(texts)} | max |logit diff| {max_diff:.2e} (padded to {MAX_LEN}: {padded_diff:.2e}) | argmax agreement {agreement:.4%}")
+    if max(max_diff, padded_diff) > args.atol:
+        print(f"FAILED: difference above {args.atol:.0e}")
+        sys.exit(1)
+    print("--- Parity check passed ---")
+
+def probe(args):
+    """
+    One benchmark process: imports the engine, loads the model and times batches, then prints a
+    JSON line. Startup is measured from interpreter start, so it includes the imports.
+    """
+    rng = np.random.default_rng(0)
+    texts = read_texts(args.data)
+    if args.engine == "numpy":
+        classifier = NumpyClassifier(args.npz, TOKENIZER_PATH, MAX_LEN)
+    else:
+        from classifier import NameClassifier
+        classifier = NameClassifier(args.onnx, TOKENIZER_PATH, MAX_LEN, intra_op_num_threads=1)
+    classifier.predict_logits(texts[:1])
+    startup = time.time() - args.t0
+    result = {"engine": args.engine, "startup_s": startup, "latency_us": {}}
+    for batch_size in BENCH_BATCH_SIZES:
+        batches = [[texts[i] for i in rng.integers(0, len(texts), batch_size)] for _ in range(16)]
+        for batch in batches[:4]:
+            classifier.predict_logits(batch)
+        timings = []
+        for i in range(BENCH_CALLS):
+            t0 = time.perf_counter()
+            classifier.predict_logits(batches[i % len(batches)])
+            timings.append(time.perf_counter() - t0)
+        result["latency_us"][batch_size] = {"p50": float(np.percentile(timings, 50) * 1e6), "p95": float(np.percentile(timings, 95) * 1e6)}
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+def benchmark(args):
+    """
+    Runs probe in fresh processes for the NumPy engine and onnxruntime (one intra-op thread each,
+    tokenization included) and compares startup, per-batch latency and peak RSS.
+    """
+    ensure_npz(args)
+    print("--- NumPy GRU vs onnxruntime benchmark ---")
+    results = []
+    for engine in ("numpy", "onnx"):
+        runs = []
+        for _ in range(args.repeats):
+            command = [sys.executable, os.path.abspath(__file__), "probe", "--engine", engine, "--npz", args.npz,
+                       "--onnx", args.onnx, "--data", args.data, "--t0", repr(time.time())]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        best = min(runs, key=lambda r: r["startup_s"])
+        best["startup_s_runs"] = [r["startup_s"] for r in runs]
+        results.append(best)
+
+    print(f"{'engine':<8} {'startup s':>10} {'peak RSS MB':>12} " + " ".join(f"{f'p50 us @{b}':>12}" for b in BENCH_BATCH_SIZES))
+    for r in results:
+        rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "n/a"
+        print(f"{r['engine']:<8} {r['startup_s']:>10.3f} {rss:>12} " +
+              " ".join(f"{r['latency_us'][str(b)]['p50']:>12.1f}" for b in BENCH_BATCH_SIZES))
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"batch_sizes": BENCH_BATCH_SIZES, "calls": BENCH_CALLS, "results": results}, f, indent=2)
+    print(f"Results saved to {args.out}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Pure-NumPy TinyClassifier inference: ONNX to .npz conversion, parity check and benchmark")
+    parser.add_argument("command", choices=["convert", "check", "benchmark", "probe"])
+    parser.add_argument("--npz", default=NPZ_MODEL_PATH)
+    parser.add_argument("--onnx", default=ONNX_MODEL_PATH)
+    parser.add_argument("--data", default=PARITY_DATA_FILE, help="CSV with a text column for check/benchmark")
+    parser.add_argument("--atol", type=float, default=PARITY_ATOL)
+    parser.add_argument("--repeats", type=int, default=3, help="Benchmark processes per engine (best startup kept)")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    parser.add_argument("--engine", choices=["numpy", "onnx"], help=argparse.SUPPRESS)
+    parser.add_argument("--t0", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    {"convert": convert, "check": check, "benchmark": benchmark, "probe": probe}[args.command](args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+import time
+
+# torch is imported where it is used, so the NumPy-only tools can share peak_rss_mb() without it
+try:
+    import resource  # Peak RSS reporting; not available on Windows
+except ImportError:
+    resource = None
+
+# --- Configuration ---
+PHASES = ["data", "forward", "backward", "optimizer"]
+PROFILE_DIR = "profiles"
+PROFILE_TABLE_ROWS = 15
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or None where the resource module is missing.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+class StepMetrics:
+    """
+    Per-step training telemetry as JSON lines: wall time of each phase (data loading including
+    collate/padding, forward, backward, optimizer step), samples/s, real and padded tokens and
+    peak RSS, plus one summary record per epoch. With no path every call is a no-op.
+
+    Usage per step: lap("data") when the batch arrives, lap() after each later phase, then
+    end_step(); the time between end_step() and the next lap("data") is the data phase.
+    """
+    def __init__(self, path, rank=0, cuda_sync=False):
+        self.enabled = path is not None
+        self.rank = rank
+        self.cuda_sync = cuda_sync
+        self.file = None
+        if self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.file = open(path, "w", encoding="utf-8")
+        self.mark = time.perf_counter()
+        self.step_times = {}
+        self.epoch_totals = None
+
+    def start_epoch(self):
+        if not self.enabled:
+            return
+        self.epoch_totals = {"steps": 0, "samples": 0, "tokens": 0, "padded_tokens": 0, **{p: 0.0 for p in PHASES}}
+        self.mark = time.perf_counter()
+
+    def lap(self, phase):
+        if not self.enabled:
+            return
+        if self.cuda_sync:
+            import torch
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        self.step_times[phase] = now - self.mark
+        self.mark = now
+
+    def end_step(self, epoch, step, samples, tokens, padded_tokens, loss):
+        if not self.enabled:
+            return
+        step_time = sum(self.step_times.values())
+        record = {
+            "type": "step",
+            "rank": self.rank,
+            "epoch": epoch,
+            "step": step,
+            "time_s": {p: round(t, 6) for p, t in self.step_times.items()},
+            "samples": samples,
+            "tokens": tokens,
+            "padded_tokens": padded_tokens,
+            "samples_per_s": samples / step_time if step_time else None,
+            "tokens_per_s": tokens / step_time if step_time else None,
+            "loss": loss,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        self.file.write(json.dumps(record) + "\n")
+        totals = self.epoch_totals
+        totals["steps"] += 1
+        totals["samples"] += samples
+        totals["tokens"] += tokens
+        totals["padded_tokens"] += padded_tokens
+        for p, t in self.step_times.items():
+            totals[p] += t
+        self.step_times = {}
+        self.mark = time.perf_counter()
+
+    def end_epoch(self, epoch, **values):
+        """
+        Writes the epoch summary and returns the share of step time per phase, or None.
+        """
+        if not self.enabled:
+            return None
+        totals = self.epoch_totals
+        step_time = sum(totals[p] for p in PHASES)
+        shares = {p: totals[p] / step_time if step_time else 0.0 for p in PHASES}
+        record = {
+            "type": "epoch",
+            "rank": self.rank,
+            "epoch": epoch,
+            "steps": totals["steps"],
+            "time_s": {p: round(totals[p], 4) for p in PHASES},
+            "phase_share": {p: round(v, 4) for p, v in shares.items()},
+            "samples_per_s": totals["samples"] / step_time if step_time else None,
+            "tokens_per_s": totals["tokens"] / step_time if step_time else None,
+            "padding_efficiency": totals["tokens"] / totals["padded_tokens"] if totals["padded_tokens"] else None,
+            "peak_rss_mb": peak_rss_mb(),
+            **values,
+        }
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        return shares
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+class ProfilerWindow:
+    """
+    Runs torch.profiler over global steps [first, last] (inclusive), then writes a Chrome trace
+    to PROFILE_DIR and prints the top operators by self CPU time. Inactive when first is None.
+    close() ends a window that training stopped inside of at the last step that ran.
+    """
+    def __init__(self, first=None, last=None, rank=0, out_dir=PROFILE_DIR):
+        self.first = first
+        self.last = last if last is not None else first
+        self.rank = rank
+        self.out_dir = out_dir
+        self.profiler = None
+        self.last_run = None
+
+    @classmethod
+    def parse(cls, spec, rank=0):
+        """
+        "START:END" or "STEP"; None disables.
+        """
+        if not spec:
+            return cls(rank=rank)
+        first, _, last = spec.partition(":")
+        return cls(int(first), int(last) if last else None, rank)
+
+    def before_step(self, step):
+        if self.first is not None and step == self.first and self.profiler is None:
+            import torch
+            from torch.profiler import ProfilerActivity, profile
+            activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if torch.cuda.is_available() else [])
+            self.profiler = profile(activities=activities, record_shapes=True, profile_memory=True)
+            self.profiler.__enter__()
+
+    def after_step(self, step):
+        if self.profiler is None:
+            return
+        self.last_run = step
+        if step >= self.last:
+            self._finish(step)
+
+    def close(self):
+        if self.profiler is not None:
+            self._finish(self.last_run if self.last_run is not None else self.first)
+
+    def _finish(self, last):
+        self.profiler.__exit__(None, None, None)
+        os.makedirs(self.out_dir, exist_ok=True)
+        trace_path = os.path.join(self.out_dir, f"trace_rank{self.rank}_steps{self.first}-{last}.json")
+        self.profiler.export_chrome_trace(trace_path)
+        if self.rank == 0:
+            if last < self.last:
+                print(f"Training ended inside the profiler window {self.first}-{self.last}")
+            print(f"--- Profile of steps {self.first}-{last} (trace: {trace_path}) ---")
+            print(self.profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=PROFILE_TABLE_ROWS))
+        self.profiler = None
+        self.first = None
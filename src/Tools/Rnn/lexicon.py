@@ -0,0 +1,333 @@
+import argparse
+import array
+import heapq
+import json
+import mmap
+import os
+import shutil
+import struct
+import time
+
+import numpy as np
+
+import build_dataset
+from build_dataset import dataset_files, iter_source, normalize, text_hash
+from classifier import CLASS_NAMES
+from instrumentation import peak_rss_mb
+
+# --- Configuration ---
+# (path, label, CSV column or None for one-text-per-line files); labels follow CLASS_NAMES. Keys
+# come from these sources only; every labeled source of build_dataset.SOURCES (including the
+# nickname lists) is read as well, and a key any of them labels differently is left to the model
+SOURCES = [
+    ("../../Morpheus/Morpheus/Data/seznam_jmen.csv", 0, "JMENO"),
+    ("data/classes/sources/names/names_with_nickname.csv", 0, "name1"),
+    ("data/classes/sources/names/names_with_nickname.csv", 0, "name2"),  # Diminutives are still given names
+    ("data/classes/sources/companies/res/names.txt", 0, None),
+    ("data/classes/sources/companies/res/companies.txt", 2, None),
+]
+LEXICON_PATH = "name_lexicon.bin"
+MAGIC = b"NAMELEX1"
+HEADER = struct.Struct("<8sQQQ")  # magic, entry count, index slots, key blob size
+BUCKETS = 64            # Hash buckets on disk while building; one bucket is held in memory at a time
+LOAD_FACTOR = 0.5       # Most entries per index slot
+CHECK_CHUNK_SIZE = 65536
+
+def lexicon_key(text):
+    """
+    The lookup form of a text: build_dataset.normalize() and casefolded, so "JAN", "Jan" and
+    " jan " share one entry. "" for texts the lexicon never holds.
+    """
+    return normalize(text).casefold()
+
+class Lexicon:
+    """
+    Read-only view of a file written by build(): a sorted table of unique lexicon keys with their
+    class, plus an open-addressing hash index over it. The file is memory-mapped, so opening it
+    costs nothing up front and processes serving the same file share its pages.
+
+    Layout after the header, every section 8-byte aligned:
+      hashes  uint64[count]      text_hash() of each key, for cheap probe rejection
+      offsets uint64[count + 1]  key i is blob[offsets[i]:offsets[i + 1]] (UTF-8)
+      index   uint32[slots]      row + 1, 0 = empty; linear probing from hash & (slots - 1)
+      labels  uint8[count]
+      blob    keys concatenated in sorted order
+    """
+    def __init__(self, path=LEXICON_PATH):
+        with open(path, "rb") as f:
+            magic, self.count, self.slots, blob_size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a lexicon file")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.path = path
+        self.mask = self.slots - 1
+        view = memoryview(self._mmap)
+        offset = HEADER.size
+        sections = {}
+        for name, size, fmt in (("hashes", 8 * self.count, "Q"), ("offsets", 8 * (self.count + 1), "Q"),
+                                ("index", 4 * self.slots, "I"), ("labels", self.count, "B"), ("blob", blob_size, "B")):
+            sections[name] = view[offset:offset + size].cast(fmt)
+            offset += aligned(size)
+        self.hashes = sections["hashes"]
+        self.offsets = sections["offsets"]
+        self.index = sections["index"]
+        self.labels = sections["labels"]
+        self.blob = sections["blob"]
+
+    def __len__(self):
+        return self.count
+
+    def key(self, row):
+        return bytes(self.blob[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def get(self, text):
+        """
+        The class index of text, or None when the lexicon does not hold it.
+        """
+        key = lexicon_key(text)
+        if not key:
+            return None
+        h = text_hash(key)
+        encoded = key.encode("utf-8")
+        slot = h & self.mask
+        while True:
+            entry = self.index[slot]
+            if entry == 0:
+                return None
+            row = entry - 1
+            if self.hashes[row] == h and self.blob[self.offsets[row]:self.offsets[row + 1]] == encoded:
+                return self.labels[row]
+            slot = (slot + 1) & self.mask
+
+    def lookup_batch(self, texts):
+        return [self.get(text) for text in texts]
+
+def aligned(size):
+    return (size + 7) & ~7
+
+def all_sources():
+    """
+    (path, label, column, contributes keys) for SOURCES, then for the build_dataset.SOURCES not
+    already among them, which only take part in the conflict check.
+    """
+    sources = [(path, label, column, True) for path, label, column in SOURCES]
+    seen = {(os.path.normpath(path), column) for path, _, column in SOURCES}
+    for path, label, column, _ in build_dataset.SOURCES:
+        if (os.path.normpath(path), column) not in seen:
+            sources.append((path, label, column, False))
+    return sources
+
+def bucket_sources(sources, tmpdir, num_buckets, stats):
+    """
+    Pass 1: appends "label<TAB>keyed<TAB>key" for every source line to the hash bucket of its key,
+    so equal keys from any source end up in the same bucket file. keyed is 1 for lines of
+    sources that contribute keys, 0 for sources that only label.
+    """
+    buckets = [open(os.path.join(tmpdir, f"bucket_{i:04d}.tmp"), "w", encoding="utf-8", newline="\n") for i in range(num_buckets)]
+    try:
+        for path, label, column, keyed in sources:
+            name = f"{path}" + (f"[{column}]" if column else "")
+            if not os.path.exists(path):
+                print(f"  {name}: missing, skipped")
+                continue
+            read = kept = 0
+            for raw in iter_source(path, column):
+                read += 1
+                key = lexicon_key(raw)
+                if not key:
+                    continue
+                kept += 1
+                buckets[text_hash(key) % num_buckets].write(f"{label}\t{int(keyed)}\t{key}\n")
+            stats["sources"][name] = {"label": label, "keys": keyed, "read": read, "kept": kept}
+            print(f"  {name}: {read} lines, {kept} after normalization" + ("" if keyed else " (conflict check only)"))
+    finally:
+        for f in buckets:
+            f.close()
+
+def sort_buckets(tmpdir, num_buckets, stats):
+    """
+    Pass 2: one bucket at a time, drops repeated keys, keys that no key source holds and keys that
+    any source labels with another class (the model decides those), and rewrites the survivors as
+    a sorted "key<TAB>label" run.
+    """
+    duplicates = conflicts = 0
+    runs = []
+    for i in range(num_buckets):
+        path = os.path.join(tmpdir, f"bucket_{i:04d}.tmp")
+        labels = {}
+        keyed = set()
+        with open(path, encoding="utf-8", newline="\n") as f:
+            for line in f:
+                label, from_key_source, key = line.rstrip("\n").split("\t", 2)
+                label = int(label)
+                if from_key_source == "1":
+                    keyed.add(key)
+                previous = labels.get(key)
+                if previous is None:
+                    labels[key] = label
+                elif previous == label:
+                    duplicates += 1
+                elif previous != -1:
+                    labels[key] = -1  # Ambiguous across classes
+        os.remove(path)
+        conflicts += sum(labels[key] < 0 for key in keyed)
+        run = os.path.join(tmpdir, f"run_{i:04d}.tmp")
+        with open(run, "w", encoding="utf-8", newline="\n") as f:
+            for key in sorted(keyed):
+                if labels[key] >= 0:
+                    f.write(f"{key}\t{labels[key]}\n")
+        runs.append(run)
+    stats["duplicates_dropped"] = duplicates
+    stats["cross_class_conflicts_dropped"] = conflicts
+    return runs
+
+def build_index(hashes, slots):
+    """
+    Open-addressing table of row + 1 with linear probing, filled in rounds: every unplaced row
+    writes itself into its current slot if that slot is free, one write per slot sticks, and the
+    rows that did not stick move one slot on.
+    """
+    index = np.zeros(slots, dtype=np.uint32)
+    pending = np.arange(1, len(hashes) + 1, dtype=np.uint32)  # row + 1
+    position = (hashes & np.uint64(slots - 1)).astype(np.int64)
+    while len(pending):
+        free = index[position] == 0
+        index[position[free]] = pending[free]
+        placed = index[position] == pending
+        pending = pending[~placed]
+        position = (position[~placed] + 1) & (slots - 1)
+    return index
+
+def write_lexicon(runs, tmpdir, out_path, stats):
+    """
+    Pass 3: merges the sorted runs into one key blob and writes the lexicon file. Only the
+    per-entry arrays (17 bytes an entry) and the index are held in memory.
+    """
+    hashes = array.array("Q")
+    offsets = array.array("Q", [0])
+    labels = bytearray()
+    blob_path = os.path.join(tmpdir, "blob.tmp")
+    run_files = [open(run, encoding="utf-8", newline="\n") for run in runs]
+    try:
+        with open(blob_path, "wb") as blob:
+            # Keys never contain a tab, and a tab sorts before every printable character, so
+            # merging whole lines orders by key
+            for line in heapq.merge(*run_files):
+                key, label = line.rstrip("\n").split("\t")
+                encoded = key.encode("utf-8")
+                blob.write(encoded)
+                hashes.append(text_hash(key))
+                offsets.append(offsets[-1] + len(encoded))
+                labels.append(int(label))
+    finally:
+        for f in run_files:
+            f.close()
+
+    count = len(labels)
+    slots = 2
+    while slots * LOAD_FACTOR < count:
+        slots *= 2
+    index = build_index(np.frombuffer(hashes, dtype=np.uint64), slots)
+    partial = out_path + ".tmp"
+    with open(partial, "wb") as f:
+        f.write(HEADER.pack(MAGIC, count, slots, offsets[-1]))
+        for section in (memoryview(hashes).cast("B"), memoryview(offsets).cast("B"), memoryview(index).cast("B"), labels):
+            f.write(section)
+            f.write(b"\0" * (aligned(len(section)) - len(section)))
+        with open(blob_path, "rb") as blob:
+            shutil.copyfileobj(blob, f)
+    os.replace(partial, out_path)
+    stats["entries"] = count
+    stats["entries_per_class"] = [labels.count(c) for c in range(len(CLASS_NAMES))]
+    stats["index_slots"] = slots
+    stats["size_bytes"] = os.path.getsize(out_path)
+
+def build(args):
+    print("--- Building Lexicon ---")
+    t_start = time.perf_counter()
+    stats = {"sources": {}}
+    tmpdir = args.out + ".parts"
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    os.makedirs(tmpdir)
+    try:
+        print("[1/3] Normalizing sources into hash buckets...")
+        bucket_sources(all_sources(), tmpdir, args.buckets, stats)
+        print("[2/3] Deduplicating and sorting...")
+        runs = sort_buckets(tmpdir, args.buckets, stats)
+        print("[3/3] Writing sorted table and hash index...")
+        write_lexicon(runs, tmpdir, args.out, stats)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    stats["build_time_s"] = time.perf_counter() - t_start
+    stats["peak_rss_mb"] = peak_rss_mb()
+    print(f"  entries per class: {stats['entries_per_class']} | duplicates: {stats['duplicates_dropped']} | "
+          f"cross-class conflicts: {stats['cross_class_conflicts_dropped']}")
+    rss = f", peak RSS {stats['peak_rss_mb']:.0f} MB" if stats["peak_rss_mb"] is not None else ""
+    print(f"{stats['entries']} entries written to {args.out} ({stats['size_bytes'] / 2**20:.1f} MB) "
+          f"in {stats['build_time_s']:.1f}s{rss}")
+    with open(args.out + ".json", "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+    print("--- Lexicon Build Finished ---")
+
+def check(args):
+    """
+    Hit rate of the lexicon over labeled texts, and how often its answers agree with the labels.
+    """
+    from validate import iter_chunks, parse_source
+
+    specs = args.sources or dataset_files()[1] or ["data/validate.csv"]
+    lexicon = Lexicon(args.lexicon)
+    num_classes = len(CLASS_NAMES)
+    rows = np.zeros(num_classes, dtype=np.int64)
+    hits = np.zeros(num_classes, dtype=np.int64)
+    agree = np.zeros(num_classes, dtype=np.int64)
+    lookup_time = 0.0
+    print(f"--- Checking {args.lexicon} ({len(lexicon)} entries) ---")
+    for texts, labels in iter_chunks([parse_source(s) for s in specs], CHECK_CHUNK_SIZE):
+        t0 = time.perf_counter()
+        found = lexicon.lookup_batch(texts)
+        lookup_time += time.perf_counter() - t0
+        answered = np.fromiter((-1 if f is None else f for f in found), dtype=np.int64, count=len(found))
+        hit = answered >= 0
+        rows += np.bincount(labels, minlength=num_classes)
+        hits += np.bincount(labels[hit], minlength=num_classes)
+        agree += np.bincount(labels[hit & (answered == labels)], minlength=num_classes)
+
+    total = int(rows.sum())
+    if not total:
+        print("No rows read")
+        return
+    print(f"{'class':<10} {'rows':>10} {'hit rate':>9} {'agreement':>10}")
+    for c, name in enumerate(CLASS_NAMES):
+        print(f"{name:<10} {rows[c]:>10} {hits[c] / max(rows[c], 1):>9.2%} {agree[c] / max(hits[c], 1):>10.2%}")
+    print(f"{'all':<10} {total:>10} {hits.sum() / total:>9.2%} {agree.sum() / max(hits.sum(), 1):>10.2%}")
+    print(f"Lookup: {lookup_time / total * 1e6:.2f} us/text | model calls avoided for {hits.sum()} of {total} texts")
+    print("--- Check Finished ---")
+
+def lookup(args):
+    lexicon = Lexicon(args.lexicon)
+    for text in args.texts:
+        label = lexicon.get(text)
+        print(f"{text!r} -> {lexicon_key(text)!r}: {'miss' if label is None else CLASS_NAMES[label]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact-match lexicon answered before name_classifier.onnx: build, hit-rate check and lookup")
+    parser.add_argument("command", choices=["build", "check", "lookup"])
+    parser.add_argument("texts", nargs="*", help="check: labeled sources as in validate.py --stream "
+                                                 "(default: the validation shards); lookup: texts to look up")
+    parser.add_argument("--lexicon", default=LEXICON_PATH, help="Lexicon file to read")
+    parser.add_argument("--out", default=LEXICON_PATH, help="build: lexicon file to write (stats go to OUT.json)")
+    parser.add_argument("--buckets", type=int, default=BUCKETS, help="build: hash buckets on disk (more buckets, less memory)")
+    args = parser.parse_intermixed_args()
+    args.sources = args.texts
+    if args.command == "check":
+        from validate import parse_source
+        for spec in args.sources:
+            try:
+                parse_source(spec)
+            except argparse.ArgumentTypeError as e:
+                parser.error(str(e))
+    {"build": build, "check": check, "lookup": lookup}[args.command](args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import csv
+import json
+import random
+import time
+
+import numpy as np
+
+# --- Configuration ---
+HOST = "127.0.0.1"
+PORT = 8765
+TEXTS_FILE = "data/validate.csv"
+CONCURRENCY = 64      # Simultaneous keep-alive client connections
+DURATION = 10.0       # Seconds of load
+
+async def open_connection(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+async def request(reader, writer, method, path, body=b""):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: text/plain; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n")[1:]:
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    return status, await reader.readexactly(length)
+
+async def client(args, texts, deadline, latencies, errors):
+    reader, writer = await open_connection(args)
+    rng = random.Random()
+    try:
+        while time.perf_counter() < deadline:
+            text = rng.choice(texts).encode("utf-8")
+            t0 = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", "/classify", text)
+            latencies.append(time.perf_counter() - t0)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+async def run(args):
+    with open(args.texts, encoding="utf-8", newline="") as f:
+        texts = [row["text"] for row in csv.DictReader(f)]
+    latencies, errors = [], []
+    print(f"Load: {args.concurrency} connections for {args.duration:.0f}s using {len(texts)} distinct texts")
+    t_start = time.perf_counter()
+    deadline = t_start + args.duration
+    await asyncio.gather(*(client(args, texts, deadline, latencies, errors) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - t_start
+
+    reader, writer = await open_connection(args)
+    _, body = await request(reader, writer, "GET", "/stats")
+    writer.close()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3 if latencies else (0.0, 0.0, 0.0)
+    print("\n--- Load Results (client side) ---")
+    print(f"Requests: {len(latencies)} | Errors: {len(errors)} | Throughput: {len(latencies) / elapsed:.1f} req/s")
+    print(f"Latency ms: p50 {p50:.2f} | p95 {p95:.2f} | p99 {p99:.2f}")
+    print("\n--- Server /stats ---")
+    print(json.dumps(json.loads(body), indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description="Local load generator for server.py")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", default=None, help="Connect to this Unix socket path instead of TCP")
+    parser.add_argument("--texts", default=TEXTS_FILE, help="CSV with a 'text' column to sample requests from")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--duration", type=float, default=DURATION)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,643 @@
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import shutil
+import time
+import unicodedata
+
+import numpy as np
+
+from build_dataset import NUM_CLASSES, SOURCES, iter_source
+from instrumentation import peak_rss_mb
+
+# --- Configuration ---
+# PATH for one-text-per-line files, PATH:COLUMN for a CSV column. Inputs listed in
+# build_dataset.SOURCES are deduplicated within their class, any other input within itself
+DEFAULT_INPUTS = [
+    "data/classes/nicknames/scrapers/sft/sft_raw.txt",
+    "data/classes/sources/companies/res/names.txt",
+    "data/classes/sources/companies/res/companies.txt",
+    "data/classes/sources/names/names_with_nickname.csv:name1",
+]
+OUTPUT_DIR = "data/near_dedup"
+NGRAM = 3               # Character n-grams of every word of the canonical form
+NUM_PERM = 64           # MinHash signature length (bytes on disk per text: 4 * NUM_PERM)
+BANDS = 16              # LSH bands of NUM_PERM // BANDS rows; candidate threshold ~ (1 / BANDS) ** (BANDS / NUM_PERM)
+THRESHOLD = 0.4         # Estimated Jaccard similarity of the n-gram sets needed before the word rule
+TYPO_MIN_LEN = 5        # Shortest word in which one edit can be a typo rather than another name
+TYPO_MAX_COUNT = 2      # A typo is a word seen at most this often in the corpus ("Mirek" is not a typo of "Marek")
+WORD_TABLE = 1 << 22    # Hashed word-count buckets (4 bytes each); collisions only overcount
+PARTITIONS = 64         # On-disk LSH partitions; one partition is held in memory at a time
+CHUNK_LINES = 20000     # Texts per worker task; at most 2 * jobs chunks are in flight
+PERM_BLOCK = 16         # Permutations hashed at once ([n-grams, PERM_BLOCK] uint64 scratch)
+PROGRESS_EVERY = 1000000
+SEED = 0
+
+# Leetspeak and look-alike symbols folded before shingling, so "M@rt!n K.O." meets "Martin KO"
+LEET = str.maketrans({"@": "a", "4": "a", "8": "b", "3": "e", "6": "g", "1": "i", "!": "i", "|": "l",
+                      "0": "o", "5": "s", "$": "s", "7": "t", "2": "z"})
+
+def spelling(text):
+    """
+    Matching form of a text with its diacritics: case folded, leetspeak folded, everything that
+    is not a letter, digit or space removed and the words joined by single spaces.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold().translate(LEET)
+    words = ("".join(ch for ch in word if ch.isalnum()) for word in text.split())
+    return " ".join(word for word in words if word)
+
+def strip_diacritics(text):
+    return "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+
+def canonical(text):
+    """
+    The spelling of a text without diacritics: "M@rt!n K.O." -> "martin ko".
+    """
+    return strip_diacritics(spelling(text))
+
+def one_edit(a, b):
+    """
+    True if a and b are one substitution, insertion, deletion or swap of neighbours apart.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    diff = [i for i, (x, y) in enumerate(zip(a, b)) if x != y]
+    if len(a) < len(b):
+        i = diff[0] if diff else len(a)
+        return a[i:] == b[i + 1:]
+    if len(diff) == 2 and diff[1] == diff[0] + 1:
+        i, j = diff
+        return a[i] == b[j] and a[j] == b[i]
+    return len(diff) == 1
+
+def words_match(spelling_a, spelling_b, word_count, min_len=TYPO_MIN_LEN, max_count=TYPO_MAX_COUNT):
+    """
+    The word rule every link must pass on top of the MinHash similarity. Both spellings have the
+    same words without diacritics, in any order, except for at most one word on each side, and
+    that pair must be a typo:
+    - neither word is the last one of its text (the surname must match),
+    - both have at least min_len letters and are one edit apart with diacritics kept,
+    - one of them is seen at most max_count times in the corpus (word_count of the word without
+      diacritics); two one-letter neighbours that are both common are two names.
+    "Martn Korec" ~ "Martin Korec" passes while "Martn" is rare. "Zuzana Vlčková" ~ "Jana Vlčková",
+    "Josef Divín" ~ "Josef Diviš", "Daniel Koós" ~ "Daniel Kos" and "Korec" ~ "Korek" do not.
+    """
+    words_a, words_b = spelling_a.split(), spelling_b.split()
+    if len(words_a) != len(words_b):
+        return False
+    plain_a = [strip_diacritics(w) for w in words_a]
+    plain_b = [strip_diacritics(w) for w in words_b]
+    only_a = list((collections.Counter(plain_a) - collections.Counter(plain_b)).elements())
+    if not only_a:
+        return True
+    if len(only_a) > 1:
+        return False
+    only_b = list((collections.Counter(plain_b) - collections.Counter(plain_a)).elements())
+    if only_a[0] == plain_a[-1] or only_b[0] == plain_b[-1]:
+        return False
+    a = words_a[plain_a.index(only_a[0])]
+    b = words_b[plain_b.index(only_b[0])]
+    return min(len(a), len(b)) >= min_len and one_edit(a, b) and \
+        min(word_count(only_a[0]), word_count(only_b[0])) <= max_count
+
+def exact_form(form):
+    # Spacing variants ("JanNovák", "Jan Novák") are exact duplicates, not near ones
+    return form.replace(" ", "")
+
+def mix64(x):
+    # splitmix64 finalizer on a uint64 array (wrapping arithmetic)
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def permutation_params(num_perm, seed):
+    """
+    Multiply-shift hash family: h_i(x) = (a_i * x + b_i) >> 32 over uint64, a_i odd.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 2**63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+    return a, b
+
+def string_hashes(strings):
+    """
+    One 64-bit hash per string for the whole list at once: every character is mixed with its
+    position, the mixes are summed per string and the sum mixed with the length. "" hashes to 0.
+    """
+    lengths = np.fromiter((len(s) for s in strings), dtype=np.int64, count=len(strings))
+    out = np.zeros(len(strings), dtype=np.uint64)
+    nonempty = lengths > 0
+    if not nonempty.any():
+        return out
+    codes = np.frombuffer("".join(strings).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    starts = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=starts[1:])
+    positions = (np.arange(len(codes)) - np.repeat(starts[:-1], lengths)).astype(np.uint64)
+    mixed = mix64(codes ^ mix64(positions + np.uint64(1)))
+    out[nonempty] = mix64(np.add.reduceat(mixed, starts[:-1][nonempty]) ^ lengths[nonempty].astype(np.uint64))
+    return out
+
+def signatures(forms, ngram, a, b):
+    """
+    MinHash signatures [len(forms), num_perm] (uint32) of the canonical forms' character n-grams,
+    computed for the whole chunk at once. Every word is framed by boundary markers and shingled
+    on its own, so n-grams never span two words and even a one-letter word has one. Rows of
+    empty forms are left at the maximum and flagged.
+    """
+    words = [form.split() for form in forms]
+    word_counts = np.fromiter((len(w) for w in words), dtype=np.int64, count=len(words))
+    framed = ["\x02" + word + "\x03" for w in words for word in w]
+    lengths = np.fromiter((len(w) for w in framed), dtype=np.int64, count=len(framed))
+    gram_counts = np.maximum(lengths - ngram + 1, 0)
+    counts = np.bincount(np.repeat(np.arange(len(forms)), word_counts), weights=gram_counts,
+                         minlength=len(forms)).astype(np.int64)
+    has_shingles = counts > 0
+    sig = np.full((len(forms), len(a)), np.iinfo(np.uint32).max, dtype=np.uint32)
+    if not has_shingles.any():
+        return sig, has_shingles
+
+    codes = np.frombuffer("".join(framed).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    starts = np.zeros(len(framed) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=starts[1:])
+    # Start position of every n-gram, word by word; a form's n-grams are contiguous
+    seg_starts = np.zeros(len(framed) + 1, dtype=np.int64)
+    np.cumsum(gram_counts, out=seg_starts[1:])
+    positions = np.arange(seg_starts[-1]) - np.repeat(seg_starts[:-1] - starts[:-1], gram_counts)
+    h = np.zeros(len(positions), dtype=np.uint64)
+    for k in range(ngram):
+        h = mix64(h ^ codes[positions + k])
+    # One column per permutation; min over each form's n-grams
+    offsets = (np.cumsum(counts) - counts)[has_shingles]
+    for p in range(0, len(a), PERM_BLOCK):
+        hashed = ((h[:, None] * a[None, p:p + PERM_BLOCK] + b[None, p:p + PERM_BLOCK]) >> np.uint64(32)).astype(np.uint32)
+        sig[has_shingles, p:p + PERM_BLOCK] = np.minimum.reduceat(hashed, offsets, axis=0)
+    return sig, has_shingles
+
+def band_keys(sig, groups, bands):
+    """
+    One 64-bit key per (text, band): the band's signature rows hashed together with the band
+    index and the text's group, so equal keys mean the band matched within one group.
+    """
+    rows = sig.shape[1] // bands
+    keys = np.empty((len(sig), bands), dtype=np.uint64)
+    for band in range(bands):
+        key = mix64(groups.astype(np.uint64) * np.uint64(bands) + np.uint64(band + 1))
+        for r in range(rows):
+            key = mix64(key ^ sig[:, band * rows + r].astype(np.uint64))
+        keys[:, band] = key
+    return keys
+
+_params = None
+
+def init_worker(ngram, num_perm, bands, seed, word_table):
+    global _params
+    a, b = permutation_params(num_perm, seed)
+    _params = (ngram, a, b, bands, word_table)
+
+def hash_chunk(task):
+    """
+    Worker: spellings (UTF-8, concatenated, with their byte lengths), MinHash signatures, LSH
+    band keys, exact-form keys and word-count buckets (bucket ids and counts) of one chunk of
+    texts.
+    """
+    first_id, texts, groups = task
+    ngram, a, b, bands, word_table = _params
+    spellings = [spelling(t).encode("utf-8") for t in texts]
+    spelling_lengths = np.fromiter((len(s) for s in spellings), dtype=np.int64, count=len(spellings))
+    forms = [strip_diacritics(s.decode("utf-8")) for s in spellings]
+    sig, has_shingles = signatures(forms, ngram, a, b)
+    keys = band_keys(sig, groups, bands)
+    exact = string_hashes([exact_form(f) for f in forms])
+    words = np.unique(string_hashes([word for f in forms for word in f.split()]) % np.uint64(word_table), return_counts=True)
+    return first_id, b"".join(spellings), spelling_lengths, sig, keys, exact, has_shingles, groups, words
+
+def iter_chunks(inputs, chunk_lines):
+    """
+    (first doc id, texts, group of each text) chunks over all inputs in order.
+    """
+    chunk = []
+    groups = []
+    next_id = 0
+    for path, column, _, group in inputs:
+        for text in iter_source(path, column):
+            chunk.append(text)
+            groups.append(group)
+            if len(chunk) == chunk_lines:
+                yield next_id, chunk, np.asarray(groups, dtype=np.int32)
+                next_id += len(chunk)
+                chunk = []
+                groups = []
+    if chunk:
+        yield next_id, chunk, np.asarray(groups, dtype=np.int32)
+
+def bounded_map(pool, func, tasks, window):
+    """
+    pool.imap without reading ahead: at most `window` tasks are queued or running (imap would
+    pull the whole input into its task queue). Results come back in task order.
+    """
+    pending = collections.deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+def one_line(text):
+    return text.replace("\r", " ").replace("\n", " ")
+
+RECORD = np.dtype([("key", "<u8"), ("doc", "<u8")])
+
+def partition_path(tmpdir, kind, p):
+    return os.path.join(tmpdir, f"{kind}_{p:03d}.bin")
+
+def write_partitioned(files, keys, docs):
+    """
+    Appends (key, doc) records to files[key % len(files)].
+    """
+    records = np.empty(len(keys), dtype=RECORD)
+    records["key"] = keys
+    records["doc"] = docs
+    part = keys % np.uint64(len(files))
+    order = np.argsort(part, kind="stable")
+    bounds = np.searchsorted(part[order], np.arange(len(files) + 1))
+    for p, f in enumerate(files):
+        records[order[bounds[p]:bounds[p + 1]]].tofile(f)
+
+def read_partition(tmpdir, kind, p):
+    """
+    Records of one partition sorted by key; records are written in doc order, so the stable sort
+    keeps each key's docs ascending. The file is removed.
+    """
+    path = partition_path(tmpdir, kind, p)
+    records = np.fromfile(path, dtype=RECORD)
+    os.remove(path)
+    return records[np.argsort(records["key"], kind="stable")]
+
+def hash_pass(inputs, tmpdir, args):
+    """
+    Pass 1: workers hash chunks in parallel; the parent appends signatures to signatures.bin,
+    spellings to spellings.bin, (exact-form key, doc) records to the exact_* partitions and
+    (band key, doc) records to the lsh_* partitions, and counts the words. Returns the group of
+    every text, the offsets of the spellings in spellings.bin and the word-count table.
+    """
+    exact_files = [open(partition_path(tmpdir, "exact", p), "wb") for p in range(args.partitions)]
+    lsh_files = [open(partition_path(tmpdir, "lsh", p), "wb") for p in range(args.partitions)]
+    total = 0
+    group_chunks = []
+    length_chunks = []
+    word_counts = np.zeros(WORD_TABLE, dtype=np.uint32)
+    next_progress = PROGRESS_EVERY
+    try:
+        with open(os.path.join(tmpdir, "signatures.bin"), "wb") as f_sig, \
+             open(os.path.join(tmpdir, "spellings.bin"), "wb") as f_spell, \
+             multiprocessing.Pool(args.jobs, initializer=init_worker, initargs=(args.ngram, args.num_perm, args.bands, args.seed, WORD_TABLE)) as pool:
+            for first_id, spellings, spelling_lengths, sig, keys, exact, has_shingles, groups, (buckets, counts) in \
+                    bounded_map(pool, hash_chunk, iter_chunks(inputs, args.chunk_lines), 2 * args.jobs):
+                sig.tofile(f_sig)
+                f_spell.write(spellings)
+                group_chunks.append(groups)
+                length_chunks.append(spelling_lengths)
+                word_counts[buckets] += counts.astype(np.uint32)
+                # Texts with nothing to shingle (e.g. only punctuation) never become candidates
+                docs = np.arange(first_id, first_id + len(sig), dtype=np.uint64)[has_shingles]
+                write_partitioned(exact_files, exact[has_shingles], docs)
+                write_partitioned(lsh_files, keys[has_shingles].ravel(), np.repeat(docs, args.bands))
+                total = first_id + len(sig)
+                if total >= next_progress:
+                    print(f"  hashed {total} texts")
+                    next_progress += PROGRESS_EVERY
+    finally:
+        for f in exact_files + lsh_files:
+            f.close()
+    print(f"  hashed {total} texts")
+    offsets = np.zeros(total + 1, dtype=np.int64)
+    if length_chunks:
+        np.cumsum(np.concatenate(length_chunks), out=offsets[1:])
+    return (np.concatenate(group_chunks) if group_chunks else np.zeros(0, dtype=np.int32)), offsets, word_counts
+
+class Spellings:
+    """
+    Random access to the spellings of pass 1 (memory-mapped spellings.bin) and to the corpus
+    count of a word.
+    """
+    def __init__(self, path, offsets, word_counts):
+        self.offsets = offsets
+        self.data = np.memmap(path, dtype=np.uint8, mode="r") if offsets[-1] else np.zeros(0, dtype=np.uint8)
+        self.word_counts = word_counts
+
+    def __getitem__(self, doc):
+        return self.data[self.offsets[doc]:self.offsets[doc + 1]].tobytes().decode("utf-8")
+
+    def word_count(self, word):
+        return int(self.word_counts[string_hashes([word])[0] % np.uint64(len(self.word_counts))])
+
+    def match(self, a, b, args):
+        """
+        words_match for doc pairs (a[i], b[i]) as a boolean array.
+        """
+        return np.fromiter((words_match(self[x], self[y], self.word_count, args.typo_min_len, args.typo_max_count)
+                            for x, y in zip(a.tolist(), b.tolist())), dtype=bool, count=len(a))
+
+def exact_pass(tmpdir, groups, args, stats):
+    """
+    Pass 2a: texts with the same exact form in the same group are mapped to their first
+    occurrence, so linking and clustering only see one text per distinct form. A form found in
+    more than one group is a label conflict: every text of it gets the conflict's id (else -1)
+    and stays in its own group's output.
+    """
+    total = len(groups)
+    rep = np.arange(total, dtype=np.int64)
+    conflict = np.full(total, -1, dtype=np.int64)
+    for p in range(args.partitions):
+        records = read_partition(tmpdir, "exact", p)
+        if len(records) < 2:
+            continue
+        docs = records["doc"].astype(np.int64)
+        keys = records["key"]
+        order = np.lexsort((docs, groups[docs], keys))
+        docs, keys = docs[order], keys[order]
+        g = groups[docs]
+        index = np.arange(len(docs))
+        new_key = np.concatenate([[True], keys[1:] != keys[:-1]])
+        new_form = new_key | np.concatenate([[True], g[1:] != g[:-1]])
+        rep[docs] = docs[np.maximum.accumulate(np.where(new_form, index, 0))]
+        key_first = np.maximum.accumulate(np.where(new_key, index, 0))
+        run = np.cumsum(new_key) - 1
+        mixed = (np.bincount(run, weights=g != g[key_first]) > 0)[run]
+        conflict[docs[mixed]] = docs[key_first[mixed]]
+    stats["exact_duplicates"] = int((rep != np.arange(total)).sum())
+    return rep, conflict
+
+def similarity(sig, a, b, block=1 << 20):
+    """
+    Estimated Jaccard similarity of doc pairs (a[i], b[i]): the share of equal MinHash values.
+    """
+    out = np.empty(len(a), dtype=np.float32)
+    for start in range(0, len(a), block):
+        out[start:start + block] = (sig[a[start:start + block]] == sig[b[start:start + block]]).mean(axis=1)
+    return out
+
+def link_pass(tmpdir, sig, spellings, rep, args, stats):
+    """
+    Pass 2b: one partition at a time, distinct forms sharing a band key are chained into candidate
+    pairs, kept when their estimated Jaccard similarity reaches the threshold and their words
+    pass words_match. Returns the accepted edges as two doc id arrays.
+    """
+    edges_a, edges_b = [], []
+    candidates = similar = 0
+    for p in range(args.partitions):
+        records = read_partition(tmpdir, "lsh", p)
+        records = records[rep[records["doc"].astype(np.int64)] == records["doc"].astype(np.int64)]
+        if len(records) < 2:
+            continue
+        same = records["key"][1:] == records["key"][:-1]
+        a = records["doc"][:-1][same]
+        b = records["doc"][1:][same]
+        if not len(a):
+            continue
+        pairs = np.unique(np.stack([a, b], axis=1), axis=0)
+        candidates += len(pairs)
+        pairs = pairs[similarity(sig, pairs[:, 0], pairs[:, 1]) >= args.threshold]
+        similar += len(pairs)
+        keep = spellings.match(pairs[:, 0], pairs[:, 1], args)
+        edges_a.append(pairs[keep, 0])
+        edges_b.append(pairs[keep, 1])
+    stats["candidate_pairs"] = candidates
+    stats["similar_pairs"] = similar
+    a = np.concatenate(edges_a).astype(np.int64) if edges_a else np.zeros(0, dtype=np.int64)
+    b = np.concatenate(edges_b).astype(np.int64) if edges_b else np.zeros(0, dtype=np.int64)
+    stats["linked_pairs"] = len(a)
+    return a, b
+
+def connected_components(total, a, b):
+    """
+    Labels every doc with the smallest doc id in its component (min-label propagation with
+    pointer jumping), so a cluster's label is its first occurrence.
+    """
+    labels = np.arange(total, dtype=np.int64)
+    while len(a):
+        m = np.minimum(labels[a], labels[b])
+        before = labels.copy()
+        np.minimum.at(labels, a, m)
+        np.minimum.at(labels, b, m)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, before):
+            break
+    return labels
+
+def cluster(total, a, b, spellings, rep, args, stats):
+    """
+    Connected components of the linked pairs, tightened so that every member itself passes
+    words_match against its cluster's representative: chains of typos in different words or
+    letters would otherwise merge texts that are not one typo apart. Members that fail are cut off
+    from the rest of their cluster and clustered again among themselves until nothing changes.
+    Exact duplicates finally take the label of their first occurrence.
+    """
+    rounds = 0
+    distinct = rep == np.arange(total)
+    while True:
+        rounds += 1
+        labels = connected_components(total, a, b)
+        members = np.nonzero((labels != np.arange(total)) & distinct)[0]
+        drifted = np.zeros(total, dtype=bool)
+        drifted[members[~spellings.match(members, labels[members], args)]] = True
+        if not drifted.any():
+            break
+        keep = drifted[a] == drifted[b]
+        a, b = a[keep], b[keep]
+    stats["cluster_rounds"] = rounds
+    return labels[rep]
+
+def link_and_cluster(tmpdir, groups, offsets, word_counts, args, stats):
+    # The signature and spelling memmaps live only inside this call, so the files can be removed
+    # afterwards (Windows refuses to delete mapped files)
+    total = len(groups)
+    sig = np.memmap(os.path.join(tmpdir, "signatures.bin"), dtype=np.uint32, mode="r", shape=(total, args.num_perm)) \
+        if total else np.zeros((0, args.num_perm), dtype=np.uint32)
+    spellings = Spellings(os.path.join(tmpdir, "spellings.bin"), offsets, word_counts)
+    rep, conflict = exact_pass(tmpdir, groups, args, stats)
+    print(f"  {stats['exact_duplicates']} exact duplicates of the canonical form")
+    a, b = link_pass(tmpdir, sig, spellings, rep, args, stats)
+    print(f"  {stats['candidate_pairs']} candidate pairs between distinct forms, {stats['similar_pairs']} similar, "
+          f"{stats['linked_pairs']} linked by the word rule")
+    return cluster(total, a, b, spellings, rep, args, stats), conflict
+
+def output_name(path, column):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}.{column}.txt" if column else f"{stem}.txt"
+
+def write_groups(tmpdir, kind, partitions, out_path, record):
+    """
+    Groups the "<id>\t<payload>" lines of the <kind>_* partition files by id (in input order)
+    and writes record(id, payloads) as one JSON line per group. Returns the number of groups.
+    """
+    groups_written = 0
+    with open(out_path, "w", encoding="utf-8", newline="\n") as f_out:
+        for p in range(partitions):
+            path = os.path.join(tmpdir, f"{kind}_{p:03d}.tmp")
+            groups = {}
+            with open(path, encoding="utf-8", newline="\n") as f:
+                for line in f:
+                    key, payload = line.rstrip("\n").split("\t", 1)
+                    groups.setdefault(int(key), []).append(payload)
+            os.remove(path)
+            for key, payloads in groups.items():
+                f_out.write(json.dumps(record(key, payloads), ensure_ascii=False) + "\n")
+                groups_written += 1
+    return groups_written
+
+def write_outputs(inputs, tmpdir, out_dir, labels, conflict, args, stats):
+    """
+    Pass 3: streams the inputs again, writes every cluster's first occurrence (and every text
+    without near-duplicates) to <input>.txt in out_dir, and sends members of clusters and of
+    label conflicts to partition files that are then grouped into clusters.jsonl and
+    conflicts.jsonl.
+    """
+    sizes = np.bincount(labels, minlength=len(labels))
+    cluster_files = [open(os.path.join(tmpdir, f"cluster_{p:03d}.tmp"), "w", encoding="utf-8", newline="\n") for p in range(args.partitions)]
+    conflict_files = [open(os.path.join(tmpdir, f"conflict_{p:03d}.tmp"), "w", encoding="utf-8", newline="\n") for p in range(args.partitions)]
+    names = []
+    doc = 0
+    per_input = {}
+    try:
+        for i, (path, column, class_label, _) in enumerate(inputs):
+            name = output_name(path, column)
+            names.append((name, class_label))
+            kept = read = 0
+            with open(os.path.join(out_dir, name), "w", encoding="utf-8", newline="\n") as f_out:
+                for text in iter_source(path, column):
+                    label = labels[doc]
+                    text = one_line(text)
+                    if label == doc:
+                        f_out.write(text + "\n")
+                        kept += 1
+                    if sizes[label] > 1:
+                        cluster_files[label % args.partitions].write(f"{label}\t{text}\n")
+                    if conflict[doc] >= 0:
+                        conflict_files[conflict[doc] % args.partitions].write(f"{conflict[doc]}\t{i}\t{text}\n")
+                    doc += 1
+                    read += 1
+            per_input[name] = {"label": class_label, "read": read, "kept": kept}
+            print(f"  {name}: {read} -> {kept}")
+    finally:
+        for f in cluster_files + conflict_files:
+            f.close()
+
+    # Members are in input order, so members[0] is the kept representative
+    stats["clusters"] = write_groups(tmpdir, "cluster", args.partitions, os.path.join(out_dir, "clusters.jsonl"),
+                                     lambda key, members: {"id": key, "size": len(members), "representative": members[0],
+                                                           "members": members})
+
+    def conflict_record(key, payloads):
+        members = []
+        for payload in dict.fromkeys(payloads):
+            i, text = payload.split("\t", 1)
+            name, class_label = names[int(i)]
+            members.append({"input": name, "label": class_label, "text": text})
+        return {"id": key, "size": len(payloads), "members": members}
+
+    stats["label_conflicts"] = write_groups(tmpdir, "conflict", args.partitions, os.path.join(out_dir, "conflicts.jsonl"),
+                                            conflict_record)
+    stats["outputs"] = per_input
+    stats["texts_in_clusters"] = int((sizes[sizes > 1]).sum())
+    stats["texts_in_conflicts"] = int((conflict >= 0).sum())
+
+def parse_input(spec):
+    """
+    "PATH" or "PATH:COLUMN" (CSV column). A colon followed by a path separator is a Windows drive.
+    """
+    path, sep, column = spec.rpartition(":")
+    if sep and path and column and not any(c in column for c in "/\\"):
+        return path, column
+    return spec, None
+
+def input_groups(inputs):
+    """
+    (path, column, class label or None, group) per input: inputs listed in build_dataset.SOURCES
+    share their class's group, any other input is a group of its own.
+    """
+    classes = {(os.path.normpath(path), column): label for path, label, column, _ in SOURCES}
+    grouped = []
+    for i, (path, column) in enumerate(inputs):
+        label = classes.get((os.path.normpath(path), column))
+        grouped.append((path, column, label, label if label is not None else NUM_CLASSES + i))
+    return grouped
+
+def main():
+    parser = argparse.ArgumentParser(description="MinHash/LSH near-duplicate clustering of text corpora")
+    parser.add_argument("inputs", nargs="*", default=DEFAULT_INPUTS, help="PATH (one text per line) or PATH:COLUMN (CSV)")
+    parser.add_argument("--out-dir", default=OUTPUT_DIR, help="Deduplicated <input>.txt files, clusters.jsonl and stats.json")
+    parser.add_argument("--ngram", type=int, default=NGRAM, help="Character n-gram length of the shingles")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Estimated Jaccard similarity needed before the word rule")
+    parser.add_argument("--typo-min-len", type=int, default=TYPO_MIN_LEN, help="Shortest word in which one edit can be a typo")
+    parser.add_argument("--typo-max-count", type=int, default=TYPO_MAX_COUNT, help="Most times a typo may be seen in the corpus")
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--bands", type=int, default=BANDS)
+    parser.add_argument("--partitions", type=int, default=PARTITIONS, help="LSH partitions on disk (more partitions, less memory)")
+    parser.add_argument("--chunk-lines", type=int, default=CHUNK_LINES)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Hashing worker processes")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+    if args.num_perm % args.bands:
+        parser.error("--num-perm must be a multiple of --bands")
+
+    inputs = [parse_input(spec) for spec in args.inputs]
+    missing = [path for path, _ in inputs if not os.path.exists(path)]
+    for path in missing:
+        print(f"  {path}: missing, skipped")
+    inputs = input_groups([(path, column) for path, column in inputs if path not in missing])
+    if not inputs:
+        print("No inputs found")
+        return
+
+    print("--- Near-Duplicate Detection ---")
+    rows = args.num_perm // args.bands
+    print(f"{len(inputs)} input(s) | {args.ngram}-grams per word | {args.bands} bands x {rows} rows "
+          f"(candidate threshold ~{(1 / args.bands) ** (1 / rows):.2f}) | link at Jaccard >= {args.threshold} "
+          f"and at most one rare typo outside the surname | {args.jobs} job(s)")
+    t_start = time.perf_counter()
+    stats = {"config": {k: getattr(args, k) for k in ("ngram", "threshold", "typo_min_len", "typo_max_count", "num_perm", "bands", "seed")}}
+    os.makedirs(args.out_dir, exist_ok=True)
+    tmpdir = os.path.join(args.out_dir, "tmp")
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    os.makedirs(tmpdir)
+    try:
+        print("[1/3] Hashing...")
+        groups, offsets, word_counts = hash_pass(inputs, tmpdir, args)
+        total = len(groups)
+        stats["signature_file_mb"] = os.path.getsize(os.path.join(tmpdir, "signatures.bin")) / (1024 * 1024)
+        print("[2/3] Linking LSH candidates...")
+        labels, conflict = link_and_cluster(tmpdir, groups, offsets, word_counts, args, stats)
+        print("[3/3] Writing deduplicated corpus and clusters...")
+        write_outputs(inputs, tmpdir, args.out_dir, labels, conflict, args, stats)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    stats["texts"] = total
+    stats["kept"] = sum(o["kept"] for o in stats["outputs"].values())
+    stats["time_s"] = time.perf_counter() - t_start
+    stats["peak_rss_mb"] = peak_rss_mb()
+    with open(os.path.join(args.out_dir, "stats.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    rss = stats["peak_rss_mb"]
+    # The signature file is memory-mapped while linking, so its pages (page cache, not heap) count
+    # towards peak RSS
+    print(f"Texts: {total} | kept: {stats['kept']} | clusters: {stats['clusters']} ({stats['texts_in_clusters']} texts) | "
+          f"label conflicts: {stats['label_conflicts']} ({stats['texts_in_conflicts']} texts) | "
+          f"time: {stats['time_s']:.1f}s | peak RSS: {f'{rss:.0f} MB' if rss is not None else 'n/a'} "
+          f"(incl. up to {stats['signature_file_mb']:.0f} MB of mapped signatures)")
+    print("--- Near-Duplicate Detection Finished ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+import pandas as pd
+from onnx import helper, numpy_helper
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from tokenizers import Tokenizer
+
+from classifier import is_pad_aware, pad_batch
+from validate import cross_entropy
+
+# --- Configuration ---
+ONNX_MODEL_PATH = "name_classifier.onnx"
+# Outputs go next to --model: name_classifier.onnx -> name_classifier.opt.onnx, name_classifier.int8.onnx
+OPTIMIZED_SUFFIX = ".opt.onnx"
+QUANTIZED_SUFFIX = ".int8.onnx"
+REPORT_NAME = "optimization_report.json"
+TOKENIZER_PATH = "custom-bpe-tokenizer.json"
+VALIDATE_DATA_FILE = "data/validate.csv"
+LATENCY_CALLS = 2000    # Single-row session.run calls per latency measurement
+WARMUP_CALLS = 50
+
+def optimize_graph(src_path, dst_path):
+    """
+    Lets ONNX Runtime constant-fold and fuse the exported graph and saves the result. EXTENDED
+    avoids the hardware-specific layout rewrites of ORT_ENABLE_ALL, so the file stays portable.
+    """
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    options.optimized_model_filepath = dst_path
+    ort.InferenceSession(src_path, options, providers=["CPUExecutionProvider"])
+
+def gemm_to_matmul(model):
+    """
+    Rewrites Gemm nodes with a constant weight (the classifier head) as MatMul + Add, because
+    dynamic quantization only has integer kernels for MatMul.
+    """
+    initializers = {t.name: t for t in model.graph.initializer}
+    nodes = []
+    for node in model.graph.node:
+        attrs = {a.name: helper.get_attribute_value(a) for a in node.attribute}
+        if (node.op_type != "Gemm" or node.input[1] not in initializers or attrs.get("transA", 0)
+                or attrs.get("alpha", 1.0) != 1.0 or attrs.get("beta", 1.0) != 1.0):
+            nodes.append(node)
+            continue
+        weight = numpy_helper.to_array(initializers[node.input[1]])
+        if attrs.get("transB", 0):
+            weight = weight.T
+        weight_name = f"{node.input[1]}_matmul"
+        model.graph.initializer.append(numpy_helper.from_array(np.ascontiguousarray(weight), weight_name))
+        if len(node.input) > 2 and node.input[2]:
+            product = f"{node.output[0]}_matmul"
+            nodes.append(helper.make_node("MatMul", [node.input[0], weight_name], [product], name=f"{node.name}_MatMul"))
+            nodes.append(helper.make_node("Add", [product, node.input[2]], list(node.output), name=f"{node.name}_Add"))
+        else:
+            nodes.append(helper.make_node("MatMul", [node.input[0], weight_name], list(node.output), name=f"{node.name}_MatMul"))
+    del model.graph.node[:]
+    model.graph.node.extend(nodes)
+    return model
+
+def quantize_model(src_path, dst_path):
+    """
+    Produces a dynamically quantized INT8 model: the embedding table (Gather) and the classifier
+    head (MatMul) get int8 weights. ONNX Runtime has no integer GRU kernel, so the GRU stays FP32.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        prepared_path = os.path.join(tmpdir, "prepared.onnx")
+        onnx.save(gemm_to_matmul(onnx.load(src_path)), prepared_path)
+        quantize_dynamic(prepared_path, dst_path, op_types_to_quantize=["Gather", "MatMul"], weight_type=QuantType.QInt8)
+
+def measure(model_path, encodings, labels, pad_token_id, reference_logits=None):
+    """
+    Returns size, single-call latency percentiles, accuracy and loss of one model on the
+    validation set, plus the largest logit deviation from the reference model if given.
+    """
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 1
+    session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    fixed_width = not is_pad_aware(session)
+
+    logits = session.run(None, {input_name: pad_batch(encodings, pad_token_id, fixed_width=fixed_width)})[0]
+    predictions = logits.argmax(axis=1)
+
+    singles = [pad_batch([e], pad_token_id, fixed_width=fixed_width) for e in encodings]
+    for i in range(WARMUP_CALLS):
+        session.run(None, {input_name: singles[i % len(singles)]})
+    timings = np.empty(LATENCY_CALLS)
+    for i in range(LATENCY_CALLS):
+        t0 = time.perf_counter()
+        session.run(None, {input_name: singles[i % len(singles)]})
+        timings[i] = time.perf_counter() - t0
+
+    result = {
+        "path": model_path,
+        "size_bytes": os.path.getsize(model_path),
+        "latency_us": {
+            "mean": float(timings.mean() * 1e6),
+            "p50": float(np.percentile(timings, 50) * 1e6),
+            "p99": float(np.percentile(timings, 99) * 1e6),
+        },
+        "accuracy": float((predictions == labels).mean()),
+        "loss": float(cross_entropy(logits, labels).mean()),
+    }
+    if reference_logits is not None:
+        result["max_abs_logit_diff"] = float(np.abs(logits - reference_logits).max())
+        result["prediction_agreement"] = float((predictions == reference_logits.argmax(axis=1)).mean())
+    return result, logits
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize and INT8-quantize name_classifier.onnx and report the trade-offs")
+    parser.add_argument("--model", default=ONNX_MODEL_PATH, help="FP32 model exported by train.py")
+    parser.add_argument("--data", default=VALIDATE_DATA_FILE, help="Labeled CSV used for accuracy")
+    parser.add_argument("--report", default=None, help=f"Where to write the JSON report (default: {REPORT_NAME} next to --model)")
+    args = parser.parse_args()
+    stem = os.path.splitext(args.model)[0]
+    optimized_path = stem + OPTIMIZED_SUFFIX
+    quantized_path = stem + QUANTIZED_SUFFIX
+    report_path = args.report or os.path.join(os.path.dirname(args.model), REPORT_NAME)
+
+    print("--- Starting ONNX Optimization ---")
+    print(f"Optimizing graph -> {optimized_path}")
+    optimize_graph(args.model, optimized_path)
+    print(f"Quantizing weights to INT8 -> {quantized_path}")
+    quantize_model(args.model, quantized_path)
+
+    tokenizer = Tokenizer.from_file(TOKENIZER_PATH)
+    pad_token_id = tokenizer.token_to_id("[PAD]")
+    df = pd.read_csv(args.data)
+    encodings = tokenizer.encode_batch(df['text'].astype(str).tolist())
+    labels = df['label'].to_numpy(dtype=np.int64)
+
+    baseline, reference_logits = measure(args.model, encodings, labels, pad_token_id)
+    results = {"fp32": baseline}
+    for variant, path in [("optimized", optimized_path), ("int8", quantized_path)]:
+        results[variant], _ = measure(path, encodings, labels, pad_token_id, reference_logits)
+
+    print("\n--- Optimization Report ---")
+    print(f"{'Model':<10} {'Size (KB)':>10} {'p50 (us)':>10} {'p99 (us)':>10} {'Accuracy':>9} {'Loss':>8}")
+    for variant, r in results.items():
+        print(f"{variant:<10} {r['size_bytes'] / 1024:>10.1f} {r['latency_us']['p50']:>10.1f} {r['latency_us']['p99']:>10.1f} {r['accuracy']:>9.4f} {r['loss']:>8.4f}")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nReport saved to {report_path}")
+    print("--- Optimization Finished ---")
+
+if __name__ == "__main__":
+    main()
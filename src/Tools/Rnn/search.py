@@ -0,0 +1,235 @@
+import argparse
+import concurrent.futures
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+import benchmark
+import train
+from build_dataset import dataset_files
+
+# --- Configuration ---
+SEARCH_DIR = "search"                 # One subdirectory per trial: checkpoints, model.onnx, train.log, result.json
+RESULTS_PATH = "search_results.json"
+EMBEDDING_DIMS = [16, 32, 64]
+HIDDEN_DIMS = [16, 32, 64, 128]
+BATCH_SIZES = [8, 32]
+LEARNING_RATES = [0.002, 0.005, 0.01]
+EPOCHS = 15             # Per trial; early stopping usually ends trials sooner
+PATIENCE = 3
+MIN_ACCURACY = 0.97     # Accuracy floor for the recommended model
+LATENCY_BATCH_SIZE = 32 # Rows per call for the batched latency figure
+LATENCY_THREADS = 1     # intra_op_num_threads while timing; the hot path runs one session per core
+LATENCY_TIME_BUDGET = 1.0
+SEED = 0
+
+def trial_name(config):
+    return f"e{config['embedding_dim']}_h{config['hidden_dim']}_b{config['batch_size']}_lr{config['lr']:g}"
+
+def run_trial(task):
+    """
+    Trains and exports one configuration in a pool worker. Training output goes to the trial's
+    train.log; the result is also written to result.json so a rerun skips finished trials.
+    """
+    config, trial_dir, epochs, patience, threads = task
+    os.makedirs(trial_dir, exist_ok=True)
+    args = train.build_parser().parse_args([
+        "--embedding-dim", str(config['embedding_dim']),
+        "--hidden-dim", str(config['hidden_dim']),
+        "--batch-size", str(config['batch_size']),
+        "--lr", str(config['lr']),
+        "--epochs", str(epochs),
+        "--patience", str(patience),
+        "--threads", str(threads),
+        "--checkpoint-dir", os.path.join(trial_dir, "checkpoints"),
+        "--onnx-out", os.path.join(trial_dir, "model.onnx"),
+    ])
+    args.export = True
+    result = {"name": trial_name(config), "config": config, "onnx_path": args.onnx_out}
+    t_start = time.perf_counter()
+    try:
+        with open(os.path.join(trial_dir, "train.log"), "w", encoding="utf-8") as log, \
+             contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            summary = train.train(0, 1, args)
+        if "exported" not in summary:
+            # No epoch improved on an infinite loss, e.g. NaN from a too-large learning rate
+            raise RuntimeError("no best checkpoint was written; validation loss never became finite")
+        result.update({
+            "train_time_s": time.perf_counter() - t_start,
+            "epochs_run": summary["epochs_run"],
+            "val_accuracy": summary["exported"]["val_accuracy"],
+            "val_loss": summary["exported"]["val_loss"],
+            "export_max_diff": summary["export_max_diff"],
+        })
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+    with open(os.path.join(trial_dir, "result.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+def measure_latency(model_path, single_batches, multi_batches, time_budget):
+    """
+    Single-row and batched p50/p95 of the exported graph with the benchmark.py harness. Runs in
+    the parent after all training has finished, so the timings do not compete with training.
+    """
+    single = benchmark.run_config(model_path, single_batches, LATENCY_THREADS, "all", "CPUExecutionProvider", time_budget)
+    multi = benchmark.run_config(model_path, multi_batches, LATENCY_THREADS, "all", "CPUExecutionProvider", time_budget)
+    return {
+        "single_p50_us": single["latency_us"]["p50"],
+        "single_p95_us": single["latency_us"]["p95"],
+        "batched_p50_us": multi["latency_us"]["p50"],
+        "batched_us_per_row": multi["latency_us"]["p50"] / len(multi_batches[0]),
+        "batched_rows_s": multi["throughput_rows_s"],
+    }
+
+def objectives(r):
+    # All minimized
+    return (-r["val_accuracy"], r["single_p50_us"], r["batched_us_per_row"], r["size_bytes"])
+
+def pareto_front(results):
+    """
+    Trials no other trial beats on accuracy, single-call latency, batched latency per row and
+    model size at once.
+    """
+    points = [objectives(r) for r in results]
+    front = []
+    for i, p in enumerate(points):
+        dominated = any(all(a <= b for a, b in zip(q, p)) and q != p for j, q in enumerate(points) if j != i)
+        if not dominated:
+            front.append(results[i])
+    return front
+
+def recommend(front, min_accuracy):
+    """
+    The fastest single-call model on the front that meets the accuracy floor, smaller size
+    breaking ties; None when no trial reaches the floor.
+    """
+    eligible = [r for r in front if r["val_accuracy"] >= min_accuracy]
+    return min(eligible, key=lambda r: (r["single_p50_us"], r["size_bytes"]), default=None)
+
+def parse_list(value, cast):
+    return [cast(v) for v in value.split(",")]
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter search over TinyClassifier with ONNX latency and a Pareto front")
+    parser.add_argument("--embedding-dims", default=",".join(map(str, EMBEDDING_DIMS)))
+    parser.add_argument("--hidden-dims", default=",".join(map(str, HIDDEN_DIMS)))
+    parser.add_argument("--batch-sizes", default=",".join(map(str, BATCH_SIZES)))
+    parser.add_argument("--lrs", default=",".join(map(str, LEARNING_RATES)), help="Initial learning rates")
+    parser.add_argument("--trials", type=int, default=0, help="Random sample of this many grid points (0 = full grid)")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--patience", type=int, default=PATIENCE)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Trials trained in parallel")
+    parser.add_argument("--min-accuracy", type=float, default=MIN_ACCURACY, help="Accuracy floor for the recommendation")
+    parser.add_argument("--latency-time-budget", type=float, default=LATENCY_TIME_BUDGET, help="Measured seconds per latency figure")
+    parser.add_argument("--dir", default=SEARCH_DIR, help="Trial directory")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    parser.add_argument("--rerun", action="store_true", help="Retrain trials that already have a result.json")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    grid = [{"embedding_dim": e, "hidden_dim": h, "batch_size": b, "lr": lr}
+            for e, h, b, lr in itertools.product(parse_list(args.embedding_dims, int), parse_list(args.hidden_dims, int),
+                                                 parse_list(args.batch_sizes, int), parse_list(args.lrs, float))]
+    if 0 < args.trials < len(grid):
+        grid = random.Random(args.seed).sample(grid, args.trials)
+    threads = max(1, (os.cpu_count() or 1) // args.jobs)
+
+    print("--- Starting Hyperparameter Search ---")
+    print(f"{len(grid)} trial(s) | {args.jobs} parallel job(s) x {threads} thread(s) | {args.epochs} epochs, patience {args.patience}")
+    # Build the token cache once here instead of in every worker at the same time
+    train_files, val_files = dataset_files(fallback=train.DATA_FILE)
+    for files in (train_files, val_files):
+        if files:
+            train.load_dataset(files)
+
+    results = []
+    tasks = []
+    for config in grid:
+        trial_dir = os.path.join(args.dir, trial_name(config))
+        result_path = os.path.join(trial_dir, "result.json")
+        if not args.rerun and os.path.exists(result_path):
+            with open(result_path, encoding="utf-8") as f:
+                results.append(json.load(f))
+            continue
+        tasks.append((config, trial_dir, args.epochs, args.patience, threads))
+    if results:
+        print(f"Reusing {len(results)} finished trial(s) from {args.dir}")
+
+    t_start = time.perf_counter()
+    # spawn: a fresh interpreter per worker, as on Windows, so no torch thread pool is forked.
+    # One trial per worker: a second torch.onnx.export in the same process loses the dynamic
+    # GRU decomposition and pins the sequence length, so every later export would fail.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs, mp_context=multiprocessing.get_context("spawn"),
+                                                max_tasks_per_child=1) as pool:
+        futures = {pool.submit(run_trial, task): task for task in tasks}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            try:
+                r = future.result()
+            except Exception as e:  # noqa: BLE001
+                # The worker itself died (e.g. out of memory); only this trial is lost
+                r = {"name": trial_name(futures[future][0]), "error": f"{type(e).__name__}: {e}"}
+            if "error" in r:
+                print(f"[{done}/{len(tasks)}] {r['name']}: FAILED ({r['error']})")
+                continue
+            print(f"[{done}/{len(tasks)}] {r['name']}: val acc {r['val_accuracy']:.4f} | "
+                  f"{r['epochs_run']} epochs in {r['train_time_s']:.0f}s")
+            results.append(r)
+    print(f"Training finished in {time.perf_counter() - t_start:.0f}s")
+    if not results:
+        print("No trial finished; nothing to report")
+        return
+
+    print("Measuring ONNX latency...")
+    tokenizer = Tokenizer.from_file(train.TOKENIZER_PATH)
+    pad_token_id = tokenizer.token_to_id("[PAD]")
+    pool = benchmark.load_token_pool(tokenizer, val_files or train_files)
+    single_batches = benchmark.make_batches(pool, 1, "natural", pad_token_id, 64, np.random.default_rng(args.seed))
+    multi_batches = benchmark.make_batches(pool, LATENCY_BATCH_SIZE, "natural", pad_token_id, 16, np.random.default_rng(args.seed))
+    for r in results:
+        model = benchmark.describe_model(r["onnx_path"])
+        r["size_bytes"] = model["size_bytes"]
+        r["parameters"] = model["parameters"]
+        r.update(measure_latency(r["onnx_path"], single_batches, multi_batches, args.latency_time_budget))
+
+    front = pareto_front(results)
+    front_names = {r["name"] for r in front}
+    best = recommend(front, args.min_accuracy)
+
+    print(f"\n{'trial':<26} {'val acc':>8} {'params':>8} {'size KB':>8} {'1-row p50 us':>13} {'batch p50 us/row':>17}")
+    for r in sorted(results, key=lambda r: (r["name"] not in front_names, -r["val_accuracy"])):
+        mark = "*" if r["name"] in front_names else " "
+        print(f"{mark}{r['name']:<25} {r['val_accuracy']:>8.4f} {r['parameters']:>8} {r['size_bytes'] / 1024:>8.1f} "
+              f"{r['single_p50_us']:>13.1f} {r['batched_us_per_row']:>17.2f}")
+    print(f"* Pareto front: {len(front)} of {len(results)} trial(s)")
+    if best is None:
+        print(f"No trial on the front reaches the accuracy floor {args.min_accuracy}")
+    else:
+        c = best["config"]
+        print(f"Recommended (fastest single call with val acc >= {args.min_accuracy}): {best['name']} -> {best['onnx_path']}")
+        print(f"  python train.py --embedding-dim {c['embedding_dim']} --hidden-dim {c['hidden_dim']} "
+              f"--batch-size {c['batch_size']} --lr {c['lr']:g}")
+
+    report = {
+        "search": {"epochs": args.epochs, "patience": args.patience, "min_accuracy": args.min_accuracy, "seed": args.seed,
+                   "latency": {"threads": LATENCY_THREADS, "batch_size": LATENCY_BATCH_SIZE, "onnxruntime": ort.__version__}},
+        "results": results,
+        "pareto_front": [r["name"] for r in front],
+        "recommended": best["name"] if best else None,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.out}")
+    print("--- Search Finished ---")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from classifier import CLASS_NAMES, NameClassifier, ONNX_MODEL_PATH, TOKENIZER_PATH
+from lexicon import LEXICON_PATH, Lexicon
+
+# --- Configuration ---
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH_SIZE = 256     # Requests merged into one session.run
+MAX_WAIT_US = 2000       # How long the first request of a batch may wait for company
+INFERENCE_THREADS = 1    # Batches allowed to run concurrently
+LATENCY_WINDOW = 10000   # Recent request latencies kept for /stats percentiles
+MAX_BODY_BYTES = 65536
+
+class MicroBatcher:
+    """
+    Collects concurrent single-text requests into micro-batches. A batch is dispatched as soon as
+    it holds max_batch_size texts or its first text has waited max_wait_us, and each batch costs
+    one NameClassifier.classify_batch call (so at most one session.run).
+    """
+    def __init__(self, classifier, max_batch_size=MAX_BATCH_SIZE, max_wait_us=MAX_WAIT_US, inference_threads=INFERENCE_THREADS):
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1e6
+        self.inference_threads = inference_threads
+        self.executor = ThreadPoolExecutor(max_workers=inference_threads, thread_name_prefix="inference")
+        self.queue = asyncio.Queue()
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        self._workers = []
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.inference_threads)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+    async def classify(self, text):
+        future = asyncio.get_running_loop().create_future()
+        t0 = time.perf_counter()
+        await self.queue.put((text, future))
+        label = await future
+        self.latencies.append(time.perf_counter() - t0)
+        self.requests += 1
+        return label
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                # Drain whatever is already queued before waiting on the clock
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                labels = await loop.run_in_executor(self.executor, self.classifier.classify_batch, texts)
+            except Exception as e:  # noqa: BLE001
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batch_sizes.append(len(batch))
+            for (_, future), label in zip(batch, labels):
+                if not future.done():
+                    future.set_result(label)
+
+    def stats(self):
+        latencies = np.fromiter(self.latencies, dtype=np.float64)
+        elapsed = time.perf_counter() - self.started
+        percentiles = np.percentile(latencies, [50, 95, 99]) * 1e6 if len(latencies) else [0.0, 0.0, 0.0]
+        return {
+            "uptime_s": elapsed,
+            "requests": self.requests,
+            "batches": self.batches,
+            "throughput_rps": self.requests / max(elapsed, 1e-9),
+            "mean_batch_size": float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            "queue_depth": self.queue.qsize(),
+            "latency_us": {"p50": float(percentiles[0]), "p95": float(percentiles[1]), "p99": float(percentiles[2])},
+            "cache": self.classifier.cache_info(),
+            "lexicon": self.classifier.lexicon_info(),
+            "config": {"max_batch_size": self.max_batch_size, "max_wait_us": self.max_wait * 1e6, "inference_threads": self.inference_threads},
+        }
+
+# --- HTTP/1.1 front end ---
+async def write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error",
+              501: "Not Implemented"}[status]
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+
+async def handle_connection(batcher, reader, writer):
+    """
+    Serves keep-alive HTTP/1.1 requests on one connection:
+      POST /classify  body: raw UTF-8 text or {"text": "..."}  ->  {"label": 0, "class": "Name"}
+      GET  /stats     latency/throughput/batching counters and cache/lexicon hit rates
+    """
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            except asyncio.LimitOverrunError:
+                await write_response(writer, 413, {"error": "headers too large"}, False)
+                return
+            lines = head.decode("latin-1").split("\r\n")
+            method, path, _ = (lines[0].split(" ", 2) + ["", ""])[:3]
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+            keep_alive = headers.get("connection", "").lower() != "close"
+            if "transfer-encoding" in headers:
+                # Only Content-Length bodies are read; a chunked body would be parsed as the next request
+                await write_response(writer, 501, {"error": f"Transfer-Encoding not supported: {headers['transfer-encoding']!r}"}, False)
+                return
+            raw_length = headers.get("content-length", "0") or "0"
+            try:
+                length = int(raw_length) if raw_length.isascii() else -1
+            except ValueError:
+                length = -1
+            if length < 0:
+                # The body cannot be framed, so the rest of the stream is unusable
+                await write_response(writer, 400, {"error": f"invalid Content-Length: {raw_length!r}"}, False)
+                return
+            if length > MAX_BODY_BYTES:
+                await write_response(writer, 413, {"error": "body too large"}, False)
+                return
+            body = await reader.readexactly(length) if length else b""
+
+            if method == "GET" and path == "/stats":
+                await write_response(writer, 200, batcher.stats(), keep_alive)
+            elif method == "POST" and path == "/classify":
+                text = body.decode("utf-8", errors="replace")
+                if headers.get("content-type", "").startswith("application/json"):
+                    try:
+                        text = str(json.loads(text)["text"])
+                    except (ValueError, KeyError, TypeError):
+                        await write_response(writer, 400, {"error": "expected {\"text\": ...}"}, keep_alive)
+                        continue
+                try:
+                    label = await batcher.classify(text)
+                except Exception as e:  # noqa: BLE001
+                    await write_response(writer, 500, {"error": f"{e.__class__.__name__}: {e}"}, keep_alive)
+                    continue
+                await write_response(writer, 200, {"label": label, "class": CLASS_NAMES[label]}, keep_alive)
+            else:
+                await write_response(writer, 404, {"error": f"no route for {method} {path}"}, keep_alive)
+            if not keep_alive:
+                return
+    finally:
+        writer.close()
+
+async def serve(args):
+    lexicon = None
+    if args.lexicon and os.path.exists(args.lexicon):
+        lexicon = Lexicon(args.lexicon)
+        print(f"Lexicon fast path: {len(lexicon)} entries from {args.lexicon}")
+    elif args.lexicon:
+        print(f"Lexicon {args.lexicon} not found (python lexicon.py build); every text goes to the model")
+    classifier = NameClassifier(args.model, args.tokenizer, intra_op_num_threads=args.intra_op_threads, cache_size=args.cache_size,
+                                max_batch_size=args.max_batch_size, lexicon=lexicon)
+    batcher = MicroBatcher(classifier, args.max_batch_size, args.max_wait_us, args.inference_threads)
+    batcher.start()
+    handler = lambda r, w: handle_connection(batcher, r, w)
+    if args.unix:
+        server = await asyncio.start_unix_server(handler, path=args.unix)
+        where = f"unix:{args.unix}"
+    else:
+        server = await asyncio.start_server(handler, args.host, args.port)
+        where = f"http://{args.host}:{args.port}"
+    print(f"Serving {args.model} on {where} | max_batch_size={args.max_batch_size} | max_wait_us={args.max_wait_us}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching local classification server for name_classifier.onnx")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", default=None, help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument("--model", default=ONNX_MODEL_PATH)
+    parser.add_argument("--tokenizer", default=TOKENIZER_PATH)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE, help="Most requests merged into one session.run")
+    parser.add_argument("--max-wait-us", type=int, default=MAX_WAIT_US, help="Longest a request waits for a batch to fill (microseconds)")
+    parser.add_argument("--inference-threads", type=int, default=INFERENCE_THREADS, help="Batches running concurrently")
+    parser.add_argument("--intra-op-threads", type=int, default=1, help="ONNX Runtime intra-op threads per session.run")
+    parser.add_argument("--cache-size", type=int, default=0, help="NameClassifier LRU cache entries (0 disables)")
+    parser.add_argument("--lexicon", default=LEXICON_PATH, help="Exact-match lexicon answered before the model (\"\" disables)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
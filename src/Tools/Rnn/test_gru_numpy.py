@@ -0,0 +1,75 @@
+"""
+Parity of the NumPy engine (gru_numpy.py) with onnxruntime on padded and unpadded batches.
+Run from src/Tools/Rnn: python -m pytest test_gru_numpy.py
+"""
+import os
+
+import numpy as np
+import pytest
+
+ort = pytest.importorskip("onnxruntime")
+
+from tokenizers import Tokenizer
+
+from classifier import MAX_LEN, ONNX_MODEL_PATH, TOKENIZER_PATH, is_pad_aware
+from gru_numpy import NumpyClassifier, onnx_weights, save_weights
+
+ATOL = 1e-4
+LENGTHS = [1, 3, 7, 12]
+
+def id_batches(pad_token_id, width, seed=0):
+    """
+    The same rows once unpadded (one batch per row) and once right-padded to width together.
+    """
+    rng = np.random.default_rng(seed)
+    # Ids 2..99 exist in every vocabulary and are never the pad id (1)
+    rows = [rng.integers(2, 100, length, dtype=np.int64) for length in LENGTHS]
+    padded = np.full((len(rows), width), pad_token_id, dtype=np.int64)
+    for i, row in enumerate(rows):
+        padded[i, :len(row)] = row
+    return [row[None, :] for row in rows], padded
+
+def numpy_engine(onnx_path, npz_path, pad_token_id):
+    weights, pad_aware = onnx_weights(onnx_path)
+    save_weights(npz_path, weights, pad_token_id, pad_aware)
+    return NumpyClassifier(npz_path, tokenizer_path=None)
+
+def run_onnx(session, input_ids):
+    return session.run(None, {"input_ids": input_ids})[0]
+
+@pytest.fixture(scope="module")
+def pad_aware_export(tmp_path_factory):
+    # One export per process: a second torch.onnx.export in the same process pins the sequence axis
+    torch = pytest.importorskip("torch")
+    from train import VOCAB_SIZE, TinyClassifier, export_onnx
+
+    torch.manual_seed(0)
+    model = TinyClassifier(VOCAB_SIZE, 8, 16, 3, pad_token_id=1)
+    path = str(tmp_path_factory.mktemp("export") / "tiny.onnx")
+    export_onnx(model, path)
+    return path, model.pad_token_id
+
+def test_pad_aware_export_matches_onnx(pad_aware_export, tmp_path):
+    path, pad_token_id = pad_aware_export
+    assert is_pad_aware(path)
+    engine = numpy_engine(path, str(tmp_path / "tiny.npz"), pad_token_id)
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    singles, padded = id_batches(pad_token_id, max(LENGTHS) + 5)
+
+    single_logits = np.concatenate([engine.forward(row) for row in singles])
+    np.testing.assert_allclose(single_logits, np.concatenate([run_onnx(session, row) for row in singles]), atol=ATOL)
+    np.testing.assert_allclose(engine.forward(padded), run_onnx(session, padded), atol=ATOL)
+    # Pad-aware: padding a row to a batch leaves its logits unchanged
+    np.testing.assert_allclose(engine.forward(padded), single_logits, atol=ATOL)
+
+@pytest.mark.skipif(not os.path.exists(ONNX_MODEL_PATH), reason=f"{ONNX_MODEL_PATH} not found")
+def test_committed_model_matches_onnx(tmp_path):
+    pad_token_id = Tokenizer.from_file(TOKENIZER_PATH).token_to_id("[PAD]")
+    engine = numpy_engine(ONNX_MODEL_PATH, str(tmp_path / "model.npz"), pad_token_id)
+    assert engine.pad_aware == is_pad_aware(ONNX_MODEL_PATH)
+    session = ort.InferenceSession(ONNX_MODEL_PATH, providers=["CPUExecutionProvider"])
+    singles, padded = id_batches(engine.pad_token_id, MAX_LEN)
+
+    for row in singles:
+        np.testing.assert_allclose(engine.forward(row), run_onnx(session, row), atol=ATOL)
+    np.testing.assert_allclose(engine.forward(padded), run_onnx(session, padded), atol=ATOL)
@@ -0,0 +1,80 @@
+"""
+Which name pairs near_dedup.py links: different people must stay apart, spelling variants of one
+text must end up in one cluster.
+Run from src/Tools/Rnn: python -m pytest test_near_dedup.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from near_dedup import canonical, exact_form, one_edit, spelling, words_match
+
+# Different people sharing a surname, a one-letter spelling or a prefix
+DISTINCT_PAIRS = [
+    ("Zuzana Vlčková", "Jana Vlčková"),
+    ("Hana Vlčková", "Jana Vlčková"),
+    ("Josef Divín", "Josef Diviš"),
+    ("Daniel Koós", "Daniel Kos"),
+    ("M@rt!n K.O.", "Martin Korec"),
+    ("Martin Korec", "Martin Korek"),
+    ("Korec", "Korek"),
+]
+DUPLICATE_PAIRS = [
+    ("M@rt!n K.O.", "Martin KO"),
+    ("Jan Novák", "JAN  NOVAK"),
+    ("JanNovák", "Jan Novák"),
+    ("Fotograf Martin Korec, Praha", "Martin Korec – fotograf, Praha"),
+    ("Martn Korec", "Martin Korec"),
+    ("Jozev Novák", "Jozef Novák"),
+    ("Lukiš Holub", "Lukáš Holub"),
+]
+COMMON_WORDS = {"martin", "martina", "miroslav", "miloslav"}
+
+def word_count(word):
+    return 1000 if word in COMMON_WORDS else 1
+
+def linked(text_a, text_b):
+    # What a run decides once MinHash made the pair a candidate
+    form_a, form_b = canonical(text_a), canonical(text_b)
+    return exact_form(form_a) == exact_form(form_b) or words_match(spelling(text_a), spelling(text_b), word_count)
+
+@pytest.mark.parametrize("text_a, text_b", DISTINCT_PAIRS)
+def test_distinct_pairs_stay_apart(text_a, text_b):
+    assert not linked(text_a, text_b)
+
+@pytest.mark.parametrize("text_a, text_b", DUPLICATE_PAIRS)
+def test_duplicate_pairs_are_linked(text_a, text_b):
+    assert linked(text_a, text_b)
+
+def test_common_neighbours_are_two_names():
+    # Not part of the run below: in a corpus this small every word is rare
+    assert not linked("Miroslav Černý", "Miloslav Černý")
+    assert not linked("Martin Korec", "Martina Korec")
+    assert linked("Miroslav Černý", "Mirosalv Černý")
+
+def test_one_edit():
+    assert one_edit("martin", "martn") and one_edit("martn", "martin")
+    assert one_edit("jozef", "jozev") and one_edit("mirosalv", "miroslav")
+    assert not one_edit("divín", "diviš") and not one_edit("martin", "martin12")
+
+def test_run_clusters(tmp_path):
+    texts = [text for pair in DISTINCT_PAIRS + DUPLICATE_PAIRS for text in pair]
+    (tmp_path / "texts.txt").write_text("\n".join(texts) + "\n", encoding="utf-8")
+    here = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, os.path.join(here, "near_dedup.py"), str(tmp_path / "texts.txt"),
+                    "--out-dir", str(tmp_path / "out"), "--jobs", "1"], cwd=here, check=True, capture_output=True)
+    cluster_of = {}
+    with open(tmp_path / "out" / "clusters.jsonl", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            for member in record["members"]:
+                cluster_of[member] = record["id"]
+
+    for text_a, text_b in DUPLICATE_PAIRS:
+        assert text_a in cluster_of and cluster_of[text_a] == cluster_of.get(text_b), (text_a, text_b)
+    # Texts of a distinct pair may each sit in a cluster of their own duplicates, never in one
+    for text_a, text_b in DISTINCT_PAIRS:
+        assert text_a not in cluster_of or cluster_of[text_a] != cluster_of.get(text_b), (text_a, text_b)
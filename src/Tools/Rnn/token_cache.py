@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from tokenizers import Tokenizer
+from torch.utils.data import Dataset
+
+# --- Configuration ---
+CACHE_DIR = "data/cache"
+CACHE_FORMAT_VERSION = 2  # Bump when the on-disk layout changes
+CHUNK_SIZE = 65536        # Rows per encode_batch call while building the cache
+
+def cache_key(tokenizer_path, data_files, max_len):
+    """
+    Hashes the tokenizer definition, every source CSV and the truncation length, so that any
+    change to the inputs produces a new cache directory.
+    """
+    h = hashlib.sha256(f"v{CACHE_FORMAT_VERSION}|max_len={max_len}".encode("utf-8"))
+    for path in [tokenizer_path, *data_files]:
+        h.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+def build_token_cache(data_files, tokenizer_path, max_len, cache_dir=CACHE_DIR):
+    """
+    Tokenizes the 'text' column of the given CSV files once with encode_batch and writes flat
+    token ids, per-row lengths and labels as raw arrays described by meta.json. Returns the
+    cache directory; an existing cache with the same key is reused as-is.
+    """
+    key = cache_key(tokenizer_path, data_files, max_len)
+    path = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return path
+
+    print(f"Building token cache {path} from {len(data_files)} file(s)...")
+    t_start = time.perf_counter()
+    tokenizer = Tokenizer.from_file(tokenizer_path)
+    vocab_size = tokenizer.get_vocab_size()
+    ids_dtype = np.uint16 if vocab_size <= np.iinfo(np.uint16).max else np.int32
+    lengths_dtype = np.uint8 if max_len <= np.iinfo(np.uint8).max else np.uint16
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    rows = 0
+    tokens = 0
+    with open(os.path.join(tmp_path, "ids.bin"), "wb") as f_ids, \
+         open(os.path.join(tmp_path, "lengths.bin"), "wb") as f_lengths, \
+         open(os.path.join(tmp_path, "labels.bin"), "wb") as f_labels:
+        for data_file in data_files:
+            for chunk in pd.read_csv(data_file, chunksize=CHUNK_SIZE, keep_default_na=False, dtype={'text': str}):
+                encodings = tokenizer.encode_batch(chunk['text'].astype(str).tolist())
+                # Empty texts keep one token so every row has a valid final GRU step
+                ids = [e.ids[:max_len] or [tokenizer.token_to_id("[PAD]")] for e in encodings]
+                lengths = np.fromiter((len(x) for x in ids), dtype=lengths_dtype, count=len(ids))
+                np.fromiter((t for x in ids for t in x), dtype=ids_dtype, count=int(lengths.sum(dtype=np.int64))).tofile(f_ids)
+                lengths.tofile(f_lengths)
+                chunk['label'].to_numpy(dtype=np.int8).tofile(f_labels)
+                rows += len(ids)
+                tokens += int(lengths.sum(dtype=np.int64))
+
+    meta = {
+        "version": CACHE_FORMAT_VERSION,
+        "rows": rows,
+        "tokens": tokens,
+        "max_len": max_len,
+        "ids_dtype": np.dtype(ids_dtype).name,
+        "lengths_dtype": np.dtype(lengths_dtype).name,
+        "labels_dtype": "int8",
+        "pad_token_id": tokenizer.token_to_id("[PAD]"),
+        "sources": [os.path.abspath(p) for p in data_files],
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Another process finished the same cache first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    print(f"Token cache ready: {rows} rows, {tokens} tokens in {time.perf_counter() - t_start:.1f}s")
+    return path
+
+# --- PyTorch Dataset ---
+class CachedTokenDataset(Dataset):
+    """
+    Memory-maps a cache written by build_token_cache. Items are zero-copy views into the flat
+    token array; padding is left to the collate function.
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        rows = self.meta["rows"]
+        self.pad_token_id = self.meta["pad_token_id"]
+        self.ids = self._map(path, "ids.bin", self.meta["ids_dtype"], self.meta["tokens"])
+        self.lengths = self._map(path, "lengths.bin", self.meta["lengths_dtype"], rows)
+        self.labels = self._map(path, "labels.bin", self.meta["labels_dtype"], rows)
+        self.offsets = np.zeros(rows + 1, dtype=np.int64)
+        np.cumsum(self.lengths, out=self.offsets[1:])
+
+    @staticmethod
+    def _map(path, name, dtype, count):
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(path, name), dtype=dtype, mode="r", shape=(count,))
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, idx):
+        return {
+            'ids': self.ids[self.offsets[idx]:self.offsets[idx + 1]],
+            'label': int(self.labels[idx])
+        }
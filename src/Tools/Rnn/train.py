@@ -1,13 +1,37 @@
+import argparse
+import contextlib
+import copy
+import functools
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import tempfile
+import time
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader, random_split
+from torch.nn.parallel import DistributedDataParallel
+from torch.profiler import record_function
+from torch.nn.utils.rnn import pack_padded_sequence
+from torch.utils.data import Dataset, DataLoader, Sampler, random_split
 import pandas as pd
 from tokenizers import Tokenizer
 import numpy as np
+import onnx
+import onnxruntime as ort
+from classifier import PAD_AWARE_METADATA
+from token_cache import CachedTokenDataset, build_token_cache
+from build_dataset import dataset_files
+from instrumentation import ProfilerWindow, StepMetrics
+from gru_numpy import save_weights, state_dict_weights
 
 # --- Configuration ---
-DATA_FILE = "data/dataset.csv"
+DATA_FILE = "data/dataset.csv"  # Used when build_dataset.py has not written data/shards
 TOKENIZER_PATH = "custom-bpe-tokenizer.json"
 ONNX_EXPORT_PATH = "name_classifier.onnx"
 
@@ -17,25 +41,54 @@ EMBEDDING_DIM = 32      # Low dimension for a tiny model
 HIDDEN_DIM = 64         # GRU hidden units
 OUTPUT_DIM = 3          # 3 classes (Name, Nickname, Company)
 MAX_LEN = 128           # Max sequence length (from your requirement)
+USE_TOKEN_CACHE = True  # Pre-tokenize once into data/cache instead of tokenizing in NameDataset
 
 # Training Hyperparameters
 LEARNING_RATE = 0.005   # This is now the *initial* learning rate
 WEIGHT_DECAY = 0.01     ### NEW ### A common value for AdamW
 BATCH_SIZE = 8
 EPOCHS = 50             # Train for more epochs on this small dataset
+BUCKET_MULTIPLIER = 50  # Batches per length-sorted bucket in LengthBucketBatchSampler
+SEED = 0
+
+# Data-parallel CPU training (--world-size > 1)
+WORLD_SIZE = 1          # Training processes (ranks) on the gloo backend
+LR_SCALING = "linear"   # How LEARNING_RATE grows with the effective batch: linear, sqrt or none
+
+# Checkpointing and early stopping
+CHECKPOINT_DIR = "checkpoints"  # last.pt (full training state) and best.pt (lowest validation loss)
+CHECKPOINT_EVERY = 1    # Epochs between last.pt saves
+PATIENCE = 10           # Epochs without a validation loss improvement before stopping (0 disables)
+MIN_DELTA = 0.0         # Smallest decrease in validation loss that counts as an improvement
+
+# Fast mode (--fast): torch.compile plus bfloat16 autocast; weights and the ONNX export stay FP32
+COMPILE_BACKEND = "inductor"
+AUTOCAST_DTYPE = torch.bfloat16
+EXPORT_CHECK_ATOL = 1e-4    # Max |ONNX - PyTorch| logit difference accepted after export
+AB_RESULTS_PATH = "train_ab_benchmark.json"
 
 # --- Model Definition ---
 class TinyClassifier(nn.Module):
-    def __init__(self, vocab_size, embedding_dim, hidden_dim, output_dim):
+    def __init__(self, vocab_size, embedding_dim, hidden_dim, output_dim, pad_token_id=1):
         super().__init__()
+        self.pad_token_id = pad_token_id
         self.embedding = nn.Embedding(vocab_size, embedding_dim)
         self.gru = nn.GRU(embedding_dim, hidden_dim, batch_first=True)
         self.fc = nn.Linear(hidden_dim, output_dim)
 
-    def forward(self, input_ids):
+    def forward(self, input_ids, lengths=None):
         embedded = self.embedding(input_ids)
-        _, hidden = self.gru(embedded)
-        return self.fc(hidden.squeeze(0))
+        if lengths is not None:
+            # Training path: packed sequences stop the GRU at each sequence's real length
+            packed = pack_padded_sequence(embedded, lengths.cpu(), batch_first=True, enforce_sorted=False)
+            _, hidden = self.gru(packed)
+            return self.fc(hidden.squeeze(0))
+        # Export/inference path (input_ids only): read the GRU output at the last non-pad
+        # position of each right-padded row, which equals the packed final hidden state
+        output, _ = self.gru(embedded)
+        last = (input_ids != self.pad_token_id).sum(dim=1).clamp(min=1) - 1
+        hidden = output.gather(1, last.view(-1, 1, 1).expand(-1, 1, output.size(2))).squeeze(1)
+        return self.fc(hidden)
 
 # --- PyTorch Dataset ---
 class NameDataset(Dataset):
@@ -45,6 +98,8 @@ class NameDataset(Dataset):
         self.tokenizer = tokenizer
         self.max_len = max_len
         self.pad_token_id = tokenizer.token_to_id("[PAD]")
+        # Lengths are needed up front by LengthBucketBatchSampler; never pad here
+        self.lengths = [max(1, min(len(e.ids), max_len)) for e in tokenizer.encode_batch(texts)]
 
     def __len__(self):
         return len(self.texts)
@@ -53,108 +108,464 @@ class NameDataset(Dataset):
         text = self.texts[idx]
         label = self.labels[idx]
         encoding = self.tokenizer.encode(text)
-        input_ids = encoding.ids
-        if len(input_ids) > self.max_len:
-            input_ids = input_ids[:self.max_len]
-        else:
-            input_ids = input_ids + [self.pad_token_id] * (self.max_len - len(input_ids))
+        input_ids = encoding.ids[:self.max_len] or [self.pad_token_id]
         return {
             'ids': torch.tensor(input_ids, dtype=torch.long),
             'label': torch.tensor(label, dtype=torch.long)
         }
 
-def main():
-    print("--- Starting Model Training (with AdamW and LR Scheduler) ---")
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
+# --- Batching ---
+class LengthBucketBatchSampler(Sampler):
+    """
+    Yields batches of indices with similar lengths. Each epoch the indices are shuffled, cut into
+    buckets of batch_size * bucket_multiplier, sorted by length within each bucket and split into
+    batches, and the batch order is shuffled again.
+    """
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_multiplier=BUCKET_MULTIPLIER, seed=0, num_replicas=1, rank=0):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = batch_size * bucket_multiplier
+        self.seed = seed
+        self.epoch = 0
+        self.num_replicas = num_replicas
+        self.rank = rank
 
-    # 1. Load data and tokenizer
-    df = pd.read_csv(DATA_FILE)
-    tokenizer = Tokenizer.from_file(TOKENIZER_PATH)
+    def set_epoch(self, epoch):
+        self.epoch = epoch
 
-    # 2. Create dataset and split
-    dataset = NameDataset(
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        order = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+        batches = []
+        for start in range(0, len(order), self.bucket_size):
+            bucket = order[start:start + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+            batches.extend(bucket[i:i + self.batch_size].tolist() for i in range(0, len(bucket), self.batch_size))
+        if self.shuffle:
+            rng.shuffle(batches)
+        if self.num_replicas > 1:
+            # Every rank builds the same batch list from the same seed and takes every
+            # num_replicas-th batch; the list is padded by wrapping around so all ranks run the
+            # same number of steps (DDP gradient sync needs that)
+            batches += batches[:len(self) * self.num_replicas - len(batches)]
+            batches = batches[self.rank::self.num_replicas]
+        return iter(batches)
+
+    def __len__(self):
+        num_batches = (len(self.lengths) + self.batch_size - 1) // self.batch_size
+        return (num_batches + self.num_replicas - 1) // self.num_replicas
+
+def collate_batch(batch, pad_token_id):
+    """
+    Pads a list of NameDataset or CachedTokenDataset items to the longest sequence in the batch.
+    """
+    lengths = np.fromiter((len(item['ids']) for item in batch), dtype=np.int64, count=len(batch))
+    ids = np.full((len(batch), int(lengths.max())), pad_token_id, dtype=np.int64)
+    for row, item in enumerate(batch):
+        ids[row, :lengths[row]] = item['ids']
+    return {
+        'ids': torch.from_numpy(ids),
+        'lengths': torch.from_numpy(lengths),
+        'label': torch.tensor([int(item['label']) for item in batch], dtype=torch.long)
+    }
+
+def load_dataset(files):
+    if USE_TOKEN_CACHE:
+        return CachedTokenDataset(build_token_cache(files, TOKENIZER_PATH, MAX_LEN))
+    df = pd.concat([pd.read_csv(f, keep_default_na=False, dtype={'text': str}) for f in files], ignore_index=True)
+    tokenizer = Tokenizer.from_file(TOKENIZER_PATH)
+    return NameDataset(
         texts=df['text'].tolist(),
         labels=df['label'].tolist(),
         tokenizer=tokenizer,
         max_len=MAX_LEN
     )
-    train_size = int(0.8 * len(dataset))
-    val_size = len(dataset) - train_size
-    train_dataset, val_dataset = random_split(dataset, [train_size, val_size])
-    train_loader = DataLoader(train_dataset, batch_size=BATCH_SIZE, shuffle=True)
-    val_loader = DataLoader(val_dataset, batch_size=BATCH_SIZE)
+
+def scaled_learning_rate(world_size, scaling=LR_SCALING, base_lr=LEARNING_RATE):
+    """
+    base_lr is tuned for one process with BATCH_SIZE; with N ranks the effective batch is
+    N * BATCH_SIZE and the rate grows linearly (or with sqrt(N)).
+    """
+    factor = {"linear": world_size, "sqrt": world_size ** 0.5, "none": 1}[scaling]
+    return base_lr * factor
+
+def all_reduce_sums(values, world_size):
+    if world_size == 1:
+        return values
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.tolist()
+
+def save_checkpoint(path, state):
+    # Written next to the target and renamed, so an interrupted save never leaves a torn file
+    tmp_path = f"{path}.tmp"
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    # Our own files: RNG states are not plain tensors, so weights_only has to be off
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+def export_onnx(model, path):
+    model.eval()
+    model.to("cpu")
+    # A batch of 2 keeps the exporter from specializing the dynamic batch axis to 1
+    dummy_input = torch.randint(0, VOCAB_SIZE, (2, MAX_LEN), dtype=torch.long)
+    input_names = ["input_ids"]
+    output_names = ["logits"]
+    torch.onnx.export(model,
+                      dummy_input,
+                      path,
+                      input_names=input_names,
+                      output_names=output_names,
+                      opset_version=23,
+                      external_data=False,
+                      dynamic_axes={'input_ids': {0: 'batch_size', 1: 'sequence_length'}})
+    # Mark the graph, so NameClassifier pads its batches dynamically instead of to MAX_LEN
+    exported = onnx.load(path)
+    onnx.helper.set_model_props(exported, {PAD_AWARE_METADATA: "1"})
+    onnx.save(exported, path)
+
+def check_onnx_export(model, path, batch, atol=EXPORT_CHECK_ATOL):
+    """
+    Runs a real validation batch through the exported graph and through the FP32 PyTorch weights
+    (packed training path) and returns the largest absolute logit difference. Raises if it
+    exceeds atol.
+    """
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    onnx_logits = session.run(None, {"input_ids": batch['ids'].numpy()})[0]
+    with torch.no_grad():
+        torch_logits = model(batch['ids'], batch['lengths']).float().numpy()
+    max_diff = float(np.abs(onnx_logits - torch_logits).max())
+    if not max_diff <= atol:
+        raise RuntimeError(f"ONNX export check failed: max |logit diff| {max_diff:.2e} > {atol:.0e}")
+    return max_diff
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def train(rank, world_size, args):
+    """
+    One training process. With world_size == 1 this is plain single-process training; otherwise
+    it is one DDP rank on the gloo backend, and only rank 0 prints and exports.
+    """
+    is_main = rank == 0
+    distributed = world_size > 1
+    if distributed:
+        dist.init_process_group("gloo", init_method=f"tcp://127.0.0.1:{args.port}", rank=rank, world_size=world_size)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(SEED)
+    log = print if is_main else (lambda *a, **k: None)
+
+    log("--- Starting Model Training (with AdamW and LR Scheduler) ---")
+    device = torch.device("cuda" if torch.cuda.is_available() and not distributed else "cpu")
+    log(f"Using device: {device}" + (f" | {world_size} ranks x {torch.get_num_threads()} threads (gloo)" if distributed else ""))
+
+    # 1. Load data and tokenizer, 2. Create dataset
+    # Each rank builds its own dataset object (memmaps do not survive pickling); rank 0 writes the
+    # token cache first so the others only map it
+    train_files, val_files = dataset_files(fallback=DATA_FILE)
+    log(f"Training data: {len(train_files)} file(s), validation: {len(val_files) or 'random 20% split'}")
+    if distributed and not is_main:
+        dist.barrier()
+    dataset = load_dataset(train_files)
+    val_dataset = load_dataset(val_files) if val_files else None
+    if distributed and is_main:
+        dist.barrier()
+    pad_token_id = dataset.pad_token_id
+
+    # Split: the hash-based validation shards from build_dataset.py, otherwise a random 80/20 split
+    # (seeded, so every rank gets the same split)
+    if val_dataset is not None:
+        train_dataset = dataset
+        train_lengths, val_lengths = train_dataset.lengths, val_dataset.lengths
+    else:
+        train_size = int(0.8 * len(dataset))
+        val_size = len(dataset) - train_size
+        train_dataset, val_dataset = random_split(dataset, [train_size, val_size], generator=torch.Generator().manual_seed(SEED))
+        train_lengths = [dataset.lengths[i] for i in train_dataset.indices]
+        val_lengths = [dataset.lengths[i] for i in val_dataset.indices]
+    collate = functools.partial(collate_batch, pad_token_id=pad_token_id)
+    train_loader = DataLoader(
+        train_dataset,
+        batch_sampler=LengthBucketBatchSampler(train_lengths, args.batch_size, seed=SEED, num_replicas=world_size, rank=rank),
+        collate_fn=collate
+    )
+    val_loader = DataLoader(
+        val_dataset,
+        batch_sampler=LengthBucketBatchSampler(val_lengths, args.batch_size, shuffle=False, num_replicas=world_size, rank=rank),
+        collate_fn=collate
+    )
 
     # 3. Initialize model, loss, and optimizer
-    model = TinyClassifier(VOCAB_SIZE, EMBEDDING_DIM, HIDDEN_DIM, OUTPUT_DIM).to(device)
+    model = TinyClassifier(VOCAB_SIZE, args.embedding_dim, args.hidden_dim, OUTPUT_DIM, pad_token_id).to(device)
+    train_model = DistributedDataParallel(model) if distributed else model
+    # Fast mode: the compiled module shares model's FP32 parameters (the optimizer's master
+    # weights); autocast only lowers the precision of forward/backward compute
+    if args.fast:
+        train_model = torch.compile(train_model, dynamic=True, backend=args.compile_backend)
+        log(f"Fast mode: torch.compile ({args.compile_backend}) + {str(AUTOCAST_DTYPE).replace('torch.', '')} autocast")
+    autocast = (lambda: torch.autocast(device.type, dtype=AUTOCAST_DTYPE)) if args.fast else contextlib.nullcontext
     criterion = nn.CrossEntropyLoss()
     
     ### NEW ### Use AdamW optimizer with weight decay
-    optimizer = optim.AdamW(model.parameters(), lr=LEARNING_RATE, weight_decay=WEIGHT_DECAY)
+    learning_rate = scaled_learning_rate(world_size, args.lr_scaling, args.lr)
+    if distributed:
+        log(f"Effective batch size {args.batch_size * world_size} | learning rate {learning_rate:.6f} ({args.lr_scaling} scaling)")
+    optimizer = optim.AdamW(model.parameters(), lr=learning_rate, weight_decay=WEIGHT_DECAY)
     
     ### NEW ### Add a learning rate scheduler
     # This will decay the LR from its initial value down to 0 over the course of all epochs
-    scheduler = optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=EPOCHS)
+    scheduler = optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=args.epochs)
+
+    # Every rank restores the same state, so DDP replicas stay identical
+    last_path = os.path.join(args.checkpoint_dir, "last.pt")
+    best_path = os.path.join(args.checkpoint_dir, "best.pt")
+    start_epoch = 0
+    best_val_loss = math.inf
+    epochs_without_improvement = 0
+    if args.resume and os.path.exists(last_path):
+        checkpoint = load_checkpoint(last_path)
+        model.load_state_dict(checkpoint['model'])
+        optimizer.load_state_dict(checkpoint['optimizer'])
+        scheduler.load_state_dict(checkpoint['scheduler'])
+        torch.set_rng_state(checkpoint['rng']['torch'])
+        np.random.set_state(checkpoint['rng']['numpy'])
+        random.setstate(checkpoint['rng']['python'])
+        start_epoch = checkpoint['epoch'] + 1
+        best_val_loss = checkpoint['best_val_loss']
+        epochs_without_improvement = checkpoint['epochs_without_improvement']
+        log(f"Resumed from {last_path} at epoch {start_epoch + 1}/{args.epochs} | best val loss {best_val_loss:.4f}")
+    elif args.resume:
+        log(f"No checkpoint at {last_path}; starting from scratch")
+    if is_main:
+        os.makedirs(args.checkpoint_dir, exist_ok=True)
+
+    # Instrumentation: per-step JSONL (one file per rank) and an optional profiler window
+    metrics_path = args.metrics_log
+    if metrics_path and distributed:
+        root, ext = os.path.splitext(metrics_path)
+        metrics_path = f"{root}.rank{rank}{ext}"
+    metrics = StepMetrics(metrics_path, rank, cuda_sync=device.type == "cuda")
+    profiler = ProfilerWindow.parse(args.profile_steps, rank)
 
     # 4. Training loop
-    for epoch in range(EPOCHS):
-        model.train()
+    epoch_times = []
+    val_accuracy = avg_val_loss = None
+    for epoch in range(start_epoch, args.epochs):
+        t_epoch = time.perf_counter()
+        train_loader.batch_sampler.set_epoch(epoch)
+        train_model.train()
         total_train_loss = 0
-        for batch in train_loader:
+        metrics.start_epoch()
+        for step_in_epoch, batch in enumerate(train_loader):
+            step = epoch * len(train_loader) + step_in_epoch
+            metrics.lap("data")
+            profiler.before_step(step)
             ids = batch['ids'].to(device)
             labels = batch['label'].to(device)
             optimizer.zero_grad()
-            outputs = model(ids)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
-            total_train_loss += loss.item()
+            with record_function("forward"), autocast():
+                outputs = train_model(ids, batch['lengths'])
+                loss = criterion(outputs.float(), labels)
+            metrics.lap("forward")
+            # With DDP this includes the overlapped gradient all-reduce
+            with record_function("backward"):
+                loss.backward()
+            metrics.lap("backward")
+            with record_function("optimizer"):
+                optimizer.step()
+            loss_value = loss.item()
+            metrics.lap("optimizer")
+            total_train_loss += loss_value
+            metrics.end_step(epoch, step, len(labels), int(batch['lengths'].sum()), ids.numel(), loss_value)
+            profiler.after_step(step)
         
-        # Validation
+        epoch_times.append(time.perf_counter() - t_epoch)
+
+        # Validation (each rank scores its share of the batches; sums are combined). Always the
+        # eager FP32 model, so fast mode reports the accuracy of the weights that get exported
+        t_val = time.perf_counter()
         model.eval()
         total_val_loss = 0
         correct_predictions = 0
+        val_batches = 0
+        val_rows = 0
         with torch.no_grad():
             for batch in val_loader:
                 ids = batch['ids'].to(device)
                 labels = batch['label'].to(device)
-                outputs = model(ids)
+                outputs = model(ids, batch['lengths'])
                 loss = criterion(outputs, labels)
                 total_val_loss += loss.item()
                 _, predicted = torch.max(outputs, 1)
                 correct_predictions += (predicted == labels).sum().item()
+                val_batches += 1
+                val_rows += len(labels)
 
         ### NEW ### Update the learning rate at the end of the epoch
         scheduler.step()
 
-        avg_train_loss = total_train_loss / len(train_loader)
-        avg_val_loss = total_val_loss / len(val_loader)
-        val_accuracy = correct_predictions / len(val_dataset)
+        total_train_loss, train_batches, total_val_loss, val_batches, val_rows, correct_predictions = all_reduce_sums(
+            [total_train_loss, len(train_loader), total_val_loss, val_batches, val_rows, correct_predictions], world_size)
+        avg_train_loss = total_train_loss / train_batches
+        avg_val_loss = total_val_loss / max(val_batches, 1)
+        # Per row scored: on multi-rank runs the wrap-around padding repeats a few validation rows
+        val_accuracy = correct_predictions / max(val_rows, 1)
         
         # Get current learning rate to display
         current_lr = optimizer.param_groups[0]['lr']
+        shares = metrics.end_epoch(epoch, train_loss=avg_train_loss, val_loss=avg_val_loss, val_accuracy=val_accuracy,
+                                   lr=current_lr, val_time_s=round(time.perf_counter() - t_val, 4))
         
         if (epoch + 1) % 10 == 0:
-            print(f"Epoch {epoch+1}/{EPOCHS} | Train Loss: {avg_train_loss:.4f} | Val Loss: {avg_val_loss:.4f} | Val Acc: {val_accuracy:.4f} | LR: {current_lr:.6f}")
+            log(f"Epoch {epoch+1}/{args.epochs} | Train Loss: {avg_train_loss:.4f} | Val Loss: {avg_val_loss:.4f} | Val Acc: {val_accuracy:.4f} | LR: {current_lr:.6f}")
+            if shares:
+                log("  step time: " + " | ".join(f"{phase} {share:.0%}" for phase, share in shares.items()))
+
+        # Checkpoints and early stopping; the all-reduced validation loss is the same on every
+        # rank, so all ranks stop on the same epoch
+        improved = avg_val_loss < best_val_loss - args.min_delta
+        if improved:
+            best_val_loss = avg_val_loss
+            epochs_without_improvement = 0
+        else:
+            epochs_without_improvement += 1
+        stop = args.patience > 0 and epochs_without_improvement >= args.patience
+        if is_main:
+            if improved:
+                save_checkpoint(best_path, {'model': model.state_dict(), 'epoch': epoch, 'val_loss': avg_val_loss, 'val_accuracy': val_accuracy})
+            if (epoch + 1) % args.checkpoint_every == 0 or stop or epoch + 1 == args.epochs:
+                save_checkpoint(last_path, {
+                    'model': model.state_dict(),
+                    'optimizer': optimizer.state_dict(),
+                    'scheduler': scheduler.state_dict(),
+                    'rng': {'torch': torch.get_rng_state(), 'numpy': np.random.get_state(), 'python': random.getstate()},
+                    'epoch': epoch,
+                    'best_val_loss': best_val_loss,
+                    'epochs_without_improvement': epochs_without_improvement,
+                })
+        if stop:
+            log(f"Early stopping at epoch {epoch+1}: no validation loss improvement for {args.patience} epochs (best {best_val_loss:.4f})")
+            break
+
+    profiler.close()
+    metrics.close()
+    log("--- Training Finished ---")
 
-    print("--- Training Finished ---")
+    if distributed:
+        dist.barrier()
+        dist.destroy_process_group()
+    summary = {"epoch_times_s": epoch_times, "epochs_run": len(epoch_times), "val_accuracy": val_accuracy,
+               "val_loss": avg_val_loss, "best_val_loss": best_val_loss}
+    if not is_main or not args.export:
+        return summary
 
     # 5. Export to ONNX
     print("--- Exporting model to ONNX ---")
-    model.eval()
-    model.to("cpu")
-    dummy_input = torch.randint(0, VOCAB_SIZE, (1, MAX_LEN), dtype=torch.long)
-    input_names = ["input_ids"]
-    output_names = ["logits"]
-    torch.onnx.export(model,
-                      dummy_input,
-                      ONNX_EXPORT_PATH,
-                      input_names=input_names,
-                      output_names=output_names,
-                      opset_version=23,
-                      dynamic_axes={'input_ids': {0: 'batch_size', 1: 'sequence_length'}})
-    
-    print(f"Model successfully exported to {ONNX_EXPORT_PATH}")
+    if os.path.exists(best_path):
+        best = load_checkpoint(best_path)
+        model.load_state_dict(best['model'])
+        print(f"Using best checkpoint: epoch {best['epoch']+1} | Val Loss: {best['val_loss']:.4f} | Val Acc: {best['val_accuracy']:.4f}")
+        summary["exported"] = {"epoch": best['epoch'], "val_loss": best['val_loss'], "val_accuracy": best['val_accuracy']}
+    # Export and check next to the target, so a failed check leaves the previous model in place
+    partial_path = os.path.splitext(args.onnx_out)[0] + ".partial.onnx"
+    try:
+        export_onnx(model, partial_path)
+        max_diff = check_onnx_export(model, partial_path, next(iter(val_loader)))
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    os.replace(partial_path, args.onnx_out)
+    print(f"Model successfully exported to {args.onnx_out}")
+    print(f"Export check: max |ONNX - PyTorch FP32| logit difference {max_diff:.2e} on a validation batch")
+    summary["export_max_diff"] = max_diff
+    # Same weights for the NumPy engine (gru_numpy.py), next to the ONNX file
+    npz_path = os.path.splitext(args.onnx_out)[0] + ".npz"
+    save_weights(npz_path, state_dict_weights(model.state_dict()), pad_token_id)
+    print(f"NumPy weights saved to {npz_path}")
+    return summary
+
+def ab_benchmark(args):
+    """
+    Trains the same configuration twice from the same seed, eager FP32 and fast mode, with
+    checkpoints in a scratch directory and no export, and compares epoch times and accuracy.
+    The first fast epoch includes torch.compile, so the steady-state figure is the median of
+    the remaining epochs.
+    """
+    results = {}
+    for mode in ("eager_fp32", "fast"):
+        run_args = copy.copy(args)
+        run_args.fast = mode == "fast"
+        run_args.export = False
+        run_args.resume = False
+        run_args.patience = 0
+        run_args.checkpoint_dir = tempfile.mkdtemp(prefix="ab_")
+        print(f"\n=== A/B run: {mode} ===")
+        try:
+            summary = train(0, 1, run_args)
+        finally:
+            shutil.rmtree(run_args.checkpoint_dir, ignore_errors=True)
+        times = summary["epoch_times_s"]
+        summary["first_epoch_s"] = times[0]
+        summary["steady_epoch_s"] = float(np.median(times[1:] if len(times) > 1 else times))
+        results[mode] = summary
+
+    speedup = results["eager_fp32"]["steady_epoch_s"] / results["fast"]["steady_epoch_s"]
+    print("\n--- A/B Benchmark: eager FP32 vs torch.compile + bf16 autocast ---")
+    print(f"{'mode':<12} {'first epoch s':>14} {'steady epoch s':>15} {'val acc':>9} {'val loss':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<12} {r['first_epoch_s']:>14.2f} {r['steady_epoch_s']:>15.2f} {r['val_accuracy']:>9.4f} {r['val_loss']:>9.4f}")
+    print(f"Steady-state speedup: {speedup:.2f}x | accuracy delta: {results['fast']['val_accuracy'] - results['eager_fp32']['val_accuracy']:+.4f}")
+    with open(args.ab_out, "w", encoding="utf-8") as f:
+        json.dump({"epochs": args.epochs, "batch_size": args.batch_size, "compile_backend": args.compile_backend,
+                   "torch": torch.__version__, "speedup": speedup, "results": results}, f, indent=2)
+    print(f"Results saved to {args.ab_out}")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Trains TinyClassifier and exports name_classifier.onnx")
+    parser.add_argument("--embedding-dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--hidden-dim", type=int, default=HIDDEN_DIM)
+    parser.add_argument("--lr", type=float, default=LEARNING_RATE, help="Initial learning rate for one process")
+    parser.add_argument("--onnx-out", default=ONNX_EXPORT_PATH, help="Exported model path")
+    parser.add_argument("--world-size", type=int, default=WORLD_SIZE, help="Data-parallel training processes (gloo DDP on CPU)")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads per process (default: cores / world size)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Batch size per process")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--lr-scaling", choices=["linear", "sqrt", "none"], default=LR_SCALING, help="Learning rate scaling with --world-size")
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY, help="Epochs between full-state checkpoints")
+    parser.add_argument("--resume", action="store_true", help="Continue from <checkpoint-dir>/last.pt")
+    parser.add_argument("--patience", type=int, default=PATIENCE, help="Early stopping patience in epochs (0 disables)")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA, help="Minimum validation loss decrease that resets patience")
+    parser.add_argument("--metrics-log", default=None, help="Write per-step phase timings/throughput as JSON lines to this file")
+    parser.add_argument("--profile-steps", default=None, help="torch.profiler window over global steps, e.g. 100:120")
+    parser.add_argument("--fast", action="store_true", help="torch.compile + bfloat16 autocast training (FP32 weights and export)")
+    parser.add_argument("--compile-backend", default=COMPILE_BACKEND, help="torch.compile backend for --fast")
+    parser.add_argument("--ab-benchmark", action="store_true", help="Train eager FP32 and --fast back to back and compare (no export)")
+    parser.add_argument("--ab-out", default=AB_RESULTS_PATH, help="JSON results of --ab-benchmark")
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+    args.export = True
+
+    if args.ab_benchmark:
+        ab_benchmark(args)
+        return
+    if args.world_size <= 1:
+        train(0, 1, args)
+        return
+    # Ranks split the cores instead of each starting one thread per core
+    args.threads = args.threads or max(1, (os.cpu_count() or 1) // args.world_size)
+    args.port = free_port()
+    mp.spawn(train, args=(args.world_size, args), nprocs=args.world_size, join=True)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
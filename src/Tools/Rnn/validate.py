@@ -1,29 +1,61 @@
 import onnxruntime as ort
 import numpy as np
-import pandas as pd
 from tokenizers import Tokenizer
-import torch # Using torch just for the loss function calculation
-import torch.nn as nn
-from sklearn.metrics import classification_report, accuracy_score
+import argparse
+import collections
+import csv
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from classifier import CLASS_NAMES, NameClassifier, is_pad_aware
+# pandas, torch and sklearn are imported inside the modes that use them; the streaming mode needs
+# none of them, so it starts inferring without their import time
 
 # --- Configuration ---
 ONNX_MODEL_PATH = "name_classifier.onnx"
 TOKENIZER_PATH = "custom-bpe-tokenizer.json"
 VALIDATE_DATA_FILE = "data/validate.csv"
 MAX_LEN = 128 # Must match the training configuration
+BATCH_SIZE = 1024 # Rows per session.run call in batched mode
+STREAM_CHUNK_SIZE = 8192 # Rows read per chunk in streaming mode; each chunk goes to one session
+STREAM_SESSIONS = os.cpu_count() or 1 # ONNX sessions (one thread each) in streaming mode
+PROGRESS_EVERY = 1000000 # Rows between progress lines in streaming mode
 
-def validate_model():
+def cross_entropy(logits, labels):
     """
-    Loads a trained ONNX model and evaluates it on a validation dataset.
+    Per-row cross-entropy of raw logits against integer labels (numerically stable log-softmax).
     """
-    print("--- Starting Model Validation ---")
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    log_probs = shifted - np.log(np.exp(shifted).sum(axis=1, keepdims=True))
+    return -log_probs[np.arange(len(labels)), labels]
 
-    # 1. Check if model and tokenizer exist
+def check_inputs_exist():
     if not all(os.path.exists(p) for p in [ONNX_MODEL_PATH, TOKENIZER_PATH, VALIDATE_DATA_FILE]):
         print("Error: Model, tokenizer, or validation file not found.")
         print(f"Please ensure '{ONNX_MODEL_PATH}', '{TOKENIZER_PATH}', and '{VALIDATE_DATA_FILE}' exist.")
         print("You may need to run 'run.bat' first to train the model.")
+        return False
+    return True
+
+def warn_if_legacy_padding():
+    if not is_pad_aware(ONNX_MODEL_PATH):
+        print(f"Note: {ONNX_MODEL_PATH} is a legacy export that runs the GRU over padding, so every row is padded "
+              f"to {MAX_LEN} tokens as in its training; models trained by train.py are pad-aware and use dynamic padding")
+
+def validate_model():
+    """
+    Loads a trained ONNX model and evaluates it on a validation dataset.
+    """
+    import pandas as pd
+    import torch # Using torch just for the loss function calculation
+    import torch.nn as nn
+    from sklearn.metrics import classification_report, accuracy_score
+
+    print("--- Starting Model Validation ---")
+
+    # 1. Check if model and tokenizer exist
+    if not check_inputs_exist():
         return
 
     # 2. Load model, tokenizer, and validation data
@@ -85,5 +117,218 @@ def validate_model():
     print("--- Validation Finished ---")
 
 
+def validate_model_batched(batch_size=BATCH_SIZE):
+    """
+    Same evaluation as validate_model(), but tokenizes with encode_batch, pads each batch only to
+    its longest sequence and runs one session.run per batch. Loss and argmax are computed in NumPy
+    over the whole logits matrix, so no per-row Python or torch work remains on the hot path.
+    """
+    import pandas as pd
+    from sklearn.metrics import classification_report, accuracy_score
+
+    print(f"--- Starting Batched Model Validation (batch size {batch_size}) ---")
+
+    # 1. Check if model and tokenizer exist
+    if not check_inputs_exist():
+        return
+
+    # 2. Load model, tokenizer, and validation data
+    print(f"Loading model from {ONNX_MODEL_PATH} and tokenizer from {TOKENIZER_PATH}")
+    classifier = NameClassifier(ONNX_MODEL_PATH, TOKENIZER_PATH, MAX_LEN, intra_op_num_threads=0, max_batch_size=batch_size)
+    warn_if_legacy_padding()
+
+    print(f"Loading validation data from {VALIDATE_DATA_FILE}")
+    df = pd.read_csv(VALIDATE_DATA_FILE)
+    texts = df['text'].astype(str).tolist()
+    all_labels = df['label'].to_numpy(dtype=np.int64)
+    all_preds = np.empty(len(texts), dtype=np.int64)
+    class_labels = ["Name (0)", "Nickname (1)", "Company (2)"]
+
+    # 3. Run inference batch by batch
+    total_loss = 0.0
+    t_start = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        end = min(start + batch_size, len(texts))
+        logits = classifier.predict_logits(texts[start:end])
+        all_preds[start:end] = logits.argmax(axis=1)
+        total_loss += float(cross_entropy(logits, all_labels[start:end]).sum())
+    elapsed = time.perf_counter() - t_start
+
+    # 4. Report results
+    avg_loss = total_loss / max(1, len(texts))
+    accuracy = accuracy_score(all_labels, all_preds)
+
+    print("\n--- Validation Results ---")
+    print(f"Average Loss: {avg_loss:.4f}")
+    print(f"Overall Accuracy: {accuracy:.4f} | {len(texts) / max(elapsed, 1e-9):.1f} rows/s ({elapsed:.2f}s)")
+    print("\nClassification Report:")
+    print(classification_report(all_labels, all_preds, labels=[0, 1, 2], target_names=class_labels, zero_division=0))
+    print("--- Validation Finished ---")
+
+
+class StreamingMetrics:
+    """
+    Confusion matrix and summed cross-entropy, updated chunk by chunk; everything else in the
+    report is derived from those two, so memory does not grow with the number of rows.
+    """
+    def __init__(self, num_classes=len(CLASS_NAMES)):
+        self.num_classes = num_classes
+        self.confusion = np.zeros((num_classes, num_classes), dtype=np.int64)  # [true, predicted]
+        self.total_loss = 0.0
+        self.rows = 0
+
+    def update(self, logits, labels):
+        preds = logits.argmax(axis=1)
+        self.confusion += np.bincount(labels * self.num_classes + preds,
+                                      minlength=self.num_classes ** 2).reshape(self.num_classes, self.num_classes)
+        self.total_loss += float(cross_entropy(logits, labels).sum())
+        self.rows += len(labels)
+
+    def report(self, class_labels):
+        """
+        Text report in the layout of sklearn's classification_report (zero_division=0), followed by
+        the confusion matrix.
+        """
+        tp = np.diag(self.confusion).astype(np.float64)
+        support = self.confusion.sum(axis=1)
+        predicted = self.confusion.sum(axis=0)
+        precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+        recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+        f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(tp), where=precision + recall > 0)
+        total = max(int(support.sum()), 1)
+        width = max(len(name) for name in class_labels + ["weighted avg"])
+        lines = [f"{'':>{width}} {'precision':>9} {'recall':>9} {'f1-score':>9} {'support':>9}", ""]
+        for i, name in enumerate(class_labels):
+            lines.append(f"{name:>{width}} {precision[i]:>9.2f} {recall[i]:>9.2f} {f1[i]:>9.2f} {support[i]:>9}")
+        lines.append("")
+        lines.append(f"{'accuracy':>{width}} {'':>9} {'':>9} {tp.sum() / total:>9.2f} {support.sum():>9}")
+        lines.append(f"{'macro avg':>{width}} {precision.mean():>9.2f} {recall.mean():>9.2f} {f1.mean():>9.2f} {support.sum():>9}")
+        weights = support / total
+        lines.append(f"{'weighted avg':>{width}} {precision @ weights:>9.2f} {recall @ weights:>9.2f} {f1 @ weights:>9.2f} {support.sum():>9}")
+        lines.append("")
+        lines.append("Confusion matrix (rows: true, columns: predicted):")
+        lines.append(f"{'':>{width}} " + " ".join(f"{i:>12}" for i in range(self.num_classes)))
+        for i, name in enumerate(class_labels):
+            lines.append(f"{name:>{width}} " + " ".join(f"{v:>12}" for v in self.confusion[i]))
+        return "\n".join(lines)
+
+def parse_source(spec):
+    """
+    "PATH" is a labeled CSV with text and label columns; "PATH:LABEL" is a one-text-per-line file
+    whose rows all have class LABEL (e.g. data/classes/sources/companies/res/names.txt:0).
+    """
+    path, sep, label = spec.rpartition(":")
+    if sep and path and label.isdigit():
+        if int(label) >= len(CLASS_NAMES):
+            raise argparse.ArgumentTypeError(f"{spec}: label must be in 0..{len(CLASS_NAMES) - 1}")
+        return path, int(label)
+    return spec, None
+
+def source_spec(spec):
+    """
+    argparse type for a source: rejects out-of-range labels up front, keeps the spec as given.
+    """
+    parse_source(spec)
+    return spec
+
+def iter_chunks(sources, chunk_size):
+    """
+    Streams (texts, labels) chunks of at most chunk_size rows from the given sources in order.
+    """
+    texts = []
+    labels = []
+    for path, label in sources:
+        with open(path, encoding="utf-8", errors="replace", newline="") as f:
+            if label is None:
+                reader = csv.reader(f)
+                header = next(reader, [])
+                text_idx, label_idx = header.index("text"), header.index("label")
+                rows = ((row[text_idx], int(row[label_idx])) for row in reader if len(row) > max(text_idx, label_idx))
+            else:
+                rows = ((line.rstrip("\r\n"), label) for line in f if line.strip())
+            for text, row_label in rows:
+                texts.append(text)
+                labels.append(row_label)
+                if len(texts) == chunk_size:
+                    yield texts, np.asarray(labels, dtype=np.int64)
+                    texts = []
+                    labels = []
+    if texts:
+        yield texts, np.asarray(labels, dtype=np.int64)
+
+def validate_model_streaming(source_specs, chunk_size=STREAM_CHUNK_SIZE, sessions=STREAM_SESSIONS, batch_size=BATCH_SIZE):
+    """
+    Evaluates arbitrarily large labeled files without loading them: chunks are read lazily and
+    spread over a pool of single-threaded ONNX sessions (one per worker thread; onnxruntime and
+    the tokenizer release the GIL), and metrics are accumulated in NumPy as chunks complete. At
+    most 2 * sessions chunks are in memory at once.
+    """
+    print(f"--- Starting Streaming Model Validation ({sessions} sessions, chunk size {chunk_size}) ---")
+    sources = [parse_source(spec) for spec in source_specs]
+    missing = [p for p in [ONNX_MODEL_PATH, TOKENIZER_PATH] + [path for path, _ in sources] if not os.path.exists(p)]
+    if missing:
+        print(f"Error: not found: {', '.join(missing)}")
+        return
+    for path, label in sources:
+        print(f"  {path}: " + (f"every row labeled {CLASS_NAMES[label]} ({label})" if label is not None else "labeled CSV"))
+    warn_if_legacy_padding()
+
+    local = threading.local()
+    def open_session():
+        local.classifier = NameClassifier(ONNX_MODEL_PATH, TOKENIZER_PATH, MAX_LEN, intra_op_num_threads=1,
+                                          cache_size=0, max_batch_size=batch_size)
+    def run_chunk(texts):
+        return local.classifier.predict_logits(texts)
+
+    metrics = StreamingMetrics()
+    class_labels = [f"{name} ({i})" for i, name in enumerate(CLASS_NAMES)]
+    t_start = time.perf_counter()
+    next_progress = PROGRESS_EVERY
+    in_flight = collections.deque()
+
+    def complete_oldest():
+        nonlocal next_progress
+        future, labels = in_flight.popleft()
+        metrics.update(future.result(), labels)
+        if metrics.rows >= next_progress:
+            elapsed = time.perf_counter() - t_start
+            print(f"  {metrics.rows} rows | acc {np.trace(metrics.confusion) / metrics.rows:.4f} | {metrics.rows / elapsed:.0f} rows/s")
+            next_progress += PROGRESS_EVERY
+
+    with ThreadPoolExecutor(max_workers=sessions, initializer=open_session, thread_name_prefix="session") as executor:
+        for texts, labels in iter_chunks(sources, chunk_size):
+            if labels.size and (labels.min() < 0 or labels.max() >= len(CLASS_NAMES)):
+                raise ValueError(f"Labels must be in 0..{len(CLASS_NAMES) - 1}")
+            in_flight.append((executor.submit(run_chunk, texts), labels))
+            if len(in_flight) >= 2 * sessions:
+                complete_oldest()
+        while in_flight:
+            complete_oldest()
+    elapsed = time.perf_counter() - t_start
+
+    rows = max(1, metrics.rows)
+    print("\n--- Validation Results ---")
+    print(f"Rows: {metrics.rows}")
+    print(f"Average Loss: {metrics.total_loss / rows:.4f}")
+    print(f"Overall Accuracy: {np.trace(metrics.confusion) / rows:.4f} | {metrics.rows / max(elapsed, 1e-9):.1f} rows/s ({elapsed:.2f}s)")
+    print("\nClassification Report:")
+    print(metrics.report(class_labels))
+    print("--- Validation Finished ---")
+
+
 if __name__ == "__main__":
-    validate_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate name_classifier.onnx on data/validate.csv")
+    parser.add_argument("--batched", action="store_true", help="Tokenize and run inference in dynamically padded batches")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per inference call in batched mode")
+    parser.add_argument("--stream", nargs="*", metavar="SOURCE", default=None, type=source_spec,
+                        help="Stream these files through a session pool: labeled CSVs, or PATH:LABEL for one-text-per-line files "
+                             f"(default: {VALIDATE_DATA_FILE})")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE, help="Rows per chunk in streaming mode")
+    parser.add_argument("--sessions", type=int, default=STREAM_SESSIONS, help="ONNX sessions in streaming mode")
+    args = parser.parse_args()
+    if args.stream is not None:
+        validate_model_streaming(args.stream or [VALIDATE_DATA_FILE], args.chunk_size, args.sessions, args.batch_size)
+    elif args.batched:
+        validate_model_batched(args.batch_size)
+    else:
+        validate_model()